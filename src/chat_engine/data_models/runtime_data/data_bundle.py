@@ -277,7 +277,8 @@ class DataBundle:
 
     def set_array_data(self, name: str, entry: DataBundleEntry, data: np.ndarray):
         timed_axis_size = entry.get_time_axis_size(data.shape)
-        if timed_axis_size is None or timed_axis_size <= 0:
+        # zero length is allowed on the time axis, e.g. an end of speech marker without audio
+        if timed_axis_size is None or timed_axis_size < 0:
             raise RuntimeError(f"Dimension mismatch: {name}: {data.shape} is not valid")
         allowed_shape = entry.calculate_shape(timed_axis_size=timed_axis_size, reference_shape=data.shape)
         if not np.array_equal(data.shape, allowed_shape):
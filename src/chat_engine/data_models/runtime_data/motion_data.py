@@ -1,15 +1,57 @@
 import struct
 from dataclasses import dataclass
-from typing import List, Optional, Dict, Union, Any
+from typing import List, Optional, Dict, Union, Any, Tuple
 
 import numpy as np
 from loguru import logger
 
-from chat_engine.data_models.runtime_data.data_bundle import DataBundleDefinition, DataBundle
+from chat_engine.data_models.runtime_data.data_bundle import DataBundleDefinition, DataBundle, DataBundleEntry
 from chat_engine.data_models.runtime_data.motion_data_descriptors import MotionDataDescription, BufferDescription
 from chat_engine.data_models.runtime_data.motion_entry_serializer_base import BaseMotionEntrySerializer
+from chat_engine.data_models.runtime_data.motion_entry_serializers.delta_int8_serializer import \
+    MotionEntryDeltaInt8Serializer
+from chat_engine.data_models.runtime_data.motion_entry_serializers.float16_serializer import \
+    MotionEntryFloat16Serializer
 from chat_engine.data_models.runtime_data.motion_entry_serializers.int16_audio_serializer import \
     MotionEntryAudioInt16Serializer
+from chat_engine.data_models.runtime_data.motion_entry_serializers.uint8_quantized_serializer import \
+    MotionEntryUInt8QuantizedSerializer
+
+
+MOTION_FORMAT_JSON = "json"
+MOTION_FORMAT_COMPACT = "compact"
+
+JSON_HEADER = struct.Struct("<4sII")
+# batch id, flags, record count, json size
+COMPACT_HEADER = struct.Struct("<4sIHHI")
+# sample count, data offset, data size
+COMPACT_RECORD = struct.Struct("<III")
+COMPACT_FLAG_START_OF_BATCH = 1
+COMPACT_FLAG_END_OF_BATCH = 2
+COMPACT_FLAG_DESCRIPTION = 4
+
+# float32 sends the values unchanged
+ARKIT_ENCODINGS = ("float32", "float16", "uint8", "delta_int8")
+AUDIO_ENCODINGS = ("int16", "opus")
+
+
+def create_entry_serializer(encoding: str) -> Optional[BaseMotionEntrySerializer]:
+    if encoding == "float32":
+        return None
+    if encoding == "float16":
+        return MotionEntryFloat16Serializer()
+    if encoding == "uint8":
+        return MotionEntryUInt8QuantizedSerializer()
+    if encoding == "delta_int8":
+        return MotionEntryDeltaInt8Serializer()
+    if encoding == "int16":
+        return MotionEntryAudioInt16Serializer()
+    if encoding == "opus":
+        # needs PyAV with libopus, imported only when a client asks for it
+        from chat_engine.data_models.runtime_data.motion_entry_serializers.opus_audio_serializer import \
+            MotionEntryAudioOpusSerializer
+        return MotionEntryAudioOpusSerializer()
+    raise ValueError(f"Unsupported motion entry encoding {encoding}.")
 
 
 @dataclass
@@ -21,11 +63,20 @@ class MotionDataEntryRegistry:
 
 
 class MotionDataSerializer:
-    def __init__(self):
+    def __init__(self, motion_format: str = MOTION_FORMAT_JSON):
+        """
+        motion_format: json sends the json description with every message, compact sends it with
+                       the definition and when it changes, data messages carry a binary header
+        """
+        if motion_format not in (MOTION_FORMAT_JSON, MOTION_FORMAT_COMPACT):
+            raise ValueError(f"Unsupported motion format {motion_format}.")
+        self.motion_format = motion_format
+        self.last_description_key = None
         self.name_mapping: Dict[str, MotionDataEntryRegistry] = {}
         self.record_serializer: Dict[str, ]
         self.last_batch_name: Optional[str] = None
         self.batch_num: int = 0
+        self.record_templates: Dict[Tuple[str, bool], Tuple[DataBundleEntry, BufferDescription]] = {}
 
     def register_data(self, data_name: str, output_name: str, data_type: str,
                       entry_serializer: Optional[BaseMotionEntrySerializer] = None):
@@ -39,40 +90,57 @@ class MotionDataSerializer:
             serializer_context=serializer_context,
         )
 
-    def register_audio_data(self, data_name: str):
+    def register_audio_data(self, data_name: str, encoding: str = "int16"):
+        if encoding not in AUDIO_ENCODINGS:
+            raise ValueError(f"Unsupported audio encoding {encoding}.")
         self.register_data(
             data_name,
             "audio",
             "int16",
-            MotionEntryAudioInt16Serializer(),
+            create_entry_serializer(encoding),
         )
 
+    def _get_record_template(self, data_name: str, entry: DataBundleEntry,
+                             write_channel_names: bool) -> BufferDescription:
+        # the fields taken from the definition entry are the same for every chunk of a stream,
+        # records are copied from a validated template instead of assigning them one by one
+        cached = self.record_templates.get((data_name, write_channel_names))
+        if cached is not None and (cached[0] is entry or cached[0] == entry):
+            return cached[1]
+        template = BufferDescription(
+            sample_rate=entry.sample_rate,
+            timeline_axis=entry.time_axis,
+            channel_axis=entry.channel_axis,
+        )
+        if write_channel_names:
+            template.channel_names = entry.channel_names
+        self.record_templates[(data_name, write_channel_names)] = (entry, template)
+        return template
+
     def _update_description(self, description: MotionDataDescription, data_list: List[np.ndarray],
-                            data_bundle: DataBundle, write_channel_names: bool):
+                            data_bundle: DataBundle, write_channel_names: bool, force_flush: bool = False):
         definition = data_bundle.definition
         for data_name, registry in self.name_mapping.items():
             entry = definition.find_entry(data_name)
             if entry is None:
                 continue
             data_item = data_bundle.get_data(data_name)
-
-            data_desc = BufferDescription()
-            data_desc.sample_rate = entry.sample_rate
-            data_desc.data_id = len(data_list)
-            data_desc.timeline_axis = entry.time_axis
-            data_desc.channel_axis = entry.channel_axis
-            if write_channel_names:
-                data_desc.channel_names = entry.channel_names
+            template = self._get_record_template(data_name, entry, write_channel_names)
 
             if isinstance(data_item, np.ndarray):
-                data_desc.shape = list(data_item.shape)
-                data_desc.data_type = data_item.dtype.name
+                data_desc = template.model_copy(update={
+                    "data_id": len(data_list),
+                    "shape": list(data_item.shape),
+                    "data_type": data_item.dtype.name,
+                    "metadata": {},
+                })
                 if registry.serializer is not None:
                     serialize_result = registry.serializer.serialize(
                         registry.serializer_context,
                         description,
                         data_desc,
                         data_item,
+                        force_flush,
                     )
                     data_desc = serialize_result.buffer_descriptor
                     data_item = serialize_result.data
@@ -81,8 +149,12 @@ class MotionDataSerializer:
                     if registry.output_data_type.name != str(data_item.dtype):
                         data_item = data_item.astype(registry.output_data_type)
             elif isinstance(data_item, str):
-                data_desc.data_type = np.dtype(np.uint8).name
-                data_desc.shape = [len(data_item)]
+                data_desc = template.model_copy(update={
+                    "data_id": len(data_list),
+                    "shape": [len(data_item)],
+                    "data_type": np.dtype(np.uint8).name,
+                    "metadata": {},
+                })
             else:
                 logger.warning(f"Unsupported data type {type(data_item)} for data {data_name}.")
                 continue
@@ -90,36 +162,106 @@ class MotionDataSerializer:
             description.data_records[registry.name] = data_desc
             data_list.append(data_item)
 
-    @classmethod
-    def _dump_to_bytes(cls, description: MotionDataDescription, data_list: List[np.ndarray]):
+    @staticmethod
+    def _collect_buffers(description: MotionDataDescription, data_list: List[np.ndarray]):
+        """
+        Byte views of the records in description order, offsets are assigned to the descriptors.
+        Records without data have an empty view.
+        """
+        buffers = []
         binary_offset = 0
-        binary_data = bytes()
         for data_name, data_desc in description.data_records.items():
-            if data_desc.data_id < 0:
-                continue
-            data_item = data_list[data_desc.data_id]
-            if isinstance(data_item, bytes):
-                data_size = len(data_item)
-                binary_data += data_item
-            elif isinstance(data_item, np.ndarray):
-                data_size = data_item.nbytes
-                binary_data += data_item.tobytes()
-            elif isinstance(data_item, str):
-                raw_bytes = data_item.encode("utf-8")
-                data_size = len(raw_bytes)
-                binary_data += raw_bytes
-            else:
+            buffer = None
+            if data_desc.data_id >= 0:
+                data_item = data_list[data_desc.data_id]
+                if isinstance(data_item, (bytes, bytearray)):
+                    buffer = memoryview(data_item)
+                elif isinstance(data_item, np.ndarray):
+                    buffer = memoryview(np.ascontiguousarray(data_item).reshape(-1)).cast("B")
+                elif isinstance(data_item, str):
+                    buffer = memoryview(data_item.encode("utf-8"))
+            if buffer is None:
+                buffers.append(memoryview(b""))
                 continue
             data_desc.data_offset = binary_offset
-            binary_offset += data_size
+            binary_offset += buffer.nbytes
+            buffers.append(buffer)
+        return buffers, binary_offset
+
+    @staticmethod
+    def _write_buffers(message: bytearray, position: int, buffers: List[memoryview]):
+        for buffer in buffers:
+            message[position:position + buffer.nbytes] = buffer
+            position += buffer.nbytes
+
+    def _dump_to_bytes(self, description: MotionDataDescription, data_list: List[np.ndarray]) -> bytearray:
+        """
+        Pack the message as JBIN fourcc, json size, binary size, json description and binary
+        records. Record sizes are known before writing, so the message is filled into one
+        preallocated buffer and every array is copied once.
+        """
+        buffers, binary_size = self._collect_buffers(description, data_list)
+        desc_bytes = description.model_dump_json().encode("utf-8")
+        json_end = JSON_HEADER.size + len(desc_bytes)
+        message = bytearray(json_end + binary_size)
+        JSON_HEADER.pack_into(message, 0, b"JBIN", len(desc_bytes), binary_size)
+        message[JSON_HEADER.size:json_end] = desc_bytes
+        self._write_buffers(message, json_end, buffers)
+        return message
+
+    def _get_description_key(self, description: MotionDataDescription):
+        # everything a compact message does not carry, None when it can not be compared
+        if description.events:
+            return None
+        records = tuple(
+            (name, data_desc.data_type, tuple(size for axis, size in enumerate(data_desc.shape)
+                                             if axis != data_desc.timeline_axis % max(1, len(data_desc.shape))),
+             data_desc.sample_rate, data_desc.timeline_axis, data_desc.channel_axis,
+             tuple(data_desc.channel_names or ()), tuple(data_desc.metadata.items()))
+            for name, data_desc in description.data_records.items()
+        )
+        key = (records, tuple((description.metadata or {}).items()), description.batch_name)
+        try:
+            hash(key)
+        except TypeError:
+            return None
+        return key
 
-        fourcc = b"JBIN"
-        json_str = description.model_dump_json()
-        desc_bytes = bytes(json_str, "utf-8")
-        json_size = len(desc_bytes)
-        bin_size = len(binary_data)
-        header = fourcc + struct.pack("<II", json_size, bin_size)
-        return header + desc_bytes + binary_data
+    def _dump_to_compact_bytes(self, description: MotionDataDescription, data_list: List[np.ndarray]) -> bytearray:
+        """
+        Pack the message as MBIN fourcc, batch id, flags, record count and json size, then per
+        record its sample count along the timeline axis, offset and size, then the optional json
+        description and the binary records. The json description is only written when
+        anything else than these fields changed since the last one, it replaces the
+        description the client keeps and the record table follows the order of its records.
+        """
+        buffers, binary_size = self._collect_buffers(description, data_list)
+        description_key = self._get_description_key(description)
+        flags = 0
+        if description.start_of_batch:
+            flags |= COMPACT_FLAG_START_OF_BATCH
+        if description.end_of_batch:
+            flags |= COMPACT_FLAG_END_OF_BATCH
+        desc_bytes = b""
+        if description_key is None or description_key != self.last_description_key:
+            flags |= COMPACT_FLAG_DESCRIPTION
+            desc_bytes = description.model_dump_json().encode("utf-8")
+        self.last_description_key = description_key
+
+        record_count = len(description.data_records)
+        json_start = COMPACT_HEADER.size + record_count * COMPACT_RECORD.size
+        json_end = json_start + len(desc_bytes)
+        message = bytearray(json_end + binary_size)
+        COMPACT_HEADER.pack_into(message, 0, b"MBIN", description.batch_id or 0, flags, record_count,
+                                 len(desc_bytes))
+        position = COMPACT_HEADER.size
+        for data_desc, buffer in zip(description.data_records.values(), buffers):
+            COMPACT_RECORD.pack_into(message, position, data_desc.get_sample_num(), data_desc.data_offset,
+                                     buffer.nbytes)
+            position += COMPACT_RECORD.size
+        message[json_start:json_end] = desc_bytes
+        self._write_buffers(message, json_end, buffers)
+        return message
 
     def _serialize_data_bundle(self, data: DataBundle, include_channel_names: bool = False,
                                definition_only: bool = False):
@@ -134,6 +276,8 @@ class MotionDataSerializer:
 
             if self.last_batch_name is not None and batch_name != self.last_batch_name:
                 self.batch_num += 1
+                # entry serializers keep state within a batch only
+                self.reset()
 
             description.batch_name = batch_name
             description.batch_id = self.batch_num
@@ -141,15 +285,20 @@ class MotionDataSerializer:
             description.end_of_batch = data.end_of_stream
 
             self.last_batch_name = batch_name
-
-            if description.end_of_batch:
-                self.reset()
         else:
             self.reset()
+            description.metadata["motion_format"] = self.motion_format
+            self.last_description_key = None
 
         write_channel_names = include_channel_names or definition_only
-        self._update_description(description, data_items, data, write_channel_names)
+        # the last message of a batch flushes the entry serializers before their state is reset
+        self._update_description(description, data_items, data, write_channel_names,
+                                 force_flush=bool(description.end_of_batch))
+        if description.end_of_batch or definition_only:
+            self.reset()
 
+        if self.motion_format == MOTION_FORMAT_COMPACT and not definition_only:
+            return self._dump_to_compact_bytes(description, data_items)
         return self._dump_to_bytes(description, data_items)
 
     def _serialize_definition(self, definition: DataBundleDefinition, include_channel_names: bool = False):
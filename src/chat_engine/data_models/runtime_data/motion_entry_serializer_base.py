@@ -1,6 +1,6 @@
 from abc import ABC, abstractmethod
 from dataclasses import dataclass
-from typing import Any
+from typing import Any, Union
 
 import numpy as np
 
@@ -10,7 +10,8 @@ from chat_engine.data_models.runtime_data.motion_data_descriptors import BufferD
 @dataclass
 class EntrySerializeResult:
     buffer_descriptor: BufferDescription
-    data: bytes
+    # arrays are written into the message without an intermediate bytes copy
+    data: Union[bytes, bytearray, np.ndarray]
 
 
 class BaseMotionEntrySerializer(ABC):
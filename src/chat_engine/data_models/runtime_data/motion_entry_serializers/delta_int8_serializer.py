@@ -0,0 +1,56 @@
+from dataclasses import dataclass
+from typing import Any, Optional
+
+import numpy as np
+
+from chat_engine.data_models.runtime_data.motion_data_descriptors import MotionDataDescription, BufferDescription
+from chat_engine.data_models.runtime_data.motion_entry_serializer_base import BaseMotionEntrySerializer, \
+    EntrySerializeResult
+
+
+@dataclass
+class DeltaEncodeContext:
+    # the last frame as the client reconstructs it
+    last_frame: Optional[np.ndarray] = None
+
+
+class MotionEntryDeltaInt8Serializer(BaseMotionEntrySerializer):
+    """
+    Encode every frame as the int8 difference to the previous frame in units of step, across
+    the messages of a batch. Differences are taken to the frame the client reconstructs, so
+    rounding errors do not accumulate. The client starts every batch from zeros and adds
+    q * step frame by frame along the timeline axis.
+    """
+    encoding = "delta_int8"
+
+    def __init__(self, step: float = 1 / 127):
+        self.step = np.float32(step)
+
+    def create_context(self) -> Any:
+        return DeltaEncodeContext()
+
+    def serialize(self, context: DeltaEncodeContext, motion_data_descriptor: MotionDataDescription,
+                  buffer_descriptor: BufferDescription,
+                  data: np.ndarray, force_flush: bool = False) -> EntrySerializeResult:
+        timeline_axis = buffer_descriptor.timeline_axis or 0
+        frames = np.moveaxis(data.astype(np.float32), timeline_axis, 0)
+        last_frame = context.last_frame
+        if last_frame is None or last_frame.shape != frames.shape[1:]:
+            last_frame = np.zeros(frames.shape[1:], dtype=np.float32)
+        deltas = np.empty(frames.shape, dtype=np.int8)
+        for i, frame in enumerate(frames):
+            delta = np.rint((frame - last_frame) / self.step).clip(-127, 127).astype(np.int8)
+            last_frame = last_frame + delta.astype(np.float32) * self.step
+            deltas[i] = delta
+        context.last_frame = last_frame
+        out_data = np.moveaxis(deltas, 0, timeline_axis)
+        return EntrySerializeResult(
+            data=out_data,
+            buffer_descriptor=buffer_descriptor.model_copy(update={
+                "data_type": str(out_data.dtype),
+                "metadata": {**buffer_descriptor.metadata, "encoding": self.encoding, "step": repr(float(self.step))},
+            }),
+        )
+
+    def reset(self, context: DeltaEncodeContext):
+        context.last_frame = None
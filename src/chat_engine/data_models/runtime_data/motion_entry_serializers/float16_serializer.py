@@ -0,0 +1,24 @@
+from typing import Any
+
+import numpy as np
+
+from chat_engine.data_models.runtime_data.motion_data_descriptors import MotionDataDescription, BufferDescription
+from chat_engine.data_models.runtime_data.motion_entry_serializer_base import BaseMotionEntrySerializer, \
+    EntrySerializeResult
+
+
+class MotionEntryFloat16Serializer(BaseMotionEntrySerializer):
+    def create_context(self) -> Any:
+        return None
+
+    def serialize(self, _context, motion_data_descriptor: MotionDataDescription,
+                  buffer_descriptor: BufferDescription,
+                  data: np.ndarray, force_flush: bool = False) -> EntrySerializeResult:
+        out_data = data.astype(np.float16)
+        return EntrySerializeResult(
+            data=out_data,
+            buffer_descriptor=buffer_descriptor.model_copy(update={"data_type": str(out_data.dtype)}),
+        )
+
+    def reset(self, context: Any):
+        pass
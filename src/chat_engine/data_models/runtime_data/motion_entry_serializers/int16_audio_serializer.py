@@ -19,17 +19,16 @@ class MotionEntryAudioInt16Serializer(BaseMotionEntrySerializer):
                data: np.ndarray, force_flush: bool = False) -> EntrySerializeResult:
         if str(data.dtype) == "int16":
             return EntrySerializeResult(
-                data=data.tobytes(),
+                data=data,
                 buffer_descriptor=buffer_descriptor,
             )
-        out_descriptor = BufferDescription.model_validate(buffer_descriptor.model_dump())
         out_data = data
         if data.dtype in (np.float16, np.float32, np.float64):
             out_data = data * 32767
         out_data = out_data.astype(np.int16)
-        out_descriptor.data_type = str(out_data.dtype)
+        out_descriptor = buffer_descriptor.model_copy(update={"data_type": str(out_data.dtype)})
         result = EntrySerializeResult(
-            data=out_data.tobytes(),
+            data=out_data,
             buffer_descriptor=out_descriptor,
         )
         return result
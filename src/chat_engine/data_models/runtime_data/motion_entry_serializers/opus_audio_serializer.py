@@ -0,0 +1,122 @@
+import struct
+from dataclasses import dataclass
+from typing import Any, Optional
+
+import av
+import numpy as np
+
+from chat_engine.data_models.runtime_data.motion_data_descriptors import MotionDataDescription, BufferDescription
+from chat_engine.data_models.runtime_data.motion_entry_serializer_base import BaseMotionEntrySerializer, \
+    EntrySerializeResult
+
+OPUS_SAMPLE_RATES = (8000, 12000, 16000, 24000, 48000)
+
+
+@dataclass
+class OpusEncodeContext:
+    encoder: Optional[av.AudioCodecContext] = None
+    # samples waiting for a full opus frame, [channels, samples] float32
+    pending: Optional[np.ndarray] = None
+    pts: int = 0
+    # encoder lookahead at the stream sample rate, the decoder drops these samples first
+    pre_skip: int = 0
+
+
+class MotionEntryAudioOpusSerializer(BaseMotionEntrySerializer):
+    """
+    Encode audio with one opus encoder per batch, so the encoder state carries over between
+    messages. Samples that do not fill a frame wait for the next message, the last message
+    of a batch pads and flushes them. The record holds the opus packets, each prefixed with
+    its uint16 little endian size, and its shape counts the encoded samples. The pre_skip
+    metadata is the encoder lookahead, the decoded audio of a batch starts after that many
+    samples.
+    """
+    encoding = "opus"
+
+    def __init__(self, bitrate: int = 32000, frame_duration_ms: int = 20):
+        self.bitrate = bitrate
+        self.frame_duration_ms = frame_duration_ms
+
+    def create_context(self) -> Any:
+        return OpusEncodeContext()
+
+    def _create_encoder(self, sample_rate: int, channel_num: int):
+        if sample_rate not in OPUS_SAMPLE_RATES:
+            raise ValueError(f"Opus does not support sample rate {sample_rate}, expected one of {OPUS_SAMPLE_RATES}.")
+        if channel_num not in (1, 2):
+            raise ValueError(f"Opus serializer supports mono and stereo audio, got {channel_num} channels.")
+        encoder = av.CodecContext.create("libopus", "w")
+        encoder.sample_rate = sample_rate
+        encoder.layout = "mono" if channel_num == 1 else "stereo"
+        encoder.format = "flt"
+        encoder.bit_rate = self.bitrate
+        encoder.options = {"frame_duration": str(self.frame_duration_ms), "application": "voip"}
+        encoder.open()
+        return encoder
+
+    @staticmethod
+    def _get_pre_skip(encoder, sample_rate: int) -> int:
+        # the OpusHead in the extradata holds the pre skip at 48khz as uint16 little endian at byte 10
+        header = bytes(encoder.extradata or b"")
+        if len(header) < 12 or not header.startswith(b"OpusHead"):
+            return 0
+        pre_skip, = struct.unpack_from("<H", header, 10)
+        return pre_skip * sample_rate // 48000
+
+    def serialize(self, context: OpusEncodeContext, motion_data_descriptor: MotionDataDescription,
+                  buffer_descriptor: BufferDescription,
+                  data: np.ndarray, force_flush: bool = False) -> EntrySerializeResult:
+        sample_rate = int(buffer_descriptor.sample_rate)
+        if data.ndim > 1:
+            data = np.moveaxis(data, buffer_descriptor.timeline_axis, -1)
+        audio = data.reshape(-1, data.shape[-1])
+        if np.issubdtype(audio.dtype, np.integer):
+            audio = audio.astype(np.float32) / 32768
+        else:
+            audio = audio.astype(np.float32)
+        if context.encoder is None:
+            context.encoder = self._create_encoder(sample_rate, audio.shape[0])
+            context.pre_skip = self._get_pre_skip(context.encoder, sample_rate)
+            context.pending = np.zeros((audio.shape[0], 0), dtype=np.float32)
+        frame_size = sample_rate * self.frame_duration_ms // 1000
+        samples = np.concatenate([context.pending, audio], axis=1)
+        frame_count = samples.shape[1] // frame_size
+        if force_flush and samples.shape[1] > frame_count * frame_size:
+            frame_count += 1
+            samples = np.pad(samples, ((0, 0), (0, frame_count * frame_size - samples.shape[1])))
+        context.pending = samples[:, frame_count * frame_size:]
+
+        packets = []
+        for i in range(frame_count):
+            # flt is interleaved, channels go along the second axis of a packed frame
+            frame_samples = np.ascontiguousarray(samples[:, i * frame_size:(i + 1) * frame_size].T).reshape(1, -1)
+            frame = av.AudioFrame.from_ndarray(frame_samples, format="flt", layout=context.encoder.layout.name)
+            frame.sample_rate = sample_rate
+            frame.pts = context.pts
+            context.pts += frame_size
+            packets.extend(context.encoder.encode(frame))
+        pre_skip = context.pre_skip
+        if force_flush:
+            packets.extend(context.encoder.encode(None))
+            self.reset(context)
+
+        payloads = [bytes(packet) for packet in packets]
+        out_data = bytearray(sum(2 + len(payload) for payload in payloads))
+        position = 0
+        for payload in payloads:
+            struct.pack_into("<H", out_data, position, len(payload))
+            out_data[position + 2:position + 2 + len(payload)] = payload
+            position += 2 + len(payload)
+        out_descriptor = buffer_descriptor.model_copy(update={
+            "data_type": str(np.dtype(np.uint8)),
+            "shape": buffer_descriptor.get_shape_from_sample_num(len(payloads) * frame_size),
+            "metadata": {**buffer_descriptor.metadata, "encoding": self.encoding, "frame_size": str(frame_size),
+                         "pre_skip": str(pre_skip)},
+        })
+        return EntrySerializeResult(data=out_data, buffer_descriptor=out_descriptor)
+
+    def reset(self, context: OpusEncodeContext):
+        context.encoder = None
+        context.pending = None
+        context.pts = 0
+        context.pre_skip = 0
@@ -0,0 +1,59 @@
+from typing import Any
+
+import numpy as np
+
+from chat_engine.data_models.runtime_data.motion_data_descriptors import MotionDataDescription, BufferDescription
+from chat_engine.data_models.runtime_data.motion_entry_serializer_base import BaseMotionEntrySerializer, \
+    EntrySerializeResult
+
+
+class MotionEntryUInt8QuantizedSerializer(BaseMotionEntrySerializer):
+    """
+    Quantize every channel to uint8 over its range in the message. The record holds the
+    float32 minimum of every channel, the float32 scale of every channel and the uint8
+    values in the described shape, a value decodes as minimum + q * scale.
+    """
+    encoding = "uint8_affine"
+
+    def create_context(self) -> Any:
+        return None
+
+    def serialize(self, _context, motion_data_descriptor: MotionDataDescription,
+                  buffer_descriptor: BufferDescription,
+                  data: np.ndarray, force_flush: bool = False) -> EntrySerializeResult:
+        channel_axis = buffer_descriptor.channel_axis
+        values = data.astype(np.float32)
+        if channel_axis is None:
+            values = values.reshape(-1, 1)
+        else:
+            values = np.moveaxis(values, channel_axis, -1)
+        channel_num = values.shape[-1]
+        flat_values = values.reshape(-1, channel_num)
+        if flat_values.shape[0] > 0:
+            minimum = flat_values.min(axis=0)
+            scale = (flat_values.max(axis=0) - minimum) / 255
+        else:
+            minimum = np.zeros(channel_num, dtype=np.float32)
+            scale = np.zeros(channel_num, dtype=np.float32)
+        # constant channels decode to their minimum
+        safe_scale = np.where(scale > 0, scale, 1).astype(np.float32)
+        quantized = np.rint((values - minimum) / safe_scale).clip(0, 255).astype(np.uint8)
+        if channel_axis is None:
+            quantized = quantized.reshape(data.shape)
+        else:
+            quantized = np.moveaxis(quantized, -1, channel_axis)
+        out_data = np.concatenate([
+            minimum.astype("<f4").view(np.uint8),
+            scale.astype("<f4").view(np.uint8),
+            np.ascontiguousarray(quantized).reshape(-1),
+        ])
+        return EntrySerializeResult(
+            data=out_data,
+            buffer_descriptor=buffer_descriptor.model_copy(update={
+                "data_type": str(quantized.dtype),
+                "metadata": {**buffer_descriptor.metadata, "encoding": self.encoding},
+            }),
+        )
+
+    def reset(self, context: Any):
+        pass
@@ -0,0 +1,178 @@
+import functools
+import math
+
+from loguru import logger
+import numpy as np
+
+try:
+    import soxr
+except ImportError:
+    soxr = None
+
+
+RESAMPLER_BACKEND_AUTO = "auto"
+RESAMPLER_BACKEND_SOXR = "soxr"
+RESAMPLER_BACKEND_NUMPY = "numpy"
+
+
+@functools.lru_cache(maxsize=32)
+def _design_polyphase_filter(up: int, down: int, half_width: int, beta: float, rolloff: float) -> np.ndarray:
+    """
+    Design a Kaiser windowed sinc low pass filter and split it into `up` phases.
+    Returns an array of shape (up, 2 * half_width + 1), row p holds the taps for phase p,
+    ordered so that tap k multiplies the input sample k positions behind the base sample.
+    The result is cached per rate pair and shared between resamplers, so it is read only.
+    """
+    taps_per_phase = 2 * half_width + 1
+    cutoff = min(1.0, up / down) * rolloff
+    # offset of every tap from the filter center, measured in input samples
+    j = np.arange(up * taps_per_phase, dtype=np.float64)
+    u = (j - half_width * up) / up
+    window = np.i0(beta * np.sqrt(np.clip(1.0 - (u / (half_width + 1)) ** 2, 0.0, 1.0))) / np.i0(beta)
+    h = cutoff * np.sinc(cutoff * u) * window
+    phases = h.reshape(taps_per_phase, up).T.copy()
+    # keep unity gain for every phase so that DC passes through unchanged
+    phases /= phases.sum(axis=1, keepdims=True)
+    phases = phases.astype(np.float32)
+    phases.flags.writeable = False
+    return phases
+
+
+def _resolve_backend(backend: str) -> str:
+    if backend == RESAMPLER_BACKEND_AUTO:
+        return RESAMPLER_BACKEND_SOXR if soxr is not None else RESAMPLER_BACKEND_NUMPY
+    if backend == RESAMPLER_BACKEND_SOXR and soxr is None:
+        logger.warning("soxr is not installed, fall back to numpy resampler")
+        return RESAMPLER_BACKEND_NUMPY
+    if backend not in (RESAMPLER_BACKEND_SOXR, RESAMPLER_BACKEND_NUMPY):
+        raise ValueError(f"Unknown resampler backend {backend}")
+    return backend
+
+
+class StreamingResampler:
+    """
+    Stateful resampler for mono float audio delivered in chunks.
+
+    Input history and output phase are carried across calls to `process`, so feeding a signal
+    chunk by chunk gives the same samples as resampling it in one piece, without the edge
+    artifacts of resampling every chunk independently. Call `flush` at the end of a stream to
+    drain the filter tail, the total output length is then ceil(input_length * target / source).
+
+    soxr is used when it is installed, otherwise a numpy polyphase filter with per rate pair
+    cached taps is used.
+    """
+
+    def __init__(self, orig_sr: int, target_sr: int, backend: str = RESAMPLER_BACKEND_AUTO,
+                 half_width: int = 16, beta: float = 8.6, rolloff: float = 0.945):
+        if orig_sr <= 0 or target_sr <= 0:
+            raise ValueError(f"Invalid sample rates {orig_sr} -> {target_sr}")
+        self.orig_sr = orig_sr
+        self.target_sr = target_sr
+        self.backend = _resolve_backend(backend)
+        gcd = math.gcd(orig_sr, target_sr)
+        self._up = target_sr // gcd
+        self._down = orig_sr // gcd
+        self._half_width = half_width
+        self._input_count = 0
+        self._output_count = 0
+
+        self._soxr_stream = None
+        if self.backend == RESAMPLER_BACKEND_SOXR and not self.passthrough:
+            self._soxr_stream = soxr.ResampleStream(orig_sr, target_sr, 1, dtype="float32", quality="HQ")
+            return
+
+        self._filter = _design_polyphase_filter(self._up, self._down, half_width, beta, rolloff)
+        self._taps = self._filter.shape[1]
+        self._tap_offsets = np.arange(self._taps)
+        # history and incoming chunk share one growable work buffer
+        self._buffer = np.zeros(self._taps - 1 + 4096, dtype=np.float32)
+
+    @property
+    def passthrough(self) -> bool:
+        return self._up == self._down
+
+    def reset(self):
+        self._input_count = 0
+        self._output_count = 0
+        if self._soxr_stream is not None:
+            self._soxr_stream.clear()
+        elif not self.passthrough:
+            self._buffer[:self._taps - 1] = 0
+
+    def process(self, audio: np.ndarray) -> np.ndarray:
+        audio = np.asarray(audio, dtype=np.float32).reshape(-1)
+        if self.passthrough:
+            self._input_count += audio.shape[0]
+            self._output_count += audio.shape[0]
+            return audio
+        if self._soxr_stream is not None:
+            output = self._soxr_stream.resample_chunk(audio)
+            self._input_count += audio.shape[0]
+            self._output_count += output.shape[0]
+            return output
+        return self._process(audio, self._available_output_count(self._input_count + audio.shape[0]))
+
+    def flush(self) -> np.ndarray:
+        expected_total = -(-self._input_count * self._up // self._down)
+        if self.passthrough:
+            return np.zeros(0, dtype=np.float32)
+        if self._soxr_stream is not None:
+            output = self._soxr_stream.resample_chunk(np.zeros(0, dtype=np.float32), last=True)
+            # keep the same total length as the numpy backend
+            output = output[:max(expected_total - self._output_count, 0)]
+            self._output_count += output.shape[0]
+            return output
+        if expected_total <= self._output_count:
+            return np.zeros(0, dtype=np.float32)
+        tail = np.zeros(self._half_width + 1, dtype=np.float32)
+        input_count = self._input_count
+        output = self._process(tail, expected_total)
+        self._input_count = input_count
+        return output
+
+    def _available_output_count(self, input_total: int) -> int:
+        # output n is centered on input position n * down / up, it needs half_width samples after it
+        last = (input_total * self._up - 1 - self._half_width * self._up) // self._down
+        return max(last + 1, self._output_count)
+
+    def _process(self, audio: np.ndarray, output_total: int) -> np.ndarray:
+        history_length = self._taps - 1
+        buffer_length = history_length + audio.shape[0]
+        if self._buffer.shape[0] < buffer_length:
+            buffer = np.zeros(buffer_length * 2, dtype=np.float32)
+            buffer[:history_length] = self._buffer[:history_length]
+            self._buffer = buffer
+        buffer = self._buffer
+        buffer[history_length:buffer_length] = audio
+
+        output_count = output_total - self._output_count
+        output = np.empty(max(output_count, 0), dtype=np.float32)
+        if output_count > 0:
+            positions = np.arange(self._output_count, output_total, dtype=np.int64) * self._down \
+                + self._half_width * self._up
+            base, phase = np.divmod(positions, self._up)
+            buffer_index = base - self._input_count + history_length
+            frames = buffer[buffer_index[:, np.newaxis] - self._tap_offsets[np.newaxis, :]]
+            np.einsum("ij,ij->i", frames, self._filter[phase], out=output)
+
+        # move the tail of this chunk to the front as history for the next one
+        buffer[:history_length] = buffer[buffer_length - history_length:buffer_length]
+        self._input_count += audio.shape[0]
+        self._output_count = output_total
+        return output
+
+
+def resample(audio: np.ndarray, orig_sr: int, target_sr: int,
+             backend: str = RESAMPLER_BACKEND_AUTO) -> np.ndarray:
+    """
+    Resample a complete mono float signal, output length is ceil(len(audio) * target_sr / orig_sr).
+    Filters are cached per rate pair, so this is cheap to call repeatedly on fixed length slices.
+    """
+    if orig_sr == target_sr:
+        return np.asarray(audio, dtype=np.float32).reshape(-1)
+    resampler = StreamingResampler(orig_sr, target_sr, backend=backend)
+    output = resampler.process(audio)
+    tail = resampler.flush()
+    if tail.shape[0] == 0:
+        return output
+    return np.concatenate([output, tail])
@@ -1,5 +1,5 @@
+import atexit
 import os
-import queue
 import sys
 import time
 from typing import Dict, Optional, cast, List
@@ -17,21 +17,31 @@ from chat_engine.data_models.chat_data.chat_data_model import ChatData
 from chat_engine.data_models.chat_engine_config_data import HandlerBaseConfigModel, ChatEngineConfigModel
 from chat_engine.data_models.runtime_data.data_bundle import DataBundleDefinition, DataBundleEntry, DataBundle
 from engine_utils.directory_info import DirectoryInfo
-from engine_utils.general_slicer import SliceContext, slice_data
+from handlers.avatar.lam.lam_expression_streamer import ExpressionStreamer
+from handlers.avatar.lam.lam_inference_worker import ExpressionRequest, LamInferenceWorker
 
 
 class AvatarLAMConfig(HandlerBaseConfigModel, BaseModel):
     model_name: str = "LAM_audio2exp"
     feature_extractor_model_name: str = "wav2vec2-base-960h"
     audio_sample_rate: int = Field(default=24000)
+    # seconds of audio per inference, rounded to whole frames, shorter chunks start the expressions sooner
+    # at the cost of more inference calls
+    chunk_duration: float = Field(default=1.0)
+    # first chunk of every speech, defaults to chunk_duration
+    first_chunk_duration: Optional[float] = Field(default=None)
+    # torch threads, set from the inference worker but process wide, so other torch handlers of the
+    # process use it as well, 0 keeps the torch default
+    inference_threads: int = Field(default=0)
+    # cpus of the inference worker and its feature extraction threads, empty for all cpus
+    inference_cpu_affinity: List[int] = Field(default_factory=list)
 
 
 class AvatarLAMContext(HandlerContext):
     def __init__(self, session_id: str):
         super().__init__(session_id)
         self.config: Optional[AvatarLAMConfig] = None
-        self.inference_context = None
-        self.input_slice_context: Optional[SliceContext] = None
+        self.expression_streamer: Optional[ExpressionStreamer] = None
         self.last_speech_id: Optional[str] = None
 
 
@@ -39,6 +49,7 @@ class HandlerAvatarLAM(HandlerBase):
     def __init__(self):
         super().__init__()
         self.infer = None
+        self.inference_worker: Optional[LamInferenceWorker] = None
         self.arkit_channels: List[str] = []
 
     def get_handler_info(self) -> HandlerBaseInfo:
@@ -88,17 +99,37 @@ class HandlerAvatarLAM(HandlerBase):
         for line in open(arkit_channel_list_path, "r"):
             self.arkit_channels.append(line.strip())
 
-        t_start = time.monotonic()
-        # warmup the model
-        context: Optional[Dict] = None
-        self.infer.infer_streaming_audio(
-            context=context,
-            audio=np.zeros([handler_config.audio_sample_rate], dtype=np.float32),
-            ssr=handler_config.audio_sample_rate,
+        # the model is shared by all sessions through one serialized inference worker
+        if self.inference_worker is not None:
+            self.inference_worker.stop()
+            atexit.unregister(self.inference_worker.stop)
+        self.inference_worker = LamInferenceWorker(
+            self._infer_chunk,
+            num_threads=handler_config.inference_threads,
+            cpu_affinity=handler_config.inference_cpu_affinity,
         )
+        self.inference_worker.start()
+        # handlers have no unload step, the worker stops at exit
+        atexit.register(self.inference_worker.stop)
+
+        t_start = time.monotonic()
+        # warmup the model on the worker thread
+        self.inference_worker.submit(
+            np.zeros([handler_config.audio_sample_rate], dtype=np.float32),
+            handler_config.audio_sample_rate,
+            None,
+        ).result()
+        self.inference_worker.reset_metrics()
         dur_warmup = time.monotonic() - t_start
         logger.info(f"LAM_Audio2Expression warmup finished in {dur_warmup * 1000} milliseconds.")
 
+    def _infer_chunk(self, request: ExpressionRequest):
+        return self.infer.infer_streaming_audio(
+            audio=request.audio,
+            ssr=request.sample_rate,
+            context=request.inference_context,
+        )
+
     def create_context(self, session_context: SessionContext,
                        handler_config: Optional[HandlerBaseConfigModel] = None) -> HandlerContext:
         if not isinstance(handler_config, AvatarLAMConfig):
@@ -106,9 +137,15 @@ class HandlerAvatarLAM(HandlerBase):
         context = AvatarLAMContext(session_context.session_info.session_id)
 
         context.config = handler_config
-        context.input_slice_context = SliceContext.create_numpy_slice_context(
-            slice_size=round(handler_config.audio_sample_rate * 1.0),
-            slice_axis=0,
+        context.expression_streamer = ExpressionStreamer(
+            infer_fn=lambda audio, inference_context: self.inference_worker.submit(
+                audio,
+                handler_config.audio_sample_rate,
+                inference_context,
+            ).result(),
+            sample_rate=handler_config.audio_sample_rate,
+            chunk_duration=handler_config.chunk_duration,
+            first_chunk_duration=handler_config.first_chunk_duration,
         )
         return context
 
@@ -157,49 +194,27 @@ class HandlerAvatarLAM(HandlerBase):
         speech_text = inputs.data.get_meta("avatar_speech_text")
 
         audio = inputs.data.get_main_data()
-        audio_segments = queue.Queue()
-        for audio_segment in slice_data(context.input_slice_context, audio.squeeze()):
-            audio_segments.put_nowait(audio_segment)
-        if speech_end:
-            end_segment = context.input_slice_context.flush()
-            if end_segment is not None:
-                audio_segments.put_nowait(end_segment)
-        if audio_segments.empty() and speech_end:
-            audio_segments.put_nowait(np.zeros([50], dtype=np.float32))
-        while not audio_segments.empty():
-            t_start = time.monotonic()
-            audio_segment = audio_segments.get_nowait()
-            result, context_update = self.infer.infer_streaming_audio(
-                audio=audio_segment,
-                ssr=context.config.audio_sample_rate,
-                context=context.inference_context,
-            )
-            context.inference_context = context_update
-            need_flush = speech_end and audio_segments.empty()
-            if need_flush:
-                context.inference_context = None
+        t_start = time.monotonic()
+        for chunk in context.expression_streamer.feed(audio.squeeze(), speech_end):
             output = DataBundle(output_definition)
-            arkit_data = result.get("expression")
-            if arkit_data is None:
-                continue
-
             start_of_stream = speech_id != context.last_speech_id
 
-            output.set_main_data(arkit_data.astype(np.float32))
-            output.set_data("avatar_audio", audio_segment[np.newaxis, ...])
+            output.set_main_data(chunk.expression.astype(np.float32))
+            output.set_data("avatar_audio", chunk.audio[np.newaxis, ...])
             output.add_meta("speech_id", speech_id)
-            output.add_meta("avatar_speech_end", need_flush)
+            output.add_meta("avatar_speech_end", chunk.end_of_speech)
             output.start_of_stream = start_of_stream
-            output.end_of_stream = need_flush
+            output.end_of_stream = chunk.end_of_speech
             if speech_text is not None:
                 output.add_meta("avatar_speech_text", speech_text)
             dur_inference = time.monotonic() - t_start
-            logger.info(f"Inference on {audio_segment.shape[-1] / context.config.audio_sample_rate:.2f} second audio "
+            logger.info(f"Inference on {chunk.audio.shape[-1] / context.config.audio_sample_rate:.2f} second audio "
                         f"finished in {dur_inference * 1000} milliseconds. Got output: {str(output)}")
             context.submit_data(output)
+            t_start = time.monotonic()
 
             context.last_speech_id = speech_id
-            if need_flush:
+            if chunk.end_of_speech:
                 context.last_speech_id = None
 
     def destroy_context(self, context: HandlerContext):
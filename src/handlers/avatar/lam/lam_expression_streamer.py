@@ -0,0 +1,95 @@
+import math
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, Iterator, Optional, Tuple
+
+import numpy as np
+
+
+@dataclass
+class ExpressionChunk:
+    expression: np.ndarray
+    # the audio the expression frames belong to, padded to whole frames at the end of speech
+    audio: np.ndarray
+    end_of_speech: bool = False
+
+
+def frame_aligned_samples(duration: float, sample_rate: int, fps: int = 30) -> int:
+    """
+    Samples of the chunk closest to duration that holds a whole number of expression frames,
+    so the frames of consecutive chunks stay on the audio timeline.
+    """
+    frame_step = fps // math.gcd(sample_rate, fps)
+    frames = max(frame_step, round(duration * fps / frame_step) * frame_step)
+    return frames * sample_rate // fps
+
+
+class ExpressionStreamer:
+    """
+    Cuts the speech audio of a session into frame aligned chunks and runs the streaming
+    audio2expression inference on them, keeping its inference context across the chunks of
+    a speech. The context holds the audio and expressions before a chunk, so every inference
+    window overlaps the audio before it and sub second chunks continue the expression curves
+    of the chunks before them. The first chunk of a speech may be shorter than the others to
+    start the expressions sooner.
+    """
+
+    def __init__(self, infer_fn: Callable[[np.ndarray, Optional[Dict]], Tuple[Dict, Optional[Dict]]],
+                 sample_rate: int, chunk_duration: float = 1.0, first_chunk_duration: Optional[float] = None,
+                 fps: int = 30):
+        """
+        infer_fn: infer_streaming_audio(audio, context) returning the result with its
+                  "expression" frames and the updated context
+        """
+        self.infer_fn = infer_fn
+        self.sample_rate = sample_rate
+        self.fps = fps
+        self.chunk_samples = frame_aligned_samples(chunk_duration, sample_rate, fps)
+        if first_chunk_duration is None:
+            self.first_chunk_samples = self.chunk_samples
+        else:
+            self.first_chunk_samples = frame_aligned_samples(first_chunk_duration, sample_rate, fps)
+        self.inference_context: Any = None
+        self.pending = np.zeros([0], dtype=np.float32)
+        self.chunk_count = 0
+
+    def _next_chunk_samples(self) -> int:
+        return self.first_chunk_samples if self.chunk_count == 0 else self.chunk_samples
+
+    def feed(self, audio: np.ndarray, speech_end: bool = False) -> Iterator[ExpressionChunk]:
+        """
+        Infers the chunks completed by audio one by one, every chunk is yielded as soon as it is
+        inferred.
+        """
+        self.pending = np.concatenate([self.pending, audio.reshape(-1).astype(np.float32, copy=False)])
+        segments = []
+        position = 0
+        chunk_samples = self._next_chunk_samples()
+        while self.pending.shape[0] - position >= chunk_samples:
+            segments.append(self.pending[position:position + chunk_samples])
+            position += chunk_samples
+            self.chunk_count += 1
+            chunk_samples = self._next_chunk_samples()
+        self.pending = self.pending[position:]
+        if speech_end:
+            # the rest is padded with silence to whole frames, a speech ends with at least one frame
+            frame_samples = self.sample_rate / self.fps
+            end_samples = max(1, math.ceil(self.pending.shape[0] / frame_samples))
+            end_samples = round(end_samples * frame_samples)
+            if self.pending.shape[0] > 0 or not segments:
+                segments.append(np.pad(self.pending, (0, end_samples - self.pending.shape[0])))
+            self.pending = np.zeros([0], dtype=np.float32)
+
+        for i, segment in enumerate(segments):
+            result, self.inference_context = self.infer_fn(segment, self.inference_context)
+            end_of_speech = speech_end and i == len(segments) - 1
+            if end_of_speech:
+                self.reset()
+            expression = result.get("expression")
+            if expression is None:
+                continue
+            yield ExpressionChunk(expression=expression, audio=segment, end_of_speech=end_of_speech)
+
+    def reset(self):
+        self.inference_context = None
+        self.pending = np.zeros([0], dtype=np.float32)
+        self.chunk_count = 0
@@ -0,0 +1,166 @@
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, Optional, Sequence, Tuple
+
+import numpy as np
+from loguru import logger
+
+from engine_utils.interval_counter import IntervalCounter
+
+
+@dataclass
+class ExpressionRequest:
+    audio: np.ndarray
+    sample_rate: int
+    # inference context of the session, returned updated with the result
+    inference_context: Any
+    future: Future
+    submit_time: float = field(default_factory=time.perf_counter)
+
+
+@dataclass
+class InferenceWorkerMetrics:
+    chunks: int = 0
+    audio_seconds: float = 0
+    busy_time: float = 0
+    # seconds of audio inferred per second
+    realtime_factor: float = 0
+    p95_latency: float = 0
+
+
+class LamInferenceWorker:
+    """
+    Shares the LAM audio2expression model between the sessions of a process through one
+    serialized worker thread.
+
+    Sessions submit audio chunks with their own inference context instead of calling the
+    model from their handler threads. The worker infers the chunks one at a time in the order
+    they were submitted and hands every session its expression and updated context back
+    through a future. The worker thread sets its cpu affinity before the first inference, so
+    the feature extraction threads it starts stay on those cpus. Its torch thread count goes
+    through torch.set_num_threads, which is process wide and applies to every other torch
+    handler of the process as well.
+    """
+
+    def __init__(self, infer_fn: Callable[[ExpressionRequest], Tuple[Dict, Any]],
+                 num_threads: int = 0, cpu_affinity: Optional[Sequence[int]] = None,
+                 latency_window: int = 1000):
+        """
+        infer_fn: returns the result and the updated inference context of a request
+        num_threads: torch threads of the process, set from the worker thread, 0 keeps the torch default
+        cpu_affinity: cpus of the worker thread and the threads it starts, empty for all cpus
+        """
+        self._infer_fn = infer_fn
+        self._num_threads = num_threads
+        self._cpu_affinity = list(cpu_affinity or [])
+        self._pending: deque[ExpressionRequest] = deque()
+        self._condition = threading.Condition()
+        self._stop_event = threading.Event()
+        self._worker_thread: Optional[threading.Thread] = None
+        self._metrics = InferenceWorkerMetrics()
+        self._latencies = deque(maxlen=latency_window)
+        self._start_time = None
+        self._counter = IntervalCounter("lam_inference_worker", interval=60)
+
+    def start(self):
+        if self._worker_thread is not None:
+            return
+        self._stop_event.clear()
+        self._worker_thread = threading.Thread(target=self._worker_loop, daemon=True)
+        self._worker_thread.start()
+
+    def stop(self):
+        self._stop_event.set()
+        with self._condition:
+            self._condition.notify_all()
+        if self._worker_thread is not None:
+            self._worker_thread.join()
+            self._worker_thread = None
+        with self._condition:
+            pending = list(self._pending)
+            self._pending.clear()
+        for request in pending:
+            request.future.cancel()
+
+    def submit(self, audio: np.ndarray, sample_rate: int, inference_context: Any) -> Future:
+        """
+        return: future of the inference result and the updated inference context
+        """
+        request = ExpressionRequest(audio=audio, sample_rate=sample_rate, inference_context=inference_context,
+                                    future=Future())
+        with self._condition:
+            self._pending.append(request)
+            self._condition.notify_all()
+        return request.future
+
+    def get_metrics(self) -> InferenceWorkerMetrics:
+        with self._condition:
+            metrics = InferenceWorkerMetrics(**vars(self._metrics))
+            latencies = list(self._latencies)
+            start_time = self._start_time
+        if start_time is not None:
+            metrics.realtime_factor = metrics.audio_seconds / max(1e-6, time.perf_counter() - start_time)
+        if latencies:
+            metrics.p95_latency = float(np.percentile(latencies, 95))
+        return metrics
+
+    def reset_metrics(self):
+        with self._condition:
+            self._metrics = InferenceWorkerMetrics()
+            self._latencies.clear()
+            self._start_time = None
+
+    def _pin_thread(self):
+        if self._cpu_affinity:
+            if hasattr(os, "sched_setaffinity"):
+                # pid 0 is the calling thread, threads started from it inherit the affinity
+                os.sched_setaffinity(0, self._cpu_affinity)
+            else:
+                logger.warning("cpu affinity is not supported on this platform, ignored")
+        if self._num_threads > 0:
+            import torch
+            # the intra op pool is shared by the process, other torch handlers use this count too
+            torch.set_num_threads(self._num_threads)
+        logger.info(f"LAM inference worker runs with {self._num_threads or 'default'} torch threads "
+                    f"on cpus {self._cpu_affinity or 'all'}")
+
+    def _next_request(self) -> Optional[ExpressionRequest]:
+        with self._condition:
+            while not self._pending and not self._stop_event.is_set():
+                self._condition.wait(0.1)
+            if self._stop_event.is_set():
+                return None
+            return self._pending.popleft()
+
+    def _run_request(self, request: ExpressionRequest):
+        start_time = time.perf_counter()
+        try:
+            result = self._infer_fn(request)
+        except Exception as e:
+            logger.opt(exception=True).error(f"LAM inference of a chunk failed: {e}")
+            request.future.set_exception(e)
+            return
+        end_time = time.perf_counter()
+        request.future.set_result(result)
+        with self._condition:
+            if self._start_time is None:
+                self._start_time = start_time
+            self._metrics.chunks += 1
+            self._metrics.audio_seconds += request.audio.shape[-1] / request.sample_rate
+            self._metrics.busy_time += end_time - start_time
+            self._latencies.append(end_time - request.submit_time)
+        self._counter.add_property("chunks")
+
+    def _worker_loop(self):
+        try:
+            self._pin_thread()
+        except Exception as e:
+            logger.opt(exception=True).error(f"LAM inference worker pinning failed: {e}")
+        while not self._stop_event.is_set():
+            request = self._next_request()
+            if request is not None:
+                self._run_request(request)
@@ -1,5 +1,5 @@
 from abc import ABC, abstractmethod
-from typing import List
+from typing import List, Optional
 
 import numpy as np
 
@@ -25,12 +25,36 @@ class BaseAlgoAdapter(ABC):
 
     @abstractmethod
     def mouth2full(self, mouth_image: np.ndarray, bg_frame_id: int) -> np.ndarray:
+        """
+        return the full frame horizontally flipped, ready for output
+        """
         pass
 
+    def signal2img_batch(self,
+                         signal_list: List[SignalType],
+                         avatar_status_list: List[AvatarStatus]) -> List[tuple[np.ndarray, int]]:
+        """
+        render several frames in one call, results keep the input order.
+        adapters that can render frames in parallel should override this
+        """
+        return [self.signal2img(signal_data, avatar_status)
+                for signal_data, avatar_status in zip(signal_list, avatar_status_list)]
+
+    def mouth2full_batch(self, mouth_images: List[np.ndarray], bg_frame_ids: List[int]) -> List[np.ndarray]:
+        return [self.mouth2full(mouth_image, bg_frame_id)
+                for mouth_image, bg_frame_id in zip(mouth_images, bg_frame_ids)]
+
     @abstractmethod
     def get_idle_signal(self, idle_frame_count) -> List[SignalType]:
         pass
 
+    def get_idle_frame(self) -> Optional[tuple[np.ndarray, int]]:
+        """
+        return the next prerendered idle frame, already composed and flipped for output,
+        with its bg frame id. None means idle frames have to be rendered from idle signals
+        """
+        return None
+
     @abstractmethod
     def get_algo_config(self) -> AvatarAlgoConfig:
         """
@@ -1,11 +1,16 @@
 
+from concurrent.futures import ThreadPoolExecutor
+import hashlib
+import json
 import os
 import shutil
 import sys
 from typing import Optional
 import subprocess as sp
 
+import cv2
 from loguru import logger
+import numpy as np
 
 from handlers.avatar.liteavatar.algo.base_algo_adapter import BaseAlgoAdapter
 from handlers.avatar.liteavatar.algo.bg_frame_counter import BgFrameCounter
@@ -24,6 +29,9 @@ class Tts2faceCpuAdapter(BaseAlgoAdapter):
         super().__init__()
         self.tts2face = None
         self._bg_counter = None
+        self._render_executor = None
+        self._idle_frames = None
+        self._preflipped = False
         self.handler_root = handler_root
         if self.handler_root is None:
             self.handler_root = os.path.join(DirectoryInfo.get_project_dir(),
@@ -45,8 +53,14 @@ class Tts2faceCpuAdapter(BaseAlgoAdapter):
             )
         bg_step = self.TARGET_FPS // init_option.video_frame_rate
         self.tts2face.load_dynamic_model(data_dir)
+        self._preflipped = self._flip_backgrounds()
         self._bg_counter = BgFrameCounter(len(self.tts2face.ref_img_list), bg_step)
+        if init_option.render_threads > 1:
+            self._render_executor = ThreadPoolExecutor(max_workers=init_option.render_threads,
+                                                       thread_name_prefix="liteavatar_render")
         self.warm_up()
+        if init_option.enable_idle_cache:
+            self._idle_frames = self._load_idle_frames(data_dir)
         return super().init(init_option)
 
     @timeit
@@ -66,9 +80,61 @@ class Tts2faceCpuAdapter(BaseAlgoAdapter):
 
     @timeit
     def mouth2full(self, mouth_image, bg_frame_id, use_bg=False):
-        full_img, _ = self.tts2face.merge_mouth_to_bg(mouth_image, bg_frame_id, use_bg)
+        return self._compose(mouth_image, bg_frame_id, use_bg)
+
+    @timeit
+    def signal2img_batch(self, signal_list, avatar_status_list):
+        # bg frame ids are taken in order before the frames are rendered out of order
+        bg_frame_ids = [self._bg_counter.get_and_update_bg_index() for _ in signal_list]
+        mouth_imgs = self._map(self.tts2face.param2img, signal_list, bg_frame_ids)
+        return list(zip(mouth_imgs, bg_frame_ids))
+
+    @timeit
+    def mouth2full_batch(self, mouth_images, bg_frame_ids, use_bg=False):
+        return self._map(lambda mouth_image, bg_frame_id: self._compose(mouth_image, bg_frame_id, use_bg),
+                         mouth_images, bg_frame_ids)
+
+    def _compose(self, mouth_image, bg_frame_id, use_bg=False):
+        """
+        merge mouth into background, the result is horizontally flipped for output
+        """
+        if not self._preflipped:
+            full_img, _ = self.tts2face.merge_mouth_to_bg(mouth_image, bg_frame_id, use_bg)
+            return cv2.flip(full_img, 1)
+        # backgrounds and mouth box are mirrored already, only the small mouth image is flipped here
+        full_img, _ = self.tts2face.merge_mouth_to_bg(self._flip_mouth(mouth_image), bg_frame_id, use_bg)
         return full_img
 
+    @staticmethod
+    def _flip_mouth(mouth_image):
+        if isinstance(mouth_image, np.ndarray):
+            # HWC image
+            return np.ascontiguousarray(mouth_image[:, ::-1])
+        # generator output tensor, width is the last dim
+        return mouth_image.flip(-1)
+
+    def _flip_backgrounds(self) -> bool:
+        """
+        mirror background frames, merge mask and mouth box once, so that merge_mouth_to_bg
+        composes frames which are already flipped and no full frame cv2.flip is needed
+        """
+        tts2face = self.tts2face
+        if not all(hasattr(tts2face, name) for name in ("bg_data_list", "x1", "x2")):
+            logger.warning("liteavatar backgrounds are not accessible, flip every composed frame instead")
+            return False
+        width = tts2face.bg_data_list[0].shape[1]
+        tts2face.bg_data_list = [np.ascontiguousarray(bg[:, ::-1]) for bg in tts2face.bg_data_list]
+        tts2face.x1, tts2face.x2 = width - tts2face.x2, width - tts2face.x1
+        if hasattr(tts2face, "merge_mask"):
+            tts2face.merge_mask = np.ascontiguousarray(tts2face.merge_mask[:, ::-1])
+        logger.info("use {} pre-flipped backgrounds", len(tts2face.bg_data_list))
+        return True
+
+    def _map(self, func, *iterables):
+        if self._render_executor is None or len(iterables[0]) <= 1:
+            return list(map(func, *iterables))
+        return list(self._render_executor.map(func, *iterables))
+
     def get_idle_signal(self, idle_frame_count):
         idle_param = self.tts2face.get_idle_param()
         idle_signal_list = []
@@ -76,6 +142,111 @@ class Tts2faceCpuAdapter(BaseAlgoAdapter):
             idle_signal_list.append(idle_param)
         return idle_signal_list
 
+    def get_idle_frame(self):
+        if self._idle_frames is None:
+            return None
+        bg_frame_id = self._bg_counter.get_and_update_bg_index()
+        return self._idle_frames[bg_frame_id], bg_frame_id
+
+    def _load_idle_frames(self, data_dir) -> Optional[np.ndarray]:
+        """
+        the idle param is constant, so the idle animation is one flipped full frame per background.
+        frames are rendered once into a npy file next to the avatar data and memory mapped afterwards,
+        a json file next to it keeps the digest of what the frames were rendered from
+        """
+        bg_count = len(self.tts2face.ref_img_list)
+        cache_path = os.path.join(data_dir, "idle_frames.npy")
+        meta_path = os.path.join(data_dir, "idle_frames.json")
+        idle_param = self.tts2face.get_idle_param()
+        digest = self._idle_frames_digest(idle_param)
+        frame_shape = self._full_frame_shape()
+        idle_frames = self._load_cached_idle_frames(cache_path, meta_path, digest, bg_count, frame_shape)
+        if idle_frames is not None:
+            logger.info("use idle frame cache {}", cache_path)
+            return idle_frames
+
+        logger.info("render {} idle frames to {}", bg_count, cache_path)
+        tmp_path = cache_path + ".tmp.npy"
+        try:
+            idle_frames = None
+            for bg_frame_id in range(bg_count):
+                mouth_img = self.tts2face.param2img(idle_param, bg_frame_id)
+                full_img = self._compose(mouth_img, bg_frame_id)
+                if idle_frames is None:
+                    idle_frames = np.lib.format.open_memmap(
+                        tmp_path, mode="w+", dtype=full_img.dtype, shape=(bg_count, *full_img.shape))
+                idle_frames[bg_frame_id] = full_img
+            idle_frames.flush()
+            meta = {"digest": digest, "frame_shape": list(idle_frames.shape[1:]), "dtype": str(idle_frames.dtype)}
+            del idle_frames
+            os.replace(tmp_path, cache_path)
+            with open(meta_path + ".tmp", "w") as meta_file:
+                json.dump(meta, meta_file)
+            os.replace(meta_path + ".tmp", meta_path)
+        except OSError as e:
+            logger.warning("idle frame cache {} can not be written, render idle frames live: {}", cache_path, e)
+            for path in (tmp_path, meta_path + ".tmp"):
+                if os.path.exists(path):
+                    os.remove(path)
+            return None
+        return np.load(cache_path, mmap_mode="r")
+
+    @staticmethod
+    def _load_cached_idle_frames(cache_path, meta_path, digest, bg_count, frame_shape) -> Optional[np.ndarray]:
+        if not os.path.exists(cache_path):
+            return None
+        try:
+            with open(meta_path) as meta_file:
+                meta = json.load(meta_file)
+            idle_frames = np.load(cache_path, mmap_mode="r")
+        except (OSError, ValueError) as e:
+            logger.info("idle frame cache {} can not be read, render again: {}", cache_path, e)
+            return None
+        if (meta.get("digest") != digest
+                or idle_frames.shape != (bg_count, *meta.get("frame_shape", []))
+                or str(idle_frames.dtype) != meta.get("dtype")
+                or (frame_shape is not None and idle_frames.shape[1:] != frame_shape)):
+            logger.info("idle frame cache {} is outdated, render again", cache_path)
+            return None
+        return idle_frames
+
+    def _idle_frames_digest(self, idle_param) -> str:
+        """
+        digest of everything the idle frames are rendered from: the reference images, the idle
+        param and whether the backgrounds are pre-flipped
+        """
+        digest = hashlib.sha256()
+        digest.update(b"preflipped" if self._preflipped else b"flipped")
+        self._update_digest(digest, list(self.tts2face.ref_img_list))
+        self._update_digest(digest, idle_param)
+        return digest.hexdigest()
+
+    @classmethod
+    def _update_digest(cls, digest, value):
+        if isinstance(value, dict):
+            for key in sorted(value, key=str):
+                digest.update(str(key).encode())
+                cls._update_digest(digest, value[key])
+            return
+        if isinstance(value, (list, tuple)):
+            for item in value:
+                cls._update_digest(digest, item)
+            return
+        if hasattr(value, "detach"):
+            # torch tensor
+            value = value.detach().cpu().numpy()
+        if isinstance(value, np.ndarray) and value.dtype != object:
+            value = np.ascontiguousarray(value)
+            digest.update(f"{value.dtype}{value.shape}".encode())
+            digest.update(value.tobytes())
+        else:
+            digest.update(repr(value).encode())
+
+    def _full_frame_shape(self) -> Optional[tuple]:
+        if not getattr(self.tts2face, "bg_data_list", None):
+            return None
+        return tuple(self.tts2face.bg_data_list[0].shape)
+
     def get_algo_config(self):
         return AvatarAlgoConfig(
             input_audio_sample_rate=16000,
@@ -48,6 +48,10 @@ class Tts2FaceConfigModel(HandlerBaseConfigModel, BaseModel):
     fps: int = Field(default=25)
     enable_fast_mode: bool = Field(default=False)
     use_gpu: bool = Field(default=True)
+    signal_lookahead_frames: int = Field(default=50)
+    render_batch_size: int = Field(default=4)
+    render_threads: int = Field(default=2)
+    enable_idle_cache: bool = Field(default=True)
 
 
 class Tts2FaceOutputHandler(AvatarOutputHandler):
@@ -65,15 +69,11 @@ class Tts2FaceOutputHandler(AvatarOutputHandler):
         logger.info("on algo processor stop")
 
     def on_audio(self, audio_result: AudioResult):
-        audio_frame = audio_result.audio_frame
-        audio_data = audio_frame.to_ndarray()
-        self.audio_output_queue.put_nowait(audio_data)
+        self.audio_output_queue.put_nowait(audio_result.audio_data)
 
     def on_video(self, video_result: VideoResult):
         self._video_producer_counter.add()
-        video_frame = video_result.video_frame
-        data = video_frame.to_ndarray(format="bgr24")
-        self.video_output_queue.put_nowait(data)
+        self.video_output_queue.put_nowait(video_result.video_data)
 
     def on_avatar_status_change(self, speech_id, avatar_status: AvatarStatus):
         logger.info(f"Avatar status changed: {speech_id} {avatar_status}")
@@ -124,7 +124,11 @@ class AvatarProcessorWrapper:
                 avatar_name=config.avatar_name,
                 debug=config.debug,
                 enable_fast_mode=config.enable_fast_mode,
-                use_gpu=config.use_gpu
+                use_gpu=config.use_gpu,
+                signal_lookahead_frames=config.signal_lookahead_frames,
+                render_batch_size=config.render_batch_size,
+                render_threads=config.render_threads,
+                enable_idle_cache=config.enable_idle_cache
             )
         )
         # start event input loop
@@ -1,17 +1,15 @@
 
 from fractions import Fraction
-from queue import Queue
+from queue import Full, Queue
 import sys
 from threading import Thread
 import threading
 import time
 from typing import List
 
-import av
 import cv2
 from loguru import logger
 import numpy as np
-from handlers.avatar.liteavatar.algo.audio2signal_speed_limiter import Audio2SignalSpeedLimiter
 from handlers.avatar.liteavatar.algo.base_algo_adapter import BaseAlgoAdapter
 from handlers.avatar.liteavatar.media.speech_audio_processor import SpeechAudioProcessor
 from handlers.avatar.liteavatar.avatar_output_handler import AvatarOutputHandler
@@ -54,7 +52,6 @@ class AvatarProcessor:
         self._callback_avatar_status: AvatarStatus = None
 
         # other helpers
-        self._audio2signal_speed_limiter = None
         self._video_audio_aligner = None
 
         # statistic counter
@@ -114,13 +111,9 @@ class AvatarProcessor:
         logger.info("audio2signal loop started")
         speech_id = ""
         audio_slice = None
-        self._audio2signal_speed_limiter.start()
-        target_round_time = 0.9
         while self._session_running:
-            start_time = time.time()
             try:
                 audio_slice: AudioSlice = self._audio_slice_queue.get(timeout=0.1)
-                target_round_time = audio_slice.get_audio_duration() - 0.1
             except Exception:
                 continue
 
@@ -130,6 +123,10 @@ class AvatarProcessor:
                 self._current_speech_id = speech_id
             if audio_slice.end_of_speech:
                 self._last_speech_ended = True
+            if len(audio_slice.play_audio_data) == 0:
+                # empty end of speech slice, nothing to render
+                logger.info("audio2signal got empty end of speech slice for speech {}", speech_id)
+                continue
 
             logger.info("audio2signal input audio durtaion {}", audio_slice.get_audio_duration())
             signal_vals = self._algo_adapter.audio2signal(audio_slice)
@@ -137,12 +134,16 @@ class AvatarProcessor:
 
             # remove front padding audio and relative frames
             front_padding_duration = audio_slice.front_padding_duration
-            target_round_time = audio_slice.get_audio_duration() - front_padding_duration - 0.1
             padding_frame_count = int(front_padding_duration * self._init_option.video_frame_rate)
             signal_vals = signal_vals[padding_frame_count:]
             padding_audio_count = int(front_padding_duration) * self._init_option.audio_sample_rate * 2
             audio_slice.play_audio_data = audio_slice.play_audio_data[padding_audio_count:]
 
+            # remove end padding frames, the aligner trims the padded audio to the frame count
+            end_padding_frame_count = int(audio_slice.end_padding_duration * self._init_option.video_frame_rate)
+            if 0 < end_padding_frame_count < len(signal_vals):
+                signal_vals = signal_vals[:len(signal_vals) - end_padding_frame_count]
+
             audio_slice.play_audio_data = self._video_audio_aligner.get_speech_level_algined_audio(
                 audio_slice.play_audio_data, audio_slice.play_audio_sample_rate, len(signal_vals),
                 audio_slice.speech_id, audio_slice.end_of_speech)
@@ -159,13 +160,21 @@ class AvatarProcessor:
                     audio_slice=audio_slice if i == 0 else None
                 )
                 self._audio2signal_counter.add()
-                self._signal_queue.put_nowait(middle_result)
-            cost = time.time() - start_time
-            sleep_time = target_round_time - cost
-            if sleep_time > 0:
-                time.sleep(sleep_time)
+                # no wall clock pacing here, the bounded signal queue keeps the producer at most
+                # signal_lookahead_frames ahead of the presentation clock in _signal2img_loop
+                if not self._put_signal(middle_result):
+                    break
         logger.info("audio2signal loop stopped")
 
+    def _put_signal(self, signal: SignalResult) -> bool:
+        while self._session_running:
+            try:
+                self._signal_queue.put(signal, timeout=0.1)
+                return True
+            except Full:
+                continue
+        return False
+
     def _signal2img_loop(self):
         """
         generate image and do callbacks
@@ -178,110 +187,133 @@ class AvatarProcessor:
         time.sleep(0.5)
         
         while self._session_running:
-            if self._signal_queue.empty():
-                # generate idle
-                signal_val = self._algo_adapter.get_idle_signal(1)[0]
-                avatar_status = AvatarStatus.LISTENING if self._last_speech_ended else AvatarStatus.SPEAKING
-                signal = SignalResult(
-                    speech_id=self._current_speech_id,
-                    end_of_speech=False,
-                    middle_data=signal_val,
-                    frame_id=0,
-                    avatar_status=avatar_status,
-                    audio_slice=self._get_idle_audio_slice(1)
-                )
+            signals = self._get_queued_signals()
+            if signals:
+                rendered = self._algo_adapter.signal2img_batch(
+                    [signal.middle_data for signal in signals],
+                    [signal.avatar_status for signal in signals])
+                frames = [(out_image, None, bg_frame_id) for out_image, bg_frame_id in rendered]
             else:
-                signal: SignalResult = self._signal_queue.get_nowait()
-
-            out_image, bg_frame_id = self._algo_adapter.signal2img(signal.middle_data, signal.avatar_status)
-            # create mouth result
-            mouth_result = MouthResult(
-                speech_id=signal.speech_id,
-                mouth_image=out_image,
-                bg_frame_id=bg_frame_id,
-                end_of_speech=signal.end_of_speech,
-                avatar_status=signal.avatar_status,
-                audio_slice=signal.audio_slice,
-                global_frame_id=self._global_frame_count
-            )
-            
-            self._global_frame_count += 1
+                signals = [self._create_idle_signal()]
+                idle_frame = self._algo_adapter.get_idle_frame()
+                if idle_frame is not None:
+                    full_image, bg_frame_id = idle_frame
+                    frames = [(None, full_image, bg_frame_id)]
+                else:
+                    out_image, bg_frame_id = self._algo_adapter.signal2img(
+                        signals[0].middle_data, signals[0].avatar_status)
+                    frames = [(out_image, None, bg_frame_id)]
+            for signal, (out_image, full_image, bg_frame_id) in zip(signals, frames):
+                # create mouth result
+                mouth_result = MouthResult(
+                    speech_id=signal.speech_id,
+                    mouth_image=out_image,
+                    full_image=full_image,
+                    bg_frame_id=bg_frame_id,
+                    end_of_speech=signal.end_of_speech,
+                    avatar_status=signal.avatar_status,
+                    audio_slice=signal.audio_slice,
+                    global_frame_id=self._global_frame_count
+                )
 
-            self._mouth_img_queue.put(mouth_result)
+                self._global_frame_count += 1
 
-            if start_time == -1:
-                start_time = time.time()
-                timestamp = 0
-            else:
-                timestamp += 1 / self._init_option.video_frame_rate
-                wait = start_time + timestamp - time.time()
-                if wait > 0:
-                    time.sleep(wait)
+                self._mouth_img_queue.put(mouth_result)
+
+                if start_time == -1:
+                    start_time = time.time()
+                    timestamp = 0
+                else:
+                    timestamp += 1 / self._init_option.video_frame_rate
+                    wait = start_time + timestamp - time.time()
+                    if wait > 0:
+                        time.sleep(wait)
 
         logger.info("signal2img loop ended")
 
+    def _get_queued_signals(self) -> List[SignalResult]:
+        """
+        take up to render_batch_size queued signals, more than one only when the queue is backed up
+        """
+        signals = []
+        while len(signals) < self._init_option.render_batch_size and not self._signal_queue.empty():
+            signals.append(self._signal_queue.get_nowait())
+        return signals
+
+    def _create_idle_signal(self) -> SignalResult:
+        signal_val = self._algo_adapter.get_idle_signal(1)[0]
+        avatar_status = AvatarStatus.LISTENING if self._last_speech_ended else AvatarStatus.SPEAKING
+        return SignalResult(
+            speech_id=self._current_speech_id,
+            end_of_speech=False,
+            middle_data=signal_val,
+            frame_id=0,
+            avatar_status=avatar_status,
+            audio_slice=self._get_idle_audio_slice(1)
+        )
+
     def _mouth2full_loop(self):
         logger.info("combine img loop started")
         while self._session_running:
             try:
-                mouth_reusult: MouthResult = self._mouth_img_queue.get(timeout=0.1)
+                mouth_results: List[MouthResult] = [self._mouth_img_queue.get(timeout=0.1)]
             except Exception:
                 continue
-            image = mouth_reusult.mouth_image
-            bg_frame_id = mouth_reusult.bg_frame_id
-            full_img = self._algo_adapter.mouth2full(image, bg_frame_id)
-            
-            if mouth_reusult.audio_slice is not None:
-                # create audio result
-                audio_data = mouth_reusult.audio_slice.play_audio_data
-                audio_frame = av.AudioFrame.from_ndarray(
-                    np.frombuffer(audio_data, dtype=np.int16).reshape(1, -1),
-                    format="s16",
-                    layout="mono"
-                )
-                audio_time_base = Fraction(1, self._init_option.audio_sample_rate)
-                audio_frame.time_base = audio_time_base
-                audio_frame.pts = self._current_audio_pts
-                audio_frame.sample_rate = mouth_reusult.audio_slice.play_audio_sample_rate
-                self._current_audio_pts += len(audio_data) // 2
-
-                audio_result = AudioResult(
-                    audio_frame=audio_frame,
-                    speech_id=mouth_reusult.audio_slice.speech_id
-                )
-                self._callback_audio(audio_result)
-                logger.debug("create audio with duration {:.3f}s, status: {}",
-                             mouth_reusult.audio_slice.get_audio_duration(), mouth_reusult.avatar_status)
-            # create video result
-            if self._debug_mode:
-                full_img = cv2.putText(
-                    full_img, f"{mouth_reusult.avatar_status} {mouth_reusult.global_frame_id}",
-                    (10, 30), cv2.FONT_HERSHEY_SIMPLEX, 1, (0, 0, 255), 2)
-            full_img = cv2.flip(full_img, 1)
-            video_frame = av.VideoFrame.from_ndarray(full_img, format="bgr24")
-            video_frame.time_base = Fraction(1, self._init_option.video_frame_rate)
-            video_frame.pts = self._current_video_pts
-            self._current_video_pts += 1
-
-            image_result = VideoResult(
-                video_frame=video_frame,
-                speech_id=mouth_reusult.speech_id,
-                avatar_status=mouth_reusult.avatar_status,
-                end_of_speech=mouth_reusult.end_of_speech,
-                bg_frame_id=bg_frame_id
+            while len(mouth_results) < self._init_option.render_batch_size and not self._mouth_img_queue.empty():
+                mouth_results.append(self._mouth_img_queue.get_nowait())
+            to_compose = [mouth_result for mouth_result in mouth_results if mouth_result.full_image is None]
+            if to_compose:
+                full_imgs = self._algo_adapter.mouth2full_batch(
+                    [mouth_result.mouth_image for mouth_result in to_compose],
+                    [mouth_result.bg_frame_id for mouth_result in to_compose])
+                for mouth_result, full_img in zip(to_compose, full_imgs):
+                    mouth_result.full_image = full_img
+            for mouth_result in mouth_results:
+                self._output_full_image(mouth_result, mouth_result.full_image)
+        logger.info("combine img loop ended")
+
+    def _output_full_image(self, mouth_result: MouthResult, full_img: np.ndarray):
+        bg_frame_id = mouth_result.bg_frame_id
+        if mouth_result.audio_slice is not None:
+            # create audio result
+            audio_data = np.frombuffer(mouth_result.audio_slice.play_audio_data, dtype=np.int16).reshape(1, -1)
+            audio_result = AudioResult(
+                audio_data=audio_data,
+                sample_rate=mouth_result.audio_slice.play_audio_sample_rate,
+                pts=self._current_audio_pts,
+                speech_id=mouth_result.audio_slice.speech_id
             )
+            self._current_audio_pts += audio_data.shape[-1]
+
+            self._callback_audio(audio_result)
+            logger.debug("create audio with duration {:.3f}s, status: {}",
+                         mouth_result.audio_slice.get_audio_duration(), mouth_result.avatar_status)
+        # create video result
+        if self._debug_mode:
+            # cached idle frames are read only
+            full_img = cv2.putText(
+                np.array(full_img), f"{mouth_result.avatar_status} {mouth_result.global_frame_id}",
+                (10, 30), cv2.FONT_HERSHEY_SIMPLEX, 1, (0, 0, 255), 2)
+        image_result = VideoResult(
+            video_data=full_img,
+            pts=self._current_video_pts,
+            time_base=Fraction(1, self._init_option.video_frame_rate),
+            speech_id=mouth_result.speech_id,
+            avatar_status=mouth_result.avatar_status,
+            end_of_speech=mouth_result.end_of_speech,
+            bg_frame_id=bg_frame_id
+        )
+        self._current_video_pts += 1
 
-            self._callback_image(image_result)
-            
-            if self._callback_avatar_status != image_result.avatar_status and self._callback_avatar_status is not None:
-                self._callback_avatar_status_changed(mouth_reusult.speech_id, image_result.avatar_status)
-            self._callback_avatar_status = image_result.avatar_status
-            
-        logger.info("combine img loop ended")
+        self._callback_image(image_result)
+        
+        if self._callback_avatar_status != image_result.avatar_status and self._callback_avatar_status is not None:
+            self._callback_avatar_status_changed(mouth_result.speech_id, image_result.avatar_status)
+        self._callback_avatar_status = image_result.avatar_status
 
     def _reset_processor_status(self):
         self._audio_slice_queue = Queue()
-        self._signal_queue = Queue()
+        self._signal_queue = Queue(maxsize=max(1, self._init_option.signal_lookahead_frames))
         self._mouth_img_queue = Queue()
         algo_config = self._algo_adapter.get_algo_config()
         self._speech_audio_processor = SpeechAudioProcessor(
@@ -290,7 +322,6 @@ class AvatarProcessor:
             algo_config.input_audio_slice_duration,
             enable_fast_mode=self._init_option.enable_fast_mode
         )
-        self._audio2signal_speed_limiter = Audio2SignalSpeedLimiter(self._init_option.video_frame_rate)
         self._video_audio_aligner = VideoAudioAligner(self._init_option.video_frame_rate)
 
     def _init_algo(self):
@@ -312,8 +343,7 @@ class AvatarProcessor:
                 output_handler.on_video(image_result)
 
     def _callback_audio(self, audio_result: AudioResult):
-        audio_frame = audio_result.audio_frame
-        self._callback_counter.add_property("callback_audio", audio_frame.samples / audio_frame.sample_rate)
+        self._callback_counter.add_property("callback_audio", audio_result.get_duration())
         if self._session_running:
             for output_handler in self._output_handlers:
                 output_handler.on_audio(audio_result)
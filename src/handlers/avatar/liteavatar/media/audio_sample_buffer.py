@@ -0,0 +1,57 @@
+import numpy as np
+
+
+class AudioSampleBuffer:
+    """
+    Preallocated int16 fifo for mono pcm.
+
+    Reads return views into the buffer, they stay valid until the next write. Consumed
+    samples are reclaimed by moving the unread tail to the front when the end of the
+    buffer is reached, so appending and reading are amortized O(1) instead of copying
+    the whole remainder like bytes slicing does.
+    """
+
+    def __init__(self, capacity: int = 16000):
+        self._buffer = np.zeros(max(1, capacity), dtype=np.int16)
+        self._read_pos = 0
+        self._write_pos = 0
+
+    def __len__(self):
+        return self._write_pos - self._read_pos
+
+    def reset(self):
+        self._read_pos = 0
+        self._write_pos = 0
+
+    def write(self, audio_data: bytes):
+        samples = np.frombuffer(audio_data, dtype=np.int16)
+        count = samples.shape[0]
+        if count == 0:
+            return
+        if self._write_pos + count > self._buffer.shape[0]:
+            self._make_room(count)
+        self._buffer[self._write_pos:self._write_pos + count] = samples
+        self._write_pos += count
+
+    def peek(self, count: int = -1) -> np.ndarray:
+        if count < 0 or count > len(self):
+            count = len(self)
+        return self._buffer[self._read_pos:self._read_pos + count]
+
+    def read(self, count: int = -1) -> np.ndarray:
+        samples = self.peek(count)
+        self._read_pos += samples.shape[0]
+        if self._read_pos == self._write_pos:
+            self.reset()
+        return samples
+
+    def _make_room(self, count: int):
+        size = len(self)
+        if size + count > self._buffer.shape[0]:
+            buffer = np.zeros(max(2 * self._buffer.shape[0], size + count), dtype=np.int16)
+            buffer[:size] = self._buffer[self._read_pos:self._write_pos]
+            self._buffer = buffer
+        else:
+            self._buffer[:size] = self._buffer[self._read_pos:self._write_pos]
+        self._read_pos = 0
+        self._write_pos = size
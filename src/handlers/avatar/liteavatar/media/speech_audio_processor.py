@@ -2,9 +2,10 @@
 
 from typing import List
 
-import librosa
 from loguru import logger
 import numpy as np
+from engine_utils.audio_resampler import RESAMPLER_BACKEND_NUMPY, StreamingResampler, resample
+from handlers.avatar.liteavatar.media.audio_sample_buffer import AudioSampleBuffer
 from handlers.avatar.liteavatar.model.algo_model import AudioSlice
 from handlers.avatar.liteavatar.model.audio_input import SpeechAudio
 
@@ -20,7 +21,15 @@ class SpeechAudioProcessor:
         self._audio_slice_duration = audio_slice_duration
         self._enable_fast_mode = enable_fast_mode
 
+        # speech meta of the current speech, its samples are kept in the audio buffer
         self._current_audio = SpeechAudio()
+        self._audio_buffer = AudioSampleBuffer(int(input_sample_rate * audio_slice_duration * 2))
+        # one resampler per speech, the filter state follows the audio across its slices, numpy
+        # keeps the filter delay at a few samples, the soxr stream holds back tens of milliseconds
+        self._resampler = StreamingResampler(input_sample_rate, output_sample_rate, backend=RESAMPLER_BACKEND_NUMPY)
+        self._resampled_input_count = 0
+        self._resampled_output_count = 0
+        self._resampled_pending = np.zeros(0, dtype=np.float32)
 
     def get_speech_audio_slice(self, speech_audio: SpeechAudio) \
             -> List[AudioSlice]:
@@ -33,16 +42,18 @@ class SpeechAudioProcessor:
             # new speech, extend this to audio slice duration,
             # so that algo can start immediately
             logger.info("generate first audio slice for speech {}", speech_audio.speech_id)
-            self._current_audio = speech_audio.model_copy()
+            self._current_audio = speech_audio.model_copy(update={"audio_data": bytes()})
+            self._audio_buffer.reset()
+            self._reset_resampler()
             if self._enable_fast_mode:
-                audio_data = self._current_audio.audio_data
-
-                target_length = int(2 * speech_audio.sample_rate * self._audio_slice_duration)
-                padding_length = target_length - len(audio_data)
-                audio_data = bytes(padding_length) + audio_data
-                
-                padding_duration = padding_length / 2 / speech_audio.sample_rate
-                
+                audio_data = self.extend_audio_to_duration(
+                    speech_audio.audio_data,
+                    speech_audio.sample_rate,
+                    self._audio_slice_duration,
+                    True
+                )
+                padding_duration = (len(audio_data) - len(speech_audio.audio_data)) / 2 / speech_audio.sample_rate
+
                 audio_slice = self._create_audio_slice(
                     speech_id=speech_audio.speech_id,
                     play_audio_data=audio_data,
@@ -50,35 +61,35 @@ class SpeechAudioProcessor:
                     end_of_speech=speech_audio.end_of_speech,
                     front_padding_duration=padding_duration
                 )
-                self._current_audio.audio_data = bytes()
                 return [audio_slice]
+            self._audio_buffer.write(speech_audio.audio_data)
         else:
             self._extend_current_audio(speech_audio)
-        
+
         logger.info("input speech audio {}, end of speech {}, duration {:.3f}s, current audio length {}",
                     speech_audio.speech_id, speech_audio.end_of_speech, speech_audio.get_audio_duration(),
-                    len(self._current_audio.audio_data))
+                    2 * len(self._audio_buffer))
 
         output_audio_list = []
-        while self._current_audio.get_audio_duration() >= self._audio_slice_duration:
-            play_audio_data_length = int(2 * self._input_sample_rate *
-                                         self._audio_slice_duration)
-            play_audio_data = self._current_audio.audio_data[:play_audio_data_length]
-            self._current_audio.audio_data = self._current_audio.audio_data[play_audio_data_length:]
-            end_of_speech = len(self._current_audio.audio_data) == 0 and speech_audio.end_of_speech
+        while self._get_buffered_duration() >= self._audio_slice_duration:
+            play_audio_data = self._audio_buffer.read(int(self._input_sample_rate *
+                                                          self._audio_slice_duration)).tobytes()
+            end_of_speech = len(self._audio_buffer) == 0 and speech_audio.end_of_speech
             audio_slice = self._create_audio_slice(
                 speech_audio.speech_id,
                 play_audio_data,
                 self._input_sample_rate,
                 end_of_speech)
             output_audio_list.append(audio_slice)
-        if self._current_audio.end_of_speech and len(self._current_audio.audio_data) > 0:
-            play_audio_data, end_padding_duration = self.extend_audio_to_duration(
-                self._current_audio.audio_data,
+        if self._current_audio.end_of_speech and len(self._audio_buffer) > 0:
+            remaining_audio = self._audio_buffer.read().tobytes()
+            play_audio_data = self.extend_audio_to_duration(
+                remaining_audio,
                 self._input_sample_rate,
                 self._audio_slice_duration,
                 False
             )
+            end_padding_duration = (len(play_audio_data) - len(remaining_audio)) / 2 / self._input_sample_rate
             output_audio_list.append(self._create_audio_slice(
                 speech_audio.speech_id,
                 play_audio_data,
@@ -86,13 +97,26 @@ class SpeechAudioProcessor:
                 True,
                 end_padding_duration=end_padding_duration))
             self._current_audio = SpeechAudio()
+        elif speech_audio.end_of_speech and len(self._audio_buffer) == 0 \
+                and (len(output_audio_list) == 0 or not output_audio_list[-1].end_of_speech):
+            # end marker without audio left, emit an empty end slice instead of rendering padding
+            output_audio_list.append(self._create_audio_slice(
+                speech_audio.speech_id,
+                bytes(),
+                self._input_sample_rate,
+                True))
+            self._current_audio = SpeechAudio()
         return output_audio_list
 
     def _extend_current_audio(self, speech_audio: SpeechAudio):
         assert self._current_audio.speech_id == speech_audio.speech_id
-        self._current_audio.audio_data += speech_audio.audio_data
+        self._audio_buffer.write(speech_audio.audio_data)
         self._current_audio.end_of_speech = speech_audio.end_of_speech
 
+    def _get_buffered_duration(self) -> float:
+        # measured with the sample rate of the incoming speech, like SpeechAudio.get_audio_duration
+        return len(self._audio_buffer) / self._current_audio.sample_rate
+
     def _create_audio_slice(self,
                             speech_id: str,
                             play_audio_data: bytes,
@@ -100,9 +124,7 @@ class SpeechAudioProcessor:
                             end_of_speech: bool,
                             front_padding_duration: float = 0,
                             end_padding_duration: float = 0) -> AudioSlice:
-        algo_audio = self.resample_audio(play_audio_data,
-                                         self._input_sample_rate,
-                                         self._output_sample_rate)
+        algo_audio = self._resample_slice(play_audio_data, end_of_speech)
         return AudioSlice(
             algo_audio_data=algo_audio,
             algo_audio_sample_rate=self._output_sample_rate,
@@ -114,35 +136,69 @@ class SpeechAudioProcessor:
             end_padding_duration=end_padding_duration
         )
 
+    def _reset_resampler(self):
+        self._resampler.reset()
+        self._resampled_input_count = 0
+        self._resampled_output_count = 0
+        self._resampled_pending = np.zeros(0, dtype=np.float32)
+
+    def _resample_slice(self, audio_data: bytes, end_of_speech: bool) -> bytes:
+        """
+        resample one slice of the current speech, every slice gets the samples of its own duration
+        """
+        if self._input_sample_rate == self._output_sample_rate:
+            return audio_data
+        audio_float32 = np.frombuffer(audio_data, np.short).astype(np.float32) / np.iinfo(np.int16).max
+        self._resampled_input_count += audio_float32.shape[0]
+        output = self._resampler.process(audio_float32)
+        if end_of_speech:
+            output = np.concatenate([output, self._resampler.flush()])
+        output = np.concatenate([self._resampled_pending, output])
+        expected_total = -(-self._resampled_input_count * self._output_sample_rate // self._input_sample_rate)
+        expected_count = expected_total - self._resampled_output_count
+        if output.shape[0] < expected_count:
+            # the filter delay holds back the end of the first slice of a speech, it is front padded instead
+            output = np.pad(output, (expected_count - output.shape[0], 0))
+        self._resampled_pending = output[expected_count:]
+        self._resampled_output_count = expected_total
+        if end_of_speech:
+            self._reset_resampler()
+        resampled_pcm = (output[:expected_count] * np.iinfo(np.short).max).astype(np.int16)
+        return bytes(resampled_pcm.tobytes())
+
     @staticmethod
     def extend_audio_to_duration(audio_data: bytes,
                                  sample_rate: int,
                                  duration: int,
-                                 padding_front: bool):
+                                 padding_front: bool = False) -> bytes:
+        """
+        pad audio with silence to duration, audio which is already long enough is returned as is
+        """
         target_length = int(2 * sample_rate * duration)
         padding_length = target_length - len(audio_data)
-        if padding_length < 0:
+        if padding_length <= 0:
             return audio_data
+        extended_audio = bytearray(target_length)
         if padding_front:
-            audio_data = bytes(padding_length) + audio_data
+            extended_audio[padding_length:] = audio_data
         else:
-            audio_data = bytes(audio_data) + bytes(padding_length)
-        return audio_data, padding_length / 2 / sample_rate
+            extended_audio[:len(audio_data)] = audio_data
+        return bytes(extended_audio)
 
     @staticmethod
     def resample_audio(audio_data: bytes,
                        origin_sample_rate: int,
                        target_sample_rate: int) -> bytes:
-        if origin_sample_rate == target_sample_rate:
+        if origin_sample_rate == target_sample_rate or len(audio_data) == 0:
             return audio_data
 
         origin_np_array = np.frombuffer(audio_data, np.short)
         audio_float32 = origin_np_array.astype(np.float32) / np.iinfo(
             np.int16).max
-        resampled_float: np.ndarray = librosa.resample(
+        resampled_float: np.ndarray = resample(
             audio_float32,
-            orig_sr=origin_sample_rate,
-            target_sr=target_sample_rate)
+            origin_sample_rate,
+            target_sample_rate)
         resampled_pcm = (resampled_float * np.iinfo(np.short).max).astype(
             np.int16)
         resample_data = bytearray(resampled_pcm.tobytes())
@@ -9,7 +9,6 @@ class VideoAudioAligner:
 
         self._current_speech_id = ""
         self._audio_byte_length_current_speech = 0
-        self._audio_data_current_speech = bytearray()
         self._total_frame_count_current_speech = 0
         self._audio_start_idx = 0
         self._returned_audio_length_current_speech = 0
@@ -21,12 +20,11 @@ class VideoAudioAligner:
                                        frame_count, speech_id, end_of_speech):
         if speech_id != self._current_speech_id:
             self._audio_byte_length_current_speech = 0
-            self._audio_data_current_speech = bytearray()
             self._current_speech_id = speech_id
             self._total_frame_count_current_speech = 0
             self._audio_start_idx = 0
             self._returned_audio_length_current_speech = 0
-        self._audio_data_current_speech += audio_data
+        self._audio_byte_length_current_speech += len(audio_data)
         self._total_frame_count_current_speech += frame_count
 
         audio_length_per_frame = origin_sample_rate / self._fps * 2
@@ -38,17 +36,18 @@ class VideoAudioAligner:
         if not end_of_speech:
             ret_audio = audio_data
         else:
-            diff = total_audio_length - len(self._audio_data_current_speech)
+            # everything before this slice is returned already, so only the
+            # last slice has to be padded or trimmed to the video length
+            diff = total_audio_length - self._audio_byte_length_current_speech
+            ret_length = max(0, total_audio_length - self._audio_start_idx)
             if diff > 0:
                 logger.info(
                     f"align video: add extra audio of length {diff}")
-                self._audio_data_current_speech += bytearray(diff)
+                ret_audio = bytes(audio_data) + bytes(max(0, ret_length - len(audio_data)))
             else:
                 logger.info(
                     f"align video: remove tail audio of length {diff}")
-                self._audio_data_current_speech = self._audio_data_current_speech[:
-                                                                                  total_audio_length]
-            ret_audio = self._audio_data_current_speech[self._audio_start_idx:]
+                ret_audio = audio_data[:ret_length]
         self._returned_audio_length_current_speech += len(ret_audio)
         logger.info(
             "audio of speech {}, end of speech {}, total returned audio length {}, "
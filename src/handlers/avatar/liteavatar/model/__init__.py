@@ -0,0 +1,4 @@
+from handlers.avatar.liteavatar.model.algo_model import (
+    AudioResult, AudioSlice, AvatarAlgoConfig, AvatarInitOption, AvatarStatus,
+    MouthResult, SignalResult, SignalType, VideoResult)
+from handlers.avatar.liteavatar.model.audio_input import SpeechAudio
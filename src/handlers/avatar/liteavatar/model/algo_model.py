@@ -1,8 +1,10 @@
 
 
 from enum import Enum
+from fractions import Fraction
 from typing import Any, Optional, TypeVar
 import av
+import numpy as np
 from pydantic import BaseModel
 
 
@@ -18,6 +20,13 @@ class AvatarInitOption(BaseModel):
     debug: bool = False
     enable_fast_mode: bool = False
     use_gpu: bool = True
+    # max number of generated signal frames waiting for presentation
+    signal_lookahead_frames: int = 50
+    # max number of frames rendered per call when the signal queue is backed up
+    render_batch_size: int = 4
+    render_threads: int = 2
+    # render the idle animation once and reuse it while no speech is queued
+    enable_idle_cache: bool = True
 
 
 class AudioSlice(BaseModel):
@@ -53,6 +62,8 @@ class MouthResult(BaseModel):
     end_of_speech: bool
     bg_frame_id: int
     mouth_image: Any
+    # composed output frame, set when the frame comes from the idle cache
+    full_image: Any = None
     audio_slice: Optional[AudioSlice] = None
     global_frame_id: int
 
@@ -64,22 +75,47 @@ class MouthResult(BaseModel):
 class VideoResult(BaseModel):
     speech_id: Any
     avatar_status: AvatarStatus
-    video_frame: Any | av.VideoFrame
+    # bgr24 image with shape [H, W, 3], may be a read only view of a cached frame
+    video_data: np.ndarray
     end_of_speech: bool
+    pts: int = 0
+    time_base: Optional[Fraction] = None
 
     model_config = {
         "arbitrary_types_allowed": True
     }
 
+    def to_av_frame(self) -> av.VideoFrame:
+        video_frame = av.VideoFrame.from_ndarray(np.ascontiguousarray(self.video_data), format="bgr24")
+        video_frame.pts = self.pts
+        video_frame.time_base = self.time_base
+        return video_frame
+
 
 class AudioResult(BaseModel):
     speech_id: Any
-    audio_frame: bytes | av.AudioFrame
+    # mono pcm with shape [1, N], int16 or float32
+    audio_data: np.ndarray
+    sample_rate: int
+    pts: int = 0
+    end_of_speech: bool = False
 
     model_config = {
         "arbitrary_types_allowed": True
     }
 
+    def get_duration(self) -> float:
+        return self.audio_data.shape[-1] / self.sample_rate
+
+    def to_av_frame(self) -> av.AudioFrame:
+        audio_format = "s16" if self.audio_data.dtype == np.int16 else "flt"
+        audio_frame = av.AudioFrame.from_ndarray(
+            np.ascontiguousarray(self.audio_data), format=audio_format, layout="mono")
+        audio_frame.sample_rate = self.sample_rate
+        audio_frame.time_base = Fraction(1, self.sample_rate)
+        audio_frame.pts = self.pts
+        return audio_frame
+
 
 class AvatarAlgoConfig(BaseModel):
     input_audio_sample_rate: int
@@ -18,7 +18,8 @@ from chat_engine.data_models.chat_engine_config_data import ChatEngineConfigMode
 from chat_engine.data_models.runtime_data.data_bundle import DataBundleDefinition, DataBundleEntry, DataBundle, VariableSize
 from handlers.avatar.liteavatar.model.audio_input import SpeechAudio
 from handlers.avatar.liteavatar.avatar_handler_liteavatar import Tts2FaceEvent
-from handlers.avatar.musetalk.avatar_musetalk_processor import AvatarMuseTalkProcessor
+from handlers.avatar.musetalk.avatar_musetalk_processor import AvatarMuseTalkProcessor, create_inference_scheduler
+from handlers.avatar.musetalk.avatar_musetalk_scheduler import MuseTalkInferenceScheduler
 from handlers.avatar.musetalk.avatar_musetalk_algo import MuseAvatarV15
 from handlers.avatar.musetalk.avatar_musetalk_config import AvatarMuseTalkConfig
 from engine_utils.general_slicer import slice_data, SliceContext
@@ -49,6 +50,8 @@ class AvatarMuseTalkContext(HandlerContext):
         self.event_out_queue: queue.Queue = event_out_queue  # Event output queue
         self.shared_state = shared_status  # Shared state for VAD, etc.
         self.input_slice_context = None  # Audio slicing context for segmenting input audio
+        # Session processor, inference is shared by the handler scheduler
+        self.processor: Optional[AvatarMuseTalkProcessor] = None
         self.output_data_definitions: Dict[ChatDataType, DataBundleDefinition] = {}  # Output data definitions
         self.media_out_thread: threading.Thread = None  # Thread for outputting media
         self.event_out_thread: threading.Thread = None  # Thread for outputting events
@@ -175,13 +178,9 @@ class HandlerAvatarMusetalk(HandlerBase):
         Initialize MuseTalk avatar handler.
         """
         super().__init__()
-        self.processor: Optional[AvatarMuseTalkProcessor] = None
         self.avatar: Optional[MuseAvatarV15] = None
+        self.scheduler: Optional[MuseTalkInferenceScheduler] = None
         self.audio_input_thread = None
-        self.event_in_queue = queue.Queue()
-        self.event_out_queue = queue.Queue()
-        self.audio_out_queue = queue.Queue()
-        self.video_out_queue = queue.Queue()
         self.output_data_definitions: Dict[ChatDataType, DataBundleDefinition] = {}
         self.shared_state = None
         self._debug_cache = {}
@@ -243,6 +242,10 @@ class HandlerAvatarMusetalk(HandlerBase):
         video_hash = hashlib.md5(video_path.encode()).hexdigest()[:8]
         auto_avatar_id = f"avatar_{video_basename}_{video_hash}"
         logger.info(f"Auto generated avatar_id: {auto_avatar_id}")
+        # session batches, their fps remainder and the batches filled across sessions
+        backend_batch_sizes = {handler_config.fps % handler_config.batch_size, handler_config.inference_batch_size}
+        backend_batch_sizes.update(range(handler_config.batch_size, handler_config.inference_batch_size + 1,
+                                         handler_config.batch_size))
         
         self.avatar = MuseAvatarV15(
             avatar_id=auto_avatar_id,
@@ -264,13 +267,17 @@ class HandlerAvatarMusetalk(HandlerBase):
             unet_config=unet_config,
             whisper_dir=whisper_dir,
             gpu_id=0,
-            debug=handler_config.debug
-        )
-        self.processor = AvatarMuseTalkProcessor(
-            self.avatar,
-            handler_config
+            debug=handler_config.debug,
+            use_torch_compositor=handler_config.use_torch_compositor,
+            compositor_device=handler_config.compositor_device or None,
+            execution_backend=handler_config.execution_backend,
+            backend_batch_sizes=sorted(backend_batch_sizes),
+            preparation_workers=handler_config.preparation_workers
         )
-        logger.info("HandlerAvatarMusetalk loaded and processor initialized.")
+        # UNet/VAE inference of all sessions is batched by one scheduler
+        self.scheduler = create_inference_scheduler(self.avatar, handler_config)
+        self.scheduler.start()
+        logger.info("HandlerAvatarMusetalk loaded and inference scheduler started.")
 
     def create_context(self, session_context: SessionContext,
                       handler_config: Optional[AvatarMuseTalkConfig] = None) -> HandlerContext:
@@ -281,19 +288,20 @@ class HandlerAvatarMusetalk(HandlerBase):
         if not isinstance(handler_config, AvatarMuseTalkConfig):
             handler_config = AvatarMuseTalkConfig()
         self.shared_state = session_context.shared_states
-        self.processor.audio_output_queue = self.audio_out_queue
-        self.processor.video_output_queue = self.video_out_queue
-        self.processor.event_out_queue = self.event_out_queue
         context = AvatarMuseTalkContext(
             session_context.session_info.session_id,
-            self.event_in_queue,
-            self.event_out_queue,
-            self.audio_out_queue,
-            self.video_out_queue,
+            queue.Queue(),
+            queue.Queue(),
+            queue.Queue(),
+            queue.Queue(),
             self.shared_state
         )
         context.output_data_definitions = self.output_data_definitions
         context.config = handler_config
+        context.processor = AvatarMuseTalkProcessor(self.avatar, handler_config, self.scheduler)
+        context.processor.audio_output_queue = context.audio_out_queue
+        context.processor.video_output_queue = context.video_out_queue
+        context.processor.event_out_queue = context.event_out_queue
         
         output_audio_sample_rate = handler_config.output_audio_sample_rate
         fps = handler_config.fps
@@ -312,7 +320,8 @@ class HandlerAvatarMusetalk(HandlerBase):
         """
         Start context.
         """
-        self.processor.start()
+        handler_context = cast(AvatarMuseTalkContext, handler_context)
+        handler_context.processor.start()
         logger.info("Context started and processor started.")
         if hasattr(handler_context, 'config') and getattr(handler_context.config, 'debug_replay_speech_id', None):
             speech_id = handler_context.config.debug_replay_speech_id
@@ -414,8 +423,8 @@ class HandlerAvatarMusetalk(HandlerBase):
                 audio_data=audio_segment.tobytes(),
                 sample_rate=input_sample_rate
             )
-            if self.processor:
-                self.processor.add_audio(speech_audio)
+            if context.processor:
+                context.processor.add_audio(speech_audio)
         if speech_end:
             # On speech end, flush remaining audio, fill with zeros if empty
             end_segment = context.input_slice_context.flush()
@@ -434,8 +443,8 @@ class HandlerAvatarMusetalk(HandlerBase):
                 audio_data=audio_data,
                 sample_rate=input_sample_rate
             )
-            if self.processor:
-                self.processor.add_audio(speech_audio)
+            if context.processor:
+                context.processor.add_audio(speech_audio)
 
     def _pack_debug_record(self, inputs: ChatData, output_definitions: Dict[ChatDataType, HandlerDataInfo]):
         """
@@ -515,8 +524,8 @@ class HandlerAvatarMusetalk(HandlerBase):
         Clean up and stop processor and related threads.
         """
         if isinstance(context, AvatarMuseTalkContext):
-            if self.processor:
-                self.processor.stop()
+            if context.processor:
+                context.processor.stop()
             if self.audio_input_thread:
                 self.audio_input_thread.join()
                 self.audio_input_thread = None
@@ -32,29 +32,18 @@ if handlers_dir not in sys.path:
     sys.path.append(handlers_dir)
 
 from handlers.avatar.liteavatar.model.audio_input import SpeechAudio
-from handlers.avatar.musetalk.musetalk_utils_preprocessing import get_landmark_and_bbox
+from handlers.avatar.musetalk.avatar_musetalk_backend import select_backend
+from handlers.avatar.musetalk.avatar_musetalk_compositor import NumpyFrameCompositor, TorchFrameCompositor
+from handlers.avatar.musetalk.avatar_musetalk_material import load_material, material_exists, save_material
+from handlers.avatar.musetalk.avatar_musetalk_preparation import AvatarPreparer, PreparationSettings, read_avatar_frames
 
 # Now you can correctly import MuseTalk modules
-from musetalk.utils.face_parsing import FaceParsing
 from musetalk.utils.utils import datagen, load_all_model
-from musetalk.utils.blending import get_image_prepare_material, get_image_blending
+from musetalk.utils.blending import get_image_blending
 from musetalk.utils.audio_processor import AudioProcessor
 
 builtins.input = lambda prompt='': "y"
 
-def video2imgs(vid_path, save_path, ext='.png', cut_frame=10000000):
-    cap = cv2.VideoCapture(vid_path)
-    count = 0
-    while True:
-        if count > cut_frame:
-            break
-        ret, frame = cap.read()
-        if ret:
-            cv2.imwrite(f"{save_path}/{count:08d}.png", frame)
-            count += 1
-        else:
-            break
-
 def osmakedirs(path_list):
     for path in path_list:
         os.makedirs(path) if not os.path.exists(path) else None
@@ -71,7 +60,12 @@ class MuseAvatarV15:
                  unet_config=None,
                  whisper_dir=None,
                  gpu_id=0,
-                 debug=False):
+                 debug=False,
+                 use_torch_compositor=True,
+                 compositor_device=None,
+                 execution_backend="auto",
+                 backend_batch_sizes=None,
+                 preparation_workers=2):
         """Initialize MuseAvatarV15
         
         Args:
@@ -94,6 +88,15 @@ class MuseAvatarV15:
             unet_config (str): UNet config file path
             whisper_dir (str): Whisper model directory
             gpu_id (int): GPU device ID
+            use_torch_compositor (bool): Blend generated faces with the torch compositor instead of the numpy
+                fixed point one
+            compositor_device (str): Device of the torch compositor, defaults to the model device
+            execution_backend (str): UNet and VAE execution, eager, compile, cuda_graph or auto to pick the
+                fastest at load
+            backend_batch_sizes (list): Batch sizes prepared by the execution backend, defaults to batch_size
+                and the fps remainder
+            preparation_workers (int): Processes analyzing faces while preparing a new avatar, 0 analyzes in
+                this process
         """
         self.avatar_id = avatar_id
         self.video_path = video_path
@@ -115,19 +118,25 @@ class MuseAvatarV15:
         self.whisper_dir = whisper_dir
         self.gpu_id = gpu_id
         self.debug = debug
+        self.use_torch_compositor = use_torch_compositor
+        self.compositor_device = compositor_device
+        self.execution_backend = execution_backend
+        self.backend_batch_sizes = backend_batch_sizes
+        self.preparation_workers = preparation_workers
         
         # Set paths
         if self.version == "v15":
             self.base_path = os.path.join(self.result_dir, self.version, "avatars", avatar_id)
+            # analyzed chunks shared by all avatars, kept when an avatar is recreated
+            self.prepare_cache_path = os.path.join(self.result_dir, self.version, "prepare_cache")
         else:  # v1
             self.base_path = os.path.join(self.result_dir, "avatars", avatar_id)
+            self.prepare_cache_path = os.path.join(self.result_dir, "prepare_cache")
             
         self.avatar_path = self.base_path
-        self.full_imgs_path = os.path.join(self.avatar_path, "full_imgs")
         self.coords_path = os.path.join(self.avatar_path, "coords.pkl")
         self.latents_out_path = os.path.join(self.avatar_path, "latents.pt")
         self.video_out_path = os.path.join(self.avatar_path, "vid_output")
-        self.mask_out_path = os.path.join(self.avatar_path, "mask")
         self.mask_coords_path = os.path.join(self.avatar_path, "mask_coords.pkl")
         self.avatar_info_path = os.path.join(self.avatar_path, "avator_info.json")
         self.frames_path = os.path.join(self.avatar_path, "frames.pkl")
@@ -146,7 +155,6 @@ class MuseAvatarV15:
         self.unet = None
         self.pe = None
         self.whisper = None
-        self.fp = None
         self.audio_processor = None
         self.weight_dtype = None
         self.timesteps = None
@@ -157,6 +165,9 @@ class MuseAvatarV15:
         self.frame_list_cycle = None
         self.mask_coords_list_cycle = None
         self.mask_list_cycle = None
+        self.material = None
+        self.compositor = None
+        self.backend = None
         
         # Initialization
         self.init()
@@ -167,21 +178,17 @@ class MuseAvatarV15:
         Automatically determine whether to regenerate data by checking the integrity of files in the avatar directory.
         If force_preparation is True, force regeneration.
         Files to check include:
-        1. latents.pt - latent features file
-        2. coords.pkl - face coordinates file
-        3. mask_coords.pkl - mask coordinates file
-        4. avator_info.json - config info file
-        5. frames.pkl - frame data file
-        6. masks.pkl - mask data file
+        1. coords.pkl - face coordinates file
+        2. mask_coords.pkl - mask coordinates file
+        3. avator_info.json - config info file
+        4. material_index.json with frames.npy, masks.npy and latents.npy - memory mapped material,
+           avatars prepared with frames.pkl, masks.pkl and latents.pt are converted once
         """
         # 1. Check if data preparation is needed
         required_files = [
-            self.latents_out_path,      # latent features file
             self.coords_path,           # face coordinates file
             self.mask_coords_path,      # mask coordinates file
             self.avatar_info_path,      # config info file
-            self.frames_path,           # frame data file
-            self.masks_path,            # mask data file
         ]
 
         # Check if data needs to be generated
@@ -193,7 +200,10 @@ class MuseAvatarV15:
                 if not os.path.exists(file_path):
                     need_preparation = True
                     break
-            
+            if not material_exists(self.avatar_path) and not all(
+                    os.path.exists(path) for path in (self.latents_out_path, self.frames_path, self.masks_path)):
+                need_preparation = True
+
             # If config file exists, check if bbox_shift has changed
             if os.path.exists(self.avatar_info_path):
                 with open(self.avatar_info_path, "r") as f:
@@ -228,15 +238,6 @@ class MuseAvatarV15:
         self.whisper = self.whisper.to(device=self.device, dtype=self.weight_dtype).eval()
         self.whisper.requires_grad_(False)
 
-        # Initialize face parser
-        if self.version == "v15":
-            self.fp = FaceParsing(
-                left_cheek_width=self.left_cheek_width,
-                right_cheek_width=self.right_cheek_width
-            )
-        else:
-            self.fp = FaceParsing()
-            
         # 3. Prepare or load data
         if need_preparation:
             logger.info("*********************************")
@@ -249,27 +250,99 @@ class MuseAvatarV15:
             if os.path.exists(self.avatar_path):
                 shutil.rmtree(self.avatar_path)
             # Create required directories
-            osmakedirs([self.avatar_path, self.full_imgs_path, self.video_out_path, self.mask_out_path])
+            osmakedirs([self.avatar_path, self.video_out_path])
             # Generate data
             self.prepare_material()
         else:
             logger.info(f"Avatar {self.avatar_id} exists and is complete, loading existing data...")
             # Load existing data
-            self.input_latent_list_cycle = torch.load(self.latents_out_path)
             with open(self.coords_path, 'rb') as f:
                 self.coord_list_cycle = pickle.load(f)
-            with open(self.frames_path, 'rb') as f:
-                self.frame_list_cycle = pickle.load(f)
             with open(self.mask_coords_path, 'rb') as f:
                 self.mask_coords_list_cycle = pickle.load(f)
-            with open(self.masks_path, 'rb') as f:
-                self.mask_list_cycle = pickle.load(f)
+            if not material_exists(self.avatar_path):
+                self._convert_legacy_material()
+            self._load_material()
+
+        self._init_compositor()
+        self._init_backend()
 
         # Warm up models is only needed in current thread
         # logger.info("Warming up models...")
         # self._warmup_models()
         # logger.info("Warmup complete")
 
+    def _load_material(self):
+        """
+        Map frames and masks from the npy material, they are paged in on first use and
+        shared with other processes serving the same avatar. Latents are small and are
+        moved to the model device once.
+        """
+        self.material = load_material(self.avatar_path)
+        self.frame_list_cycle = self.material.frame_list_cycle
+        self.mask_list_cycle = self.material.mask_list_cycle
+        latents = torch.from_numpy(np.array(self.material.latents)).to(self.device)
+        self.input_latent_list_cycle = [latents[i] for i in self.material.latent_index]
+
+    def _convert_legacy_material(self):
+        logger.info(f"Converting pickled material of avatar {self.avatar_id} to npy")
+        latent_list_cycle = torch.load(self.latents_out_path, map_location="cpu")
+        with open(self.frames_path, 'rb') as f:
+            frame_list_cycle = pickle.load(f)
+        with open(self.masks_path, 'rb') as f:
+            mask_list_cycle = pickle.load(f)
+        # keep the forward and mirrored halves pointing at the same arrays so they are stored once
+        latent_arrays = {id(latent): latent.numpy() for latent in latent_list_cycle}
+        save_material(self.avatar_path, frame_list_cycle, mask_list_cycle,
+                      [latent_arrays[id(latent)] for latent in latent_list_cycle])
+
+    def _init_compositor(self):
+        if not self.use_torch_compositor:
+            self.compositor = NumpyFrameCompositor(
+                self.frame_list_cycle,
+                self.coord_list_cycle,
+                self.mask_list_cycle,
+                self.mask_coords_list_cycle
+            )
+            return
+        device = torch.device(self.compositor_device) if self.compositor_device else self.device
+        self.compositor = TorchFrameCompositor(
+            self.frame_list_cycle,
+            self.coord_list_cycle,
+            self.mask_list_cycle,
+            self.mask_coords_list_cycle,
+            device=device,
+            frame_stack=self.material.frames,
+            frame_index=self.material.frame_index
+        )
+
+    def _unet_vae_forward(self, latent_batch: torch.Tensor, whisper_chunks: torch.Tensor) -> torch.Tensor:
+        """
+        UNet and VAE decoder of one batch, kept free of host synchronization so it can be
+        compiled or captured in a CUDA graph.
+        latent_batch: [B, 8, 32, 32] masked and reference latents
+        whisper_chunks: [B, 50, 384]
+        return: [B, 3, 256, 256] faces in [0, 1]
+        """
+        audio_feature = self.pe(whisper_chunks)
+        pred_latents = self.unet.model(latent_batch, self.timesteps, encoder_hidden_states=audio_feature).sample
+        pred_latents = pred_latents.to(dtype=self.vae.vae.dtype) / self.vae.scaling_factor
+        image = self.vae.vae.decode(pred_latents).sample
+        return (image / 2 + 0.5).clamp(0, 1)
+
+    def _init_backend(self):
+        batch_sizes = self.backend_batch_sizes or [self.batch_size, self.fps % self.batch_size]
+
+        def make_inputs(batch_size):
+            latents = torch.stack([self.input_latent_list_cycle[i % len(self.input_latent_list_cycle)]
+                                   for i in range(batch_size)])
+            latents = latents.to(device=self.device, dtype=self.weight_dtype)
+            whisper_chunks = torch.zeros(batch_size, 50, 384, device=self.device, dtype=self.weight_dtype)
+            return latents, whisper_chunks
+
+        self.backend = select_backend(self._unet_vae_forward, make_inputs, batch_sizes, self.device,
+                                      backend=self.execution_backend)
+
     def _warmup_models(self):
         """
         Warm up all models and feature extraction pipeline to avoid first-frame delay.
@@ -318,10 +391,9 @@ class MuseAvatarV15:
         
         This method is the core of the first stage, mainly completes the following tasks:
         1. Save basic avatar info
-        2. Process input video/image sequence
-        3. Extract face features and bounding boxes
-        4. Generate face masks
-        5. Save all processed data
+        2. Decode the input video/image sequence in memory
+        3. Extract face bounding boxes, face masks and latent features, see AvatarPreparer
+        4. Save all processed data
         """
         logger.info("preparing data materials ... ...")
         
@@ -329,82 +401,35 @@ class MuseAvatarV15:
         with open(self.avatar_info_path, "w") as f:
             json.dump(self.avatar_info, f)
 
-        # Step 2: Process input source (support video file or image sequence)
-        if os.path.isfile(self.video_path):
-            # If input is a video file, use video2imgs to extract frames
-            video2imgs(self.video_path, self.full_imgs_path, ext='png')
-        else:
-            # If input is an image directory, copy all png images directly
-            logger.info(f"copy files in {self.video_path}")
-            files = os.listdir(self.video_path)
-            files.sort()
-            files = [file for file in files if file.split(".")[-1] == "png"]
-            for filename in files:
-                shutil.copyfile(f"{self.video_path}/{filename}", f"{self.full_imgs_path}/{filename}")
-                
-        # Get all input image paths and sort
-        input_img_list = sorted(glob.glob(os.path.join(self.full_imgs_path, '*.[jpJP][pnPN]*[gG]')))
-
-        # Step 3: Extract face landmarks and bounding boxes
-        logger.info("extracting landmarks...")
-        coord_list, frame_list = get_landmark_and_bbox(input_img_list, self.bbox_shift)
-        
-        # Step 4: Extract latent features
-        input_latent_list = []
-        idx = -1
-        # coord_placeholder is used to mark invalid bounding boxes
-        coord_placeholder = (0.0, 0.0, 0.0, 0.0)
-        for bbox, frame in zip(coord_list, frame_list):
-            idx = idx + 1
-            if bbox == coord_placeholder:
-                continue
-            x1, y1, x2, y2 = bbox
-            
-            # Extra margin handling for v15 version
-            if self.version == "v15":
-                y2 = y2 + self.extra_margin  # Add extra chin area
-                y2 = min(y2, frame.shape[0])  # Ensure not out of image boundary
-                y1 = max(y1, 0) # Ensure not out of image boundary
-                coord_list[idx] = [x1, y1, x2, y2]  # Update bbox in coord_list
-                
-            # Crop face region and resize to 256x256
-            crop_frame = frame[y1:y2, x1:x2]
-            resized_crop_frame = cv2.resize(crop_frame, (256, 256), interpolation=cv2.INTER_LANCZOS4)
-            
-            # Use VAE to extract latent features
-            latents = self.vae.get_latents_for_unet(resized_crop_frame)
-            input_latent_list.append(latents)
-
-        # Step 5: Build cycle sequence (by forward + reverse order)
+        # Step 2: Process input source (support video file or png image directory)
+        frame_list = read_avatar_frames(self.video_path)
+
+        # Step 3: Face boxes, masks and latents, analyzed in worker processes and cached per chunk
+        settings = PreparationSettings(
+            bbox_shift=self.bbox_shift,
+            version=self.version,
+            parsing_mode=self.parsing_mode,
+            left_cheek_width=self.left_cheek_width,
+            right_cheek_width=self.right_cheek_width,
+            extra_margin=self.extra_margin
+        )
+        preparer = AvatarPreparer(self.prepare_cache_path, settings, self._encode_face_crops,
+                                  workers=self.preparation_workers)
+        prepared = preparer.prepare(frame_list)
+        if prepared.range_minus:
+            logger.info(f"Total frame: {len(frame_list)}, bbox_shift adjust range: "
+                        f"[-{int(np.mean(prepared.range_minus))}~{int(np.mean(prepared.range_plus))}], "
+                        f"current value: {self.bbox_shift}")
+
+        # Step 4: Build cycle sequence (by forward + reverse order), the mirrored half reuses
+        # the masks and latents of the forward half
         self.frame_list_cycle = frame_list + frame_list[::-1]
-        self.coord_list_cycle = coord_list + coord_list[::-1]
-        self.input_latent_list_cycle = input_latent_list + input_latent_list[::-1]
-        self.mask_coords_list_cycle = []
-        self.mask_list_cycle = []
-
-        # Step 6: Generate and save masks
-        for i, frame in enumerate(tqdm(self.frame_list_cycle)):
-            # Save processed frame
-            cv2.imwrite(f"{self.full_imgs_path}/{str(i).zfill(8)}.png", frame)
-
-            # Get current frame's face bbox
-            x1, y1, x2, y2 = self.coord_list_cycle[i]
-            
-            # Select face parsing mode by version
-            if self.version == "v15":
-                mode = self.parsing_mode  # v15 supports different parsing modes
-            else:
-                mode = "raw"  # v1 only supports raw mode
-                
-            # Generate mask and crop box
-            mask, crop_box = get_image_prepare_material(frame, [x1, y1, x2, y2], fp=self.fp, mode=mode)
-
-            # Save mask and related info
-            cv2.imwrite(f"{self.mask_out_path}/{str(i).zfill(8)}.png", mask)
-            self.mask_coords_list_cycle += [crop_box]
-            self.mask_list_cycle.append(mask)
+        self.coord_list_cycle = prepared.coord_list + prepared.coord_list[::-1]
+        self.mask_list_cycle = prepared.mask_list + prepared.mask_list[::-1]
+        self.mask_coords_list_cycle = prepared.mask_coords_list + prepared.mask_coords_list[::-1]
+        input_latent_list_cycle = prepared.latent_list + prepared.latent_list[::-1]
 
-        # Step 7: Save all processed data
+        # Step 5: Save all processed data
         # Save mask coordinates
         with open(self.mask_coords_path, 'wb') as f:
             pickle.dump(self.mask_coords_list_cycle, f)
@@ -413,16 +438,22 @@ class MuseAvatarV15:
         with open(self.coords_path, 'wb') as f:
             pickle.dump(self.coord_list_cycle, f)
 
-        # Save latent features
-        torch.save(self.input_latent_list_cycle, self.latents_out_path)
+        # Save frames, masks and latent features as memory mapped material
+        save_material(self.avatar_path, self.frame_list_cycle, self.mask_list_cycle, input_latent_list_cycle)
 
-        # Save frame data
-        with open(self.frames_path, 'wb') as f:
-            pickle.dump(self.frame_list_cycle, f)
+        # Drop the in memory lists and use the mapped material like a loaded avatar
+        self._load_material()
 
-        # Save mask data
-        with open(self.masks_path, 'wb') as f:
-            pickle.dump(self.mask_list_cycle, f)
+    @torch.no_grad()
+    def _encode_face_crops(self, crops: List[np.ndarray]) -> np.ndarray:
+        """
+        VAE latents of 256x256 BGR face crops in one batch, the same as get_latents_for_unet per crop
+        return: [N, 8, 32, 32] masked and reference latents
+        """
+        masked_images = torch.cat([self.vae.preprocess_img(crop, half_mask=True) for crop in crops])
+        ref_images = torch.cat([self.vae.preprocess_img(crop, half_mask=False) for crop in crops])
+        latents = torch.cat([self.vae.encode_latents(masked_images), self.vae.encode_latents(ref_images)], dim=1)
+        return latents.cpu().numpy()
 
     def acc_get_image_blending(self, image, face, face_box, mask_array, crop_box):
         # 1. BGR2RGB
@@ -464,8 +495,19 @@ class MuseAvatarV15:
         t0 = time.time()
         # Get the face bbox and original frame for the current frame
         bbox = self.coord_list_cycle[idx % len(self.coord_list_cycle)]
-        ori_frame = copy.deepcopy(self.frame_list_cycle[idx % len(self.frame_list_cycle)])
+        # frames are never modified in place, the blending writes into a new array
+        ori_frame = self.frame_list_cycle[idx % len(self.frame_list_cycle)]
         t1 = time.time()
+        # Add protection: if res_frame is all zeros, return original frame directly
+        if not np.any(res_frame):
+            # if self.debug:
+            logger.warning(f"res2combined: res_frame is all zero, return ori_frame, idx={idx}")
+            return ori_frame
+        if self.compositor is not None:
+            combine_frame = self.compositor.compose(res_frame, idx)
+            if self.debug:
+                logger.info(f"[PROFILE] res2combined: idx={idx}, compose={time.time()-t1:.4f}s")
+            return combine_frame
         x1, y1, x2, y2 = bbox
         try:
             # Resize the generated frame to face region size
@@ -474,11 +516,6 @@ class MuseAvatarV15:
             logger.opt(exception=True).error(f"res2combined error: {str(e)}")
             return ori_frame
         t2 = time.time()
-        # Add protection: if res_frame is all zeros, return original frame directly
-        if np.all(res_frame == 0):
-            # if self.debug:
-            logger.warning(f"res2combined: res_frame is all zero, return ori_frame, idx={idx}")
-            return ori_frame
         # Get the corresponding mask and crop box
         mask = self.mask_list_cycle[idx % len(self.mask_list_cycle)]
         mask_crop_box = self.mask_coords_list_cycle[idx % len(self.mask_coords_list_cycle)]
@@ -605,7 +642,6 @@ class MuseAvatarV15:
         batch_size: batch size
         Return: List of (recon, idx) tuples, length is batch_size
         """
-        t0 = time.time()
         # Ensure whisper_chunks shape is (B, 50, 384)
         if whisper_chunks.ndim == 2:
             whisper_chunks = whisper_chunks.unsqueeze(0)
@@ -614,6 +650,20 @@ class MuseAvatarV15:
         B = whisper_chunks.shape[0]
         assert B == batch_size, f"whisper_chunks.shape[0] ({B}) != batch_size ({batch_size})"
         idx_list = [start_idx + i for i in range(batch_size)]
+        recon = self.generate_frames_for_indices(whisper_chunks, idx_list)
+        return [(recon[i], idx_list[i]) for i in range(B)]
+
+    @torch.no_grad()
+    def generate_frames_for_indices(self, whisper_chunks: torch.Tensor, idx_list) -> list:
+        """
+        Generate one frame per whisper chunk, idx_list holds the avatar cycle index of every
+        frame and needs not be continuous, so frames of different sessions can share a batch
+        whisper_chunks: [B, 50, 384]
+        idx_list: B frame indices
+        Return: List of B recon faces
+        """
+        t0 = time.time()
+        B = whisper_chunks.shape[0]
         latent_list = []
         t1 = time.time()
         for idx in idx_list:
@@ -623,38 +673,31 @@ class MuseAvatarV15:
             latent_list.append(latent)
         latent_batch = torch.cat(latent_list, dim=0)  # [B, ...]
         t2 = time.time()
-        audio_feature = self.pe(whisper_chunks.to(self.device))
+        latent_batch = latent_batch.to(device=self.device, dtype=self.weight_dtype)
+        whisper_chunks = whisper_chunks.to(device=self.device, dtype=self.weight_dtype)
         t3 = time.time()
-        latent_batch = latent_batch.to(device=self.device, dtype=self.unet.model.dtype)
+        image = self.backend(latent_batch, whisper_chunks)
         t4 = time.time()
-        pred_latents = self.unet.model(
-            latent_batch,
-            self.timesteps,
-            encoder_hidden_states=audio_feature
-        ).sample
-        # # Force set pred_latents to all nan for debugging： unet get nan value
-        # pred_latents[:] = float('nan')
+        # same conversion as vae.decode_latents, BGR uint8 faces
+        image = image.permute(0, 2, 3, 1).float().mul(255).round().to(torch.uint8).cpu().numpy()
+        recon = image[..., ::-1]
         t5 = time.time()
-        pred_latents = pred_latents.to(device=self.device, dtype=self.vae.vae.dtype)
-        recon = self.vae.decode_latents(pred_latents)
-        t6 = time.time()
-        avg_time = (t6 - t0) / B if B > 0 else 0.0
+        avg_time = (t5 - t0) / B if B > 0 else 0.0
         if self.debug:
             logger.info(
-                f"[PROFILE] generate_frames: start_idx={start_idx}, batch_size={batch_size}, "
-                f"prep_whisper={t1-t0:.4f}s, prep_latent={t2-t1:.4f}s, pe={t3-t2:.4f}s, "
-                f"latent_to={t4-t3:.4f}s, unet={t5-t4:.4f}s, vae={t6-t5:.4f}s, total={t6-t0:.4f}s, total_per_frame={avg_time:.4f}s"
+                f"[PROFILE] generate_frames: start_idx={idx_list[0]}, batch_size={B}, backend={self.backend.name}, "
+                f"prep_whisper={t1-t0:.4f}s, prep_latent={t2-t1:.4f}s, input_to={t3-t2:.4f}s, "
+                f"unet_vae={t4-t3:.4f}s, to_host={t5-t4:.4f}s, total={t5-t0:.4f}s, total_per_frame={avg_time:.4f}s"
             )
             # debug for nan value
             logger.info(f"latent_batch stats: min={latent_batch.min().item()}, max={latent_batch.max().item()}, mean={latent_batch.mean().item()}, nan_count={(torch.isnan(latent_batch).sum().item() if torch.isnan(latent_batch).any() else 0)}")
-            logger.info(f"pred_latents stats: min={pred_latents.min().item()}, max={pred_latents.max().item()}, mean={pred_latents.mean().item()}, nan_count={(torch.isnan(pred_latents).sum().item() if torch.isnan(pred_latents).any() else 0)}")
             if isinstance(recon, np.ndarray):
                 logger.info(f"recon stats: min={recon.min()}, max={recon.max()}, mean={recon.mean()}, nan_count={np.isnan(recon).sum()}")
             elif isinstance(recon, torch.Tensor):
                 logger.info(f"recon stats: min={recon.min().item()}, max={recon.max().item()}, mean={recon.mean().item()}, nan_count={(torch.isnan(recon).sum().item() if torch.isnan(recon).is_floating_point() else 0)}")
             else:
                 logger.info(f"recon type: {type(recon)}")
-        return [(recon[i], idx_list[i]) for i in range(B)]
+        return [recon[i] for i in range(B)]
 
     @torch.no_grad()
     def inference(self, audio_path, out_vid_name, fps, skip_save_images):
@@ -0,0 +1,187 @@
+import threading
+import time
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+import torch
+from loguru import logger
+
+BACKEND_NAMES = ("eager", "compile", "cuda_graph")
+
+
+def fitting_batch_size(batch_sizes: Sequence[int], batch_size: int) -> Optional[int]:
+    """
+    return: smallest prepared batch size that holds batch_size, None when none does
+    """
+    fitting = [size for size in batch_sizes if size >= batch_size]
+    return min(fitting) if fitting else None
+
+
+def pad_batch(inputs: Sequence[torch.Tensor], batch_size: int) -> Tuple[torch.Tensor, ...]:
+    """
+    Pad every input with zero rows along the batch axis to batch_size rows.
+    """
+    return tuple(tensor if tensor.shape[0] == batch_size else
+                 torch.cat([tensor, tensor.new_zeros((batch_size - tensor.shape[0], *tensor.shape[1:]))])
+                 for tensor in inputs)
+
+
+class EagerBackend:
+    """
+    Runs the MuseTalk forward function as it is.
+    """
+    name = "eager"
+
+    def __init__(self, fn: Callable[..., torch.Tensor]):
+        self._fn = fn
+
+    def prepare(self, make_inputs: Callable[[int], Tuple[torch.Tensor, ...]], batch_sizes: Sequence[int]):
+        pass
+
+    def __call__(self, *inputs: torch.Tensor) -> torch.Tensor:
+        return self._fn(*inputs)
+
+
+class CompiledBackend(EagerBackend):
+    """
+    Runs the forward function compiled with torch.compile for the batch sizes compiled in
+    prepare. Like the CUDA graphs, a batch is padded to the smallest prepared size that fits
+    it and larger batches are split into batches of the largest prepared size, so serving
+    never meets a new shape and compiles nothing.
+    """
+    name = "compile"
+
+    def __init__(self, fn: Callable[..., torch.Tensor]):
+        super().__init__(torch.compile(fn, dynamic=False))
+        self._batch_sizes: List[int] = []
+
+    def prepare(self, make_inputs, batch_sizes):
+        for batch_size in sorted(set(batch_sizes)):
+            self._fn(*make_inputs(batch_size))
+            self._batch_sizes.append(batch_size)
+
+    def __call__(self, *inputs):
+        batch_size = inputs[0].shape[0]
+        if not self._batch_sizes:
+            return self._fn(*inputs)
+        largest = self._batch_sizes[-1]
+        if batch_size > largest:
+            return torch.cat([self(*(tensor[start:start + largest] for tensor in inputs))
+                              for start in range(0, batch_size, largest)])
+        padded_size = fitting_batch_size(self._batch_sizes, batch_size)
+        return self._fn(*pad_batch(inputs, padded_size))[:batch_size]
+
+
+class CudaGraphBackend(EagerBackend):
+    """
+    Replays CUDA graphs captured for fixed batch sizes. A batch is padded to the smallest
+    captured size that fits it, larger batches run eagerly. Inputs are copied into the
+    static input buffers of the graph and the output is cloned out of its static buffer.
+    """
+    name = "cuda_graph"
+
+    def __init__(self, fn: Callable[..., torch.Tensor]):
+        super().__init__(fn)
+        self._graphs: Dict[int, Tuple[torch.cuda.CUDAGraph, Tuple[torch.Tensor, ...], torch.Tensor]] = {}
+        self._lock = threading.Lock()
+
+    def prepare(self, make_inputs, batch_sizes):
+        for batch_size in sorted(set(batch_sizes)):
+            static_inputs = tuple(tensor.clone() for tensor in make_inputs(batch_size))
+            # warm up on a side stream before capturing, as torch.cuda.graphs recommends
+            stream = torch.cuda.Stream()
+            stream.wait_stream(torch.cuda.current_stream())
+            with torch.cuda.stream(stream):
+                for _ in range(3):
+                    self._fn(*static_inputs)
+            torch.cuda.current_stream().wait_stream(stream)
+            graph = torch.cuda.CUDAGraph()
+            with torch.cuda.graph(graph):
+                static_output = self._fn(*static_inputs)
+            self._graphs[batch_size] = (graph, static_inputs, static_output)
+
+    def __call__(self, *inputs):
+        batch_size = inputs[0].shape[0]
+        captured_size = fitting_batch_size(list(self._graphs), batch_size)
+        if captured_size is None:
+            return self._fn(*inputs)
+        with self._lock:
+            graph, static_inputs, static_output = self._graphs[captured_size]
+            for static_input, value in zip(static_inputs, inputs):
+                static_input[:batch_size].copy_(value)
+            graph.replay()
+            return static_output[:batch_size].clone()
+
+
+def create_backend(name: str, fn: Callable[..., torch.Tensor]) -> EagerBackend:
+    if name == "compile":
+        return CompiledBackend(fn)
+    if name == "cuda_graph":
+        return CudaGraphBackend(fn)
+    if name == "eager":
+        return EagerBackend(fn)
+    raise ValueError(f"unknown execution backend {name}, expected one of {BACKEND_NAMES}")
+
+
+def _synchronize(device: torch.device):
+    if device.type == "cuda":
+        torch.cuda.synchronize(device)
+
+
+def get_available_backends(device: torch.device) -> List[str]:
+    backends = ["eager"]
+    if hasattr(torch, "compile"):
+        backends.append("compile")
+    if device.type == "cuda":
+        backends.append("cuda_graph")
+    return backends
+
+
+@torch.no_grad()
+def select_backend(fn: Callable[..., torch.Tensor],
+                   make_inputs: Callable[[int], Tuple[torch.Tensor, ...]],
+                   batch_sizes: Sequence[int],
+                   device: torch.device,
+                   backend: str = "auto",
+                   runs: int = 3) -> EagerBackend:
+    """
+    Prepare the requested backend, or with "auto" prepare every backend available on the
+    device, time `runs` batches of every batch size with each and keep the fastest. Backends
+    that fail to prepare or run are skipped, eager is always the fallback.
+
+    fn: forward function, its output must only depend on its tensor inputs
+    make_inputs: returns example inputs for a batch size
+    """
+    device = torch.device(device)
+    batch_sizes = sorted({size for size in batch_sizes if size > 0})
+    names = get_available_backends(device) if backend == "auto" else [backend]
+    best: Optional[EagerBackend] = None
+    best_time = float("inf")
+    timings = {}
+    for name in names:
+        try:
+            candidate = create_backend(name, fn)
+            candidate.prepare(make_inputs, batch_sizes)
+            if len(names) == 1:
+                return candidate
+            inputs = [make_inputs(batch_size) for batch_size in batch_sizes]
+            # one untimed pass, the first call of a backend may still allocate
+            for batch_inputs in inputs:
+                candidate(*batch_inputs)
+            _synchronize(device)
+            start_time = time.perf_counter()
+            for _ in range(runs):
+                for batch_inputs in inputs:
+                    candidate(*batch_inputs)
+            _synchronize(device)
+            elapsed = time.perf_counter() - start_time
+        except Exception as e:
+            logger.opt(exception=True).warning(f"MuseTalk execution backend {name} is not usable: {e}")
+            continue
+        timings[name] = elapsed / max(1, runs * sum(batch_sizes))
+        if elapsed < best_time:
+            best, best_time = candidate, elapsed
+    if best is None:
+        best = EagerBackend(fn)
+    logger.info("MuseTalk execution backend {} selected for batch sizes {}, per frame: {}", best.name, batch_sizes,
+                {name: f"{cost * 1000:.2f}ms" for name, cost in timings.items()})
+    return best
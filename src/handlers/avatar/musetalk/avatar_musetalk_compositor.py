@@ -0,0 +1,164 @@
+import threading
+import warnings
+from typing import List, Optional, Sequence
+
+import cv2
+import numpy as np
+import torch
+import torch.nn.functional as F
+from loguru import logger
+
+
+def dedup_arrays(array_list: Sequence[np.ndarray]):
+    """
+    return the index of every item into the list of distinct arrays, and that list
+    """
+    index = []
+    unique = []
+    positions = {}
+    for array in array_list:
+        position = positions.get(id(array))
+        if position is None:
+            position = len(unique)
+            positions[id(array)] = position
+            unique.append(array)
+        index.append(position)
+    return index, unique
+
+
+def crop_face_masks(face_boxes, mask_list, mask_coord_list, convert) -> list:
+    """
+    cut the face box part out of every crop box mask and convert it once, entries of
+    empty face boxes are None
+    """
+    mask_index, unique_masks = dedup_arrays(mask_list)
+    face_masks = []
+    cache = {}
+    for idx, (x1, y1, x2, y2) in enumerate(face_boxes):
+        if x2 <= x1 or y2 <= y1:
+            face_masks.append(None)
+            continue
+        x_s, y_s, _, _ = (int(v) for v in mask_coord_list[idx])
+        key = (mask_index[idx], x1 - x_s, y1 - y_s, x2 - x_s, y2 - y_s)
+        if key not in cache:
+            mask = unique_masks[mask_index[idx]][y1 - y_s:y2 - y_s, x1 - x_s:x2 - x_s]
+            cache[key] = convert(np.ascontiguousarray(mask))
+        face_masks.append(cache[key])
+    return face_masks
+
+
+class TorchFrameCompositor:
+    """
+    Blends generated MuseTalk faces back into the avatar frames with torch, on cpu or gpu.
+
+    Backgrounds, face boxes and masks are uploaded once. The frame and mask cycles repeat the same
+    arrays forward and backward, so each distinct array is stored only once. Only the face box
+    is blended, pixels outside it are kept exactly as in the background frame. A prepared
+    frame_stack with its frame_index, e.g. memory mapped avatar material, is used as the frame
+    storage directly and is not copied on cpu.
+    """
+
+    def __init__(self,
+                 frame_list: Sequence[np.ndarray],
+                 coord_list: Sequence[Sequence[int]],
+                 mask_list: Sequence[np.ndarray],
+                 mask_coord_list: Sequence[Sequence[int]],
+                 device: Optional[torch.device] = None,
+                 frame_stack: Optional[np.ndarray] = None,
+                 frame_index: Optional[Sequence[int]] = None):
+        self.device = torch.device(device) if device is not None else torch.device("cpu")
+        self.cycle_length = len(frame_list)
+        if frame_stack is None or frame_index is None:
+            frame_index, unique_frames = dedup_arrays(frame_list)
+            frame_stack = np.stack(unique_frames)
+        with warnings.catch_warnings():
+            # read only memory maps are only read from, compose works on a clone
+            warnings.simplefilter("ignore", UserWarning)
+            # [N, H, W, 3] uint8, on cpu the numpy arrays are not copied again
+            self.frames = torch.from_numpy(frame_stack).to(self.device)
+        self.frame_index = list(frame_index)
+        self.face_boxes = [tuple(int(v) for v in coord) for coord in coord_list]
+        self.face_masks: List[Optional[torch.Tensor]] = crop_face_masks(
+            self.face_boxes, mask_list, mask_coord_list,
+            lambda mask: torch.from_numpy(mask).to(self.device, torch.float32).div_(255.0).unsqueeze(-1))
+        logger.info("torch compositor on {} with {} frames, {} distinct", self.device,
+                    self.cycle_length, self.frames.shape[0])
+
+    def get_frame(self, idx: int) -> torch.Tensor:
+        return self.frames[self.frame_index[idx % self.cycle_length]]
+
+    @torch.no_grad()
+    def compose(self, res_frame, idx: int) -> np.ndarray:
+        """
+        res_frame: generated bgr face, [h, w, 3] uint8 numpy array or tensor
+        return: blended full frame, [H, W, 3] uint8 numpy array
+        """
+        idx = idx % self.cycle_length
+        out = self.get_frame(idx).clone()
+        face_mask = self.face_masks[idx]
+        if face_mask is not None:
+            x1, y1, x2, y2 = self.face_boxes[idx]
+            if isinstance(res_frame, np.ndarray):
+                # generated faces are channel flipped views with negative strides, torch needs a copy
+                res_frame = torch.from_numpy(np.ascontiguousarray(res_frame))
+            face = res_frame.to(self.device, torch.float32, non_blocking=True)
+            # same bilinear sampling as cv2.resize INTER_LINEAR
+            face = F.interpolate(face.permute(2, 0, 1).unsqueeze(0), size=(y2 - y1, x2 - x1),
+                                 mode="bilinear", align_corners=False)[0].permute(1, 2, 0)
+            region = out[y1:y2, x1:x2]
+            blended = face.mul_(face_mask).add_(region.float().mul_(1 - face_mask))
+            region.copy_(blended.clamp_(0, 255))
+        return out.cpu().numpy()
+
+
+class NumpyFrameCompositor:
+    """
+    Blends generated MuseTalk faces back into the avatar frames on cpu with 8 bit fixed point math.
+
+    The face box masks are converted once to uint16 weights in [0, 256]. The blend
+    (face * w + frame * (256 - w) + 128) >> 8 runs in reusable uint16 scratch buffers and
+    is written straight into the output frame.
+    """
+
+    def __init__(self,
+                 frame_list: Sequence[np.ndarray],
+                 coord_list: Sequence[Sequence[int]],
+                 mask_list: Sequence[np.ndarray],
+                 mask_coord_list: Sequence[Sequence[int]]):
+        self.frame_list = frame_list
+        self.cycle_length = len(frame_list)
+        self.face_boxes = [tuple(int(v) for v in coord) for coord in coord_list]
+        self.face_weights = crop_face_masks(self.face_boxes, mask_list, mask_coord_list, self._to_weights)
+        self._scratch = threading.local()
+
+    @staticmethod
+    def _to_weights(mask: np.ndarray):
+        weight = ((mask.astype(np.uint32) * 256 + 127) // 255).astype(np.uint16)[..., np.newaxis]
+        return weight, 256 - weight
+
+    def _get_scratch(self, shape):
+        scratch = getattr(self._scratch, "buffers", None)
+        if scratch is None or scratch[0].shape[0] < shape[0] or scratch[0].shape[1] < shape[1]:
+            size = (shape[0], shape[1], 3) if scratch is None else \
+                (max(shape[0], scratch[0].shape[0]), max(shape[1], scratch[0].shape[1]), 3)
+            scratch = (np.empty(size, dtype=np.uint16), np.empty(size, dtype=np.uint16))
+            self._scratch.buffers = scratch
+        return scratch[0][:shape[0], :shape[1]], scratch[1][:shape[0], :shape[1]]
+
+    def compose(self, res_frame: np.ndarray, idx: int) -> np.ndarray:
+        idx = idx % self.cycle_length
+        out = self.frame_list[idx].copy()
+        weights = self.face_weights[idx]
+        if weights is None:
+            return out
+        x1, y1, x2, y2 = self.face_boxes[idx]
+        face = cv2.resize(res_frame.astype(np.uint8, copy=False), (x2 - x1, y2 - y1))
+        region = out[y1:y2, x1:x2]
+        face_part, frame_part = self._get_scratch(region.shape)
+        np.multiply(face, weights[0], out=face_part)
+        np.multiply(region, weights[1], out=frame_part)
+        face_part += frame_part
+        face_part += 128
+        face_part >>= 8
+        np.copyto(region, face_part, casting="unsafe")
+        return out
@@ -5,13 +5,24 @@ class AvatarMuseTalkConfig(HandlerBaseConfigModel, BaseModel):
     """Configuration class for MuseTalk avatar handler."""
     fps: int = Field(default=25)  # Video frames per second
     batch_size: int = Field(default=5)  # Batch size for processing audio and video frames
+    inference_batch_size: int = Field(default=20)  # Max frames of all sessions generated in one batch
+    inference_max_wait_ms: float = Field(default=10)  # Max time a request waits for other sessions to fill a batch
+    # UNet/VAE execution: eager, compile, cuda_graph, or auto to benchmark them at load
+    execution_backend: str = Field(default="auto")
+    # Speaking frames are scheduled this many frames after the current one
+    presentation_lead_frames: int = Field(default=5)
     avatar_video_path: str = Field(default="")  # Path to the initialization video
     avatar_model_dir: str = Field(default="models/musetalk/avatar_model")  # Directory for output results 
     force_create_avatar: bool = Field(default=False)  # Whether to force data regeneration
+    # Processes analyzing faces when an avatar is created, 0 runs in the handler process
+    preparation_workers: int = Field(default=2)
     debug: bool = Field(default=False)  # Enable debug mode
     debug_save_handler_audio: bool = Field(default=False)  # Enable debug mode
     debug_replay_speech_id: str = Field(default="")  # Enable debug mode
     algo_audio_sample_rate: int = Field(default=16000)  # Internal algorithm sample rate, fixed at 16000, used for input audio resampling
     output_audio_sample_rate: int = Field(default=24000)  # Output audio sample rate (for resampling)
     model_dir: str = Field(default="models/musetalk")  # Root directory for models
+    # Blend generated faces with torch instead of numpy fixed point math
+    use_torch_compositor: bool = Field(default=True)
+    compositor_device: str = Field(default="")  # Device for the torch compositor, empty uses the model device
     
\ No newline at end of file
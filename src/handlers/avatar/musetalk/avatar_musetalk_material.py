@@ -0,0 +1,119 @@
+import json
+import os
+from dataclasses import dataclass
+from typing import List, Sequence
+
+import numpy as np
+from loguru import logger
+
+from handlers.avatar.musetalk.avatar_musetalk_compositor import dedup_arrays
+
+MATERIAL_VERSION = 1
+MATERIAL_INDEX_FILE = "material_index.json"
+FRAMES_FILE = "frames.npy"
+MASKS_FILE = "masks.npy"
+LATENTS_FILE = "latents.npy"
+
+
+@dataclass
+class MuseTalkMaterial:
+    """
+    Avatar material backed by memory mapped npy files.
+
+    frames: [U, H, W, 3] uint8 distinct frames, frame_index maps the cycle position to a row
+    frame_list_cycle, mask_list_cycle: per cycle position views into the mapped files
+    latents: [L, ...] distinct latents, latent_index maps the cycle position to a row
+    """
+    frames: np.ndarray
+    frame_index: List[int]
+    frame_list_cycle: List[np.ndarray]
+    mask_list_cycle: List[np.ndarray]
+    latents: np.ndarray
+    latent_index: List[int]
+
+
+def material_exists(material_dir: str) -> bool:
+    index_path = os.path.join(material_dir, MATERIAL_INDEX_FILE)
+    if not os.path.exists(index_path):
+        return False
+    with open(index_path, "r") as f:
+        index = json.load(f)
+    return index.get("version") == MATERIAL_VERSION
+
+
+def save_material(material_dir: str,
+                  frame_list_cycle: Sequence[np.ndarray],
+                  mask_list_cycle: Sequence[np.ndarray],
+                  latent_list_cycle: Sequence[np.ndarray]):
+    """
+    Write the cycles as contiguous npy stacks plus an index. Arrays repeated in a cycle
+    (the mirrored second half) are written once. The index is written last and marks
+    the material as complete.
+    """
+    frame_index, unique_frames = dedup_arrays(frame_list_cycle)
+    latent_index, unique_latents = dedup_arrays(latent_list_cycle)
+    _save_stack(os.path.join(material_dir, FRAMES_FILE), unique_frames, np.uint8)
+    _save_stack(os.path.join(material_dir, LATENTS_FILE), unique_latents, unique_latents[0].dtype)
+
+    # masks differ in size per frame, they are stored flat with offsets and shapes
+    mask_index, unique_masks = dedup_arrays(mask_list_cycle)
+    mask_shapes = [list(mask.shape) for mask in mask_list_cycle]
+    unique_offsets = np.cumsum([0] + [mask.size for mask in unique_masks]).tolist()
+    mask_offsets = [unique_offsets[i] for i in mask_index]
+    tmp_path = os.path.join(material_dir, MASKS_FILE + ".tmp.npy")
+    masks = np.lib.format.open_memmap(tmp_path, mode="w+", dtype=np.uint8, shape=(unique_offsets[-1],))
+    for mask, offset in zip(unique_masks, unique_offsets):
+        masks[offset:offset + mask.size] = np.asarray(mask, dtype=np.uint8).ravel()
+    masks.flush()
+    del masks
+    os.replace(tmp_path, os.path.join(material_dir, MASKS_FILE))
+
+    index = {
+        "version": MATERIAL_VERSION,
+        "frame_index": frame_index,
+        "latent_index": latent_index,
+        "mask_shapes": mask_shapes,
+        "mask_offsets": mask_offsets,
+    }
+    tmp_path = os.path.join(material_dir, MATERIAL_INDEX_FILE + ".tmp")
+    with open(tmp_path, "w") as f:
+        json.dump(index, f)
+    os.replace(tmp_path, os.path.join(material_dir, MATERIAL_INDEX_FILE))
+    logger.info("saved avatar material with {} frames, {} distinct, to {}",
+                len(frame_list_cycle), len(unique_frames), material_dir)
+
+
+def load_material(material_dir: str) -> MuseTalkMaterial:
+    """
+    Map the material files without reading them, pages are loaded on first access and
+    shared through the page cache between processes using the same avatar.
+    """
+    with open(os.path.join(material_dir, MATERIAL_INDEX_FILE), "r") as f:
+        index = json.load(f)
+    frames = np.load(os.path.join(material_dir, FRAMES_FILE), mmap_mode="r")
+    masks = np.load(os.path.join(material_dir, MASKS_FILE), mmap_mode="r")
+    latents = np.load(os.path.join(material_dir, LATENTS_FILE), mmap_mode="r")
+
+    # one view per distinct frame, so repeated cycle positions share the same object
+    frame_views = [frames[i] for i in range(frames.shape[0])]
+    frame_list_cycle = [frame_views[i] for i in index["frame_index"]]
+    mask_list_cycle = [masks[offset:offset + int(np.prod(shape))].reshape(shape)
+                       for offset, shape in zip(index["mask_offsets"], index["mask_shapes"])]
+    return MuseTalkMaterial(
+        frames=frames,
+        frame_index=index["frame_index"],
+        frame_list_cycle=frame_list_cycle,
+        mask_list_cycle=mask_list_cycle,
+        latents=latents,
+        latent_index=index["latent_index"],
+    )
+
+
+def _save_stack(path: str, arrays: Sequence[np.ndarray], dtype):
+    tmp_path = path + ".tmp.npy"
+    stack = np.lib.format.open_memmap(tmp_path, mode="w+", dtype=dtype, shape=(len(arrays), *arrays[0].shape))
+    for i, array in enumerate(arrays):
+        stack[i] = array
+    stack.flush()
+    del stack
+    os.replace(tmp_path, path)
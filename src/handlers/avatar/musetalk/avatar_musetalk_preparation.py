@@ -0,0 +1,247 @@
+import hashlib
+import json
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from dataclasses import asdict, dataclass, field
+from typing import Callable, Dict, List, Optional, Sequence
+
+import cv2
+import numpy as np
+from loguru import logger
+
+PREPARATION_VERSION = 1
+coord_placeholder = (0.0, 0.0, 0.0, 0.0)
+
+
+@dataclass
+class PreparationSettings:
+    bbox_shift: int = 0
+    version: str = "v15"
+    parsing_mode: str = "jaw"
+    left_cheek_width: int = 90
+    right_cheek_width: int = 90
+    extra_margin: int = 10
+
+
+@dataclass
+class FaceChunk:
+    """
+    Face analysis of consecutive frames.
+
+    coords: face box of every frame, coord_placeholder when no face is found
+    masks, mask_coords: face parsing mask of every frame and its crop box
+    crops: 256x256 face crops of the frames with a face, the VAE input
+    """
+    coords: List[tuple]
+    masks: List[np.ndarray]
+    mask_coords: List[tuple]
+    crops: List[np.ndarray]
+    range_minus: List[int] = field(default_factory=list)
+    range_plus: List[int] = field(default_factory=list)
+
+
+@dataclass
+class PreparedAvatar:
+    coord_list: List[tuple]
+    mask_list: List[np.ndarray]
+    mask_coords_list: List[tuple]
+    latent_list: List[np.ndarray]
+    cached_frames: int = 0
+    range_minus: List[int] = field(default_factory=list)
+    range_plus: List[int] = field(default_factory=list)
+
+
+def read_avatar_frames(video_path: str) -> List[np.ndarray]:
+    """
+    Decode the frames of a video file, or read the png images of a directory in name order.
+    """
+    if os.path.isfile(video_path):
+        frames = []
+        cap = cv2.VideoCapture(video_path)
+        while True:
+            ret, frame = cap.read()
+            if not ret:
+                break
+            frames.append(frame)
+        cap.release()
+        return frames
+    files = sorted(file for file in os.listdir(video_path) if file.split(".")[-1] == "png")
+    return [cv2.imread(os.path.join(video_path, file)) for file in files]
+
+
+_face_models: Dict[str, object] = {}
+
+
+def _get_face_models(settings: PreparationSettings):
+    # loaded once per process, the landmark models are created when the module is imported
+    if "landmark" not in _face_models:
+        from handlers.avatar.musetalk.musetalk_utils_preprocessing import get_landmark_and_bbox_for_frames
+        from musetalk.utils.blending import get_image_prepare_material
+        from musetalk.utils.face_parsing import FaceParsing
+        if settings.version == "v15":
+            fp = FaceParsing(left_cheek_width=settings.left_cheek_width, right_cheek_width=settings.right_cheek_width)
+        else:
+            fp = FaceParsing()
+        _face_models.update(landmark=get_landmark_and_bbox_for_frames, parsing=fp,
+                            prepare_material=get_image_prepare_material)
+    return _face_models["landmark"], _face_models["parsing"], _face_models["prepare_material"]
+
+
+def analyze_frames(frames: Sequence[np.ndarray], settings: PreparationSettings) -> FaceChunk:
+    """
+    Landmark face boxes, face parsing masks and VAE face crops of frames, the same steps as
+    the sequential preparation took per frame.
+    """
+    get_landmark_and_bbox_for_frames, fp, get_image_prepare_material = _get_face_models(settings)
+    coords, range_minus, range_plus = get_landmark_and_bbox_for_frames(frames, settings.bbox_shift)
+    chunk = FaceChunk(coords=[], masks=[], mask_coords=[], crops=[],
+                      range_minus=[int(value) for value in range_minus],
+                      range_plus=[int(value) for value in range_plus])
+    mode = settings.parsing_mode if settings.version == "v15" else "raw"
+    for bbox, frame in zip(coords, frames):
+        if bbox != coord_placeholder:
+            x1, y1, x2, y2 = bbox
+            if settings.version == "v15":
+                # extra chin area, kept inside the image
+                y2 = min(y2 + settings.extra_margin, frame.shape[0])
+                y1 = max(y1, 0)
+            bbox = (int(x1), int(y1), int(x2), int(y2))
+            crop_frame = frame[y1:y2, x1:x2]
+            chunk.crops.append(cv2.resize(crop_frame, (256, 256), interpolation=cv2.INTER_LANCZOS4))
+        mask, crop_box = get_image_prepare_material(frame, list(bbox), fp=fp, mode=mode)
+        chunk.coords.append(tuple(bbox))
+        chunk.masks.append(mask)
+        chunk.mask_coords.append(tuple(int(value) for value in crop_box))
+    return chunk
+
+
+class AvatarPreparer:
+    """
+    Prepares avatar material in chunks of consecutive frames.
+
+    Face analysis of the chunks runs in a pool of worker processes, each loading its own
+    landmark and parsing models, while the main process encodes the face crops of finished
+    chunks with the VAE in batches. Every finished chunk is stored in cache_dir under a key of
+    its frame content and the settings, so an interrupted preparation resumes with the missing
+    chunks, and an avatar extended with more frames only analyzes the new ones.
+    """
+
+    def __init__(self, cache_dir: str, settings: PreparationSettings,
+                 encode_fn: Callable[[List[np.ndarray]], np.ndarray],
+                 analyze_fn: Callable[[Sequence[np.ndarray], PreparationSettings], FaceChunk] = analyze_frames,
+                 workers: int = 2,
+                 chunk_size: int = 32):
+        """
+        encode_fn: returns the latents of a list of 256x256 BGR face crops
+        analyze_fn: picklable face analysis of a chunk, runs in the worker processes
+        workers: worker processes, 0 analyzes in this process
+        """
+        self._cache_dir = cache_dir
+        self._settings = settings
+        self._encode_fn = encode_fn
+        self._analyze_fn = analyze_fn
+        self._workers = workers
+        self._chunk_size = max(1, chunk_size)
+
+    def prepare(self, frames: Sequence[np.ndarray]) -> PreparedAvatar:
+        os.makedirs(self._cache_dir, exist_ok=True)
+        starts = list(range(0, len(frames), self._chunk_size))
+        keys = [self._chunk_key(frames[start:start + self._chunk_size]) for start in starts]
+        results: Dict[int, dict] = {}
+        for start, key in zip(starts, keys):
+            cached = self._load_chunk(key)
+            if cached is not None:
+                results[start] = cached
+        cached_frames = sum(len(result["coords"]) for result in results.values())
+        missing = [(start, key) for start, key in zip(starts, keys) if start not in results]
+        logger.info(f"preparing {len(frames)} frames, {cached_frames} cached, {len(missing)} chunks to analyze "
+                    f"with {self._workers} workers")
+
+        t0 = time.time()
+        if missing and self._workers > 0:
+            context = multiprocessing.get_context("spawn")
+            with ProcessPoolExecutor(max_workers=min(self._workers, len(missing)), mp_context=context) as pool:
+                futures = {pool.submit(self._analyze_fn, frames[start:start + self._chunk_size], self._settings):
+                           (start, key) for start, key in missing}
+                for future in as_completed(futures):
+                    start, key = futures[future]
+                    results[start] = self._finish_chunk(key, future.result())
+        else:
+            for start, key in missing:
+                chunk = self._analyze_fn(frames[start:start + self._chunk_size], self._settings)
+                results[start] = self._finish_chunk(key, chunk)
+        if missing:
+            logger.info(f"analyzed {len(frames) - cached_frames} frames in {time.time() - t0:.1f}s")
+
+        prepared = PreparedAvatar(coord_list=[], mask_list=[], mask_coords_list=[], latent_list=[],
+                                  cached_frames=cached_frames)
+        for start in starts:
+            result = results[start]
+            prepared.coord_list.extend(result["coords"])
+            prepared.mask_list.extend(result["masks"])
+            prepared.mask_coords_list.extend(result["mask_coords"])
+            prepared.latent_list.extend(result["latents"])
+            prepared.range_minus.extend(result["range_minus"])
+            prepared.range_plus.extend(result["range_plus"])
+        return prepared
+
+    def _chunk_key(self, frames: Sequence[np.ndarray]) -> str:
+        digest = hashlib.sha1()
+        digest.update(json.dumps({"version": PREPARATION_VERSION, **asdict(self._settings)}, sort_keys=True).encode())
+        for frame in frames:
+            digest.update(str(frame.shape).encode())
+            digest.update(np.ascontiguousarray(frame).data)
+        return digest.hexdigest()
+
+    def _finish_chunk(self, key: str, chunk: FaceChunk) -> dict:
+        latents = np.asarray(self._encode_fn(chunk.crops)) if chunk.crops else np.zeros((0,), dtype=np.float32)
+        result = {
+            "coords": chunk.coords,
+            "masks": chunk.masks,
+            "mask_coords": chunk.mask_coords,
+            "latents": list(latents),
+            "range_minus": chunk.range_minus,
+            "range_plus": chunk.range_plus,
+        }
+        self._save_chunk(key, result, latents)
+        return result
+
+    def _chunk_path(self, key: str) -> str:
+        return os.path.join(self._cache_dir, f"{key}.npz")
+
+    def _save_chunk(self, key: str, result: dict, latents: np.ndarray):
+        arrays = {
+            "coords": np.asarray(result["coords"], dtype=np.int64).reshape(-1, 4),
+            "mask_coords": np.asarray(result["mask_coords"], dtype=np.int64).reshape(-1, 4),
+            "latents": latents,
+            "range_minus": np.asarray(result["range_minus"], dtype=np.int64),
+            "range_plus": np.asarray(result["range_plus"], dtype=np.int64),
+        }
+        for i, mask in enumerate(result["masks"]):
+            arrays[f"mask_{i}"] = mask
+        # written under a temporary name, a chunk file always holds a complete chunk
+        tmp_path = self._chunk_path(key) + ".tmp"
+        with open(tmp_path, "wb") as f:
+            np.savez(f, **arrays)
+        os.replace(tmp_path, self._chunk_path(key))
+
+    def _load_chunk(self, key: str) -> Optional[dict]:
+        path = self._chunk_path(key)
+        if not os.path.exists(path):
+            return None
+        try:
+            with np.load(path) as data:
+                coords = [tuple(int(value) for value in bbox) for bbox in data["coords"]]
+                return {
+                    "coords": coords,
+                    "masks": [data[f"mask_{i}"] for i in range(len(coords))],
+                    "mask_coords": [tuple(int(value) for value in box) for box in data["mask_coords"]],
+                    "latents": list(data["latents"]),
+                    "range_minus": data["range_minus"].tolist(),
+                    "range_plus": data["range_plus"].tolist(),
+                }
+        except Exception as e:
+            logger.warning(f"ignore unreadable preparation cache {path}: {e}")
+            return None
@@ -0,0 +1,99 @@
+import threading
+import time
+from dataclasses import dataclass
+from typing import List, Optional
+
+from loguru import logger
+
+from engine_utils.interval_counter import IntervalCounter
+
+
+@dataclass
+class PresentationMetrics:
+    presented_frames: int = 0
+    late_frames: int = 0
+    lag_frames: int = 0
+    max_lag_frames: int = 0
+
+
+class PresentationScheduler:
+    """
+    Assigns presentation slots to MuseTalk frames before they are generated.
+
+    Slot n is presented at start time + n / fps and its frame id is also the avatar cycle index.
+    Speaking frames get consecutive slots at least lead_frames after the current slot, which
+    leaves time to generate and compose them. The generator is held back while its next slot is
+    more than max_ahead_frames in the future. The collector waits for every slot with a timed
+    wait and reports the lag of frames that are presented after their slot.
+    """
+
+    def __init__(self, fps: int, lead_frames: int = 5, max_ahead_frames: int = 25):
+        self._frame_interval = 1.0 / fps
+        self._lead_frames = max(0, lead_frames)
+        self._max_ahead_frames = max(self._lead_frames + 1, max_ahead_frames)
+        self._start_time = time.perf_counter()
+        self._next_free_frame_id = 0
+        self._lock = threading.Lock()
+        self._metrics = PresentationMetrics()
+        self._counter = IntervalCounter("musetalk_presentation", interval=60)
+
+    def start(self):
+        with self._lock:
+            self._start_time = time.perf_counter()
+            self._next_free_frame_id = 0
+            self._metrics = PresentationMetrics()
+
+    def get_frame_time(self, frame_id: int) -> float:
+        return self._start_time + frame_id * self._frame_interval
+
+    def get_current_frame_id(self) -> int:
+        return int((time.perf_counter() - self._start_time) / self._frame_interval)
+
+    def reserve(self, count: int, stop_event: threading.Event) -> Optional[List[int]]:
+        """
+        Reserve count consecutive slots for speaking frames, waits while generation is more than
+        max_ahead_frames ahead. Return None when stop_event is set while waiting.
+        """
+        while not stop_event.is_set():
+            with self._lock:
+                current_frame_id = self.get_current_frame_id()
+                first_frame_id = max(self._next_free_frame_id, current_frame_id + self._lead_frames)
+                if first_frame_id - current_frame_id <= self._max_ahead_frames:
+                    self._next_free_frame_id = first_frame_id + count
+                    return list(range(first_frame_id, first_frame_id + count))
+                wake_time = self.get_frame_time(first_frame_id - self._max_ahead_frames)
+            stop_event.wait(max(0.0, wake_time - time.perf_counter()))
+        return None
+
+    def wait_for_slot(self, frame_id: int, stop_event: threading.Event) -> bool:
+        """
+        Sleep until the presentation time of frame_id, return False when stop_event is set.
+        """
+        timeout = self.get_frame_time(frame_id) - time.perf_counter()
+        if timeout > 0:
+            return not stop_event.wait(timeout)
+        return not stop_event.is_set()
+
+    def record_presented(self, frame_id: int, slot_frame_id: int):
+        """
+        frame_id: the slot assigned to the presented frame
+        slot_frame_id: the slot it is actually presented in
+        """
+        lag = max(0, slot_frame_id - frame_id)
+        with self._lock:
+            previous_lag = self._metrics.lag_frames
+            self._metrics.presented_frames += 1
+            self._metrics.lag_frames = lag
+            self._metrics.max_lag_frames = max(self._metrics.max_lag_frames, lag)
+            if lag > 0:
+                self._metrics.late_frames += 1
+        self._counter.add_property("presented_frames")
+        if lag > 0:
+            self._counter.add_property("late_frames")
+            if lag > previous_lag:
+                logger.warning(f"[PRESENTATION_LAG] frame_id={frame_id} presented {lag} frames late, "
+                               f"generation falls behind")
+
+    def get_metrics(self) -> PresentationMetrics:
+        with self._lock:
+            return PresentationMetrics(**vars(self._metrics))
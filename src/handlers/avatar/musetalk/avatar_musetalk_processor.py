@@ -2,28 +2,61 @@ import os
 import queue
 import threading
 import time
+from fractions import Fraction
 from queue import Queue
 from threading import Thread
 from typing import Optional
 
-import av
-import librosa
 import numpy as np
 import soundfile as sf
 import torch
 from loguru import logger
 
+from engine_utils.audio_resampler import RESAMPLER_BACKEND_NUMPY, StreamingResampler
 from handlers.avatar.liteavatar.model.algo_model import AvatarStatus, AudioResult, VideoResult
 from handlers.avatar.liteavatar.model.audio_input import SpeechAudio
 from src.handlers.avatar.musetalk.avatar_musetalk_algo import MuseAvatarV15
 from src.handlers.avatar.musetalk.avatar_musetalk_config import AvatarMuseTalkConfig
+from src.handlers.avatar.musetalk.avatar_musetalk_presentation import PresentationScheduler
+from src.handlers.avatar.musetalk.avatar_musetalk_scheduler import MuseTalkInferenceScheduler
+
+
+def create_inference_scheduler(avatar: MuseAvatarV15, config: AvatarMuseTalkConfig) -> MuseTalkInferenceScheduler:
+    """
+    Create the inference scheduler of an avatar, its worker thread warms up cuda for the session
+    and cross-session batch sizes.
+    """
+    def warmup():
+        if not torch.cuda.is_available():
+            return
+        t0 = time.time()
+        fps_remain = config.fps % config.batch_size
+        for batch_size in sorted({config.batch_size, config.inference_batch_size, fps_remain} - {0}):
+            dummy_whisper = torch.zeros(batch_size, 50, 384, device=avatar.device, dtype=avatar.weight_dtype)
+            avatar.generate_frames_for_indices(dummy_whisper, list(range(batch_size)))
+        torch.cuda.synchronize()
+        t1 = time.time()
+        logger.info(f"[THREAD_WARMUP] inference scheduler thread id: {threading.get_ident()} self-warmup done, "
+                    f"time: {(t1-t0)*1000:.1f} ms")
+
+    return MuseTalkInferenceScheduler(
+        avatar.generate_frames_for_indices,
+        max_batch_size=config.inference_batch_size,
+        max_wait_ms=config.inference_max_wait_ms,
+        warmup_fn=warmup,
+    )
+
 
 class AvatarMuseTalkProcessor:
     """MuseTalk processor responsible for audio-to-video conversion (multi-threaded queue structure)."""
     
-    def __init__(self, avatar: MuseAvatarV15, config: AvatarMuseTalkConfig):
+    def __init__(self, avatar: MuseAvatarV15, config: AvatarMuseTalkConfig,
+                 scheduler: Optional[MuseTalkInferenceScheduler] = None):
         self._avatar = avatar
         self._config = config
+        # Inference is shared with other sessions through the scheduler, a private one is used if none is given
+        self._own_scheduler = scheduler is None
+        self._scheduler = scheduler if scheduler is not None else create_inference_scheduler(avatar, config)
         self._algo_audio_sample_rate = config.algo_audio_sample_rate  # Internal algorithm sample rate, fixed at 16000
         self._output_audio_sample_rate = config.output_audio_sample_rate
         # Output queues
@@ -34,9 +67,14 @@ class AvatarMuseTalkProcessor:
         self._audio_queue = Queue()  # Input audio queue
         self._whisper_queue = Queue()  # Whisper feature queue
         self._frame_queue = Queue()  # Video frame queue
-        self._frame_id_queue = Queue()  # Frame ID allocation queue
         self._compose_queue = Queue()  # Frame composition queue
         self._output_queue = Queue()   # Output queue after composition
+        # Presentation slots of speaking frames are assigned before generation
+        self._presentation = PresentationScheduler(
+            config.fps,
+            lead_frames=config.presentation_lead_frames,
+            max_ahead_frames=config.batch_size * 5
+        )
         # Threading and state
         self._stop_event = threading.Event()
         self._feature_thread: Optional[Thread] = None
@@ -61,6 +99,9 @@ class AvatarMuseTalkProcessor:
             return
         self._session_running = True
         self._stop_event.clear()
+        self._presentation.start()
+        if self._own_scheduler:
+            self._scheduler.start()
         try:
             self._feature_thread = threading.Thread(target=self._feature_extractor_worker)
             self._frame_gen_thread = threading.Thread(target=self._frame_generator_worker)
@@ -98,6 +139,8 @@ class AvatarMuseTalkProcessor:
                 self._compose_thread.join(timeout=5)
                 if self._compose_thread.is_alive():
                     logger.warning("Compose thread did not exit in time.")
+            if self._own_scheduler:
+                self._scheduler.stop()
             self._clear_queues()
         except Exception as e:
             logger.opt(exception=True).error(f"Exception during thread join: {e}")
@@ -170,6 +213,12 @@ class AvatarMuseTalkProcessor:
         """
         Worker thread for extracting audio features.
         """
+        fps = self._config.fps
+        # one resampler per speech, the filter state follows the audio across its 1s segments, numpy keeps
+        # the filter delay at a few samples, the soxr stream holds back tens of milliseconds
+        resampler = StreamingResampler(self._output_audio_sample_rate, self._algo_audio_sample_rate,
+                                       backend=RESAMPLER_BACKEND_NUMPY)
+        resample_speech_id = None
         # Thread warmup: ensure CUDA context and memory allocation (for whisper feature extraction)
         if torch.cuda.is_available():
             t0 = time.time()
@@ -186,24 +235,31 @@ class AvatarMuseTalkProcessor:
                 audio_data = item['audio_data']
                 speech_id = item['speech_id']
                 end_of_speech = item['end_of_speech']
-                fps = self._config.fps if hasattr(self._config, 'fps') else 25
                 # Resample to algorithm sample rate
-                segment = librosa.resample(audio_data, orig_sr=self._output_audio_sample_rate, target_sr=self._algo_audio_sample_rate)
+                if speech_id != resample_speech_id:
+                    resampler.reset()
+                    resample_speech_id = speech_id
+                segment = resampler.process(audio_data)
+                if end_of_speech:
+                    segment = np.concatenate([segment, resampler.flush()])
+                    resampler.reset()
+                    resample_speech_id = None
                 target_len = self._algo_audio_sample_rate  # 1 second
                 if len(segment) > target_len:
-                    logger.error(f"Segment too long: {len(segment)} > {target_len}, speech_id={speech_id}")
-                    raise ValueError(f"Segment too long: {len(segment)} > {target_len}")
-                if len(segment) < target_len:
-                    segment = np.pad(segment, (0, target_len - len(segment)), mode='constant')
-                # Feature extraction
-                t0 = time.time()
-                whisper_chunks = self._avatar.extract_whisper_feature(segment, self._algo_audio_sample_rate)
-                t1 = time.time()
+                    # the filter delay moves the last samples of a segment into the next one, so the
+                    # end of speech segment may exceed one second by that delay
+                    segment = segment[:target_len]
                 orig_audio_data_len = len(audio_data)
                 orig_samples_per_frame = self._output_audio_sample_rate // fps
                 actual_audio_len = orig_audio_data_len
                 num_frames = int(np.ceil(actual_audio_len / orig_samples_per_frame))
+                # Feature extraction
+                t0 = time.time()
+                if len(segment) < target_len:
+                    segment = np.pad(segment, (0, target_len - len(segment)), mode='constant')
+                whisper_chunks = self._avatar.extract_whisper_feature(segment, self._algo_audio_sample_rate)
                 whisper_chunks = whisper_chunks[:num_frames]
+                t1 = time.time()
                 target_audio_len = num_frames * orig_samples_per_frame
                 if len(audio_data) < target_audio_len:
                     audio_data = np.pad(audio_data, (0, target_audio_len - len(audio_data)), mode='constant')
@@ -261,8 +317,8 @@ class AvatarMuseTalkProcessor:
 
     def _frame_generator_worker(self):
         """
-        Generate speaking frames only, with rate control when queue buffer is full.
-        Uses global frame_id allocation to ensure unique and continuous frame numbering for speaking frames.
+        Generate speaking frames only. Every batch reserves its presentation slots first, the
+        reservation waits while generation is too far ahead of the presentation clock.
         """
         from collections import namedtuple
         CurrentSpeechItem = namedtuple('CurrentSpeechItem', ['whisper_chunks', 'audio_data', 'speech_id', 'end_of_speech', 'num_chunks'])
@@ -271,28 +327,7 @@ class AvatarMuseTalkProcessor:
         fps = self._config.fps
         orig_samples_per_frame = int(self._output_audio_sample_rate / fps)
         batch_size = self._config.batch_size  # Can be adjusted based on actual needs
-        max_speaking_buffer = batch_size * 5  # Maximum length of speaking frame buffer
-        # Thread self-warmup, ensure CUDA context and memory allocation
-        if torch.cuda.is_available():
-            t0 = time.time()
-            # Regular batch_size warmup
-            dummy_whisper = torch.zeros(batch_size, 50, 384, device=self._avatar.device, dtype=self._avatar.weight_dtype)
-            self._avatar.generate_frames(dummy_whisper, 0, batch_size)
-            # Remainder batch_size warmup (only when there's a remainder)
-            remain = fps % batch_size
-            if remain > 0:
-                dummy_whisper_remain = torch.zeros(remain, 50, 384, device=self._avatar.device, dtype=self._avatar.weight_dtype)
-                self._avatar.generate_frames(dummy_whisper_remain, 0, remain)
-            torch.cuda.synchronize()
-            t1 = time.time()
-            logger.info(f"[THREAD_WARMUP] _frame_generator_worker thread id: {threading.get_ident()} self-warmup done, time: {(t1-t0)*1000:.1f} ms")
         while not self._stop_event.is_set():
-            # Control speaking frame buffer, queue full waits
-            while self._frame_queue.qsize() > max_speaking_buffer and not self._stop_event.is_set():
-                if self._config.debug:
-                    logger.info(f"[FRAME_GEN] speaking frame buffer full, waiting... frame_queue_size={self._frame_queue.qsize()}, max_speaking_buffer={max_speaking_buffer}")
-                time.sleep(0.01)
-                continue
             if current_item is None:
                 try:
                     item = self._whisper_queue.get_nowait()
@@ -315,14 +350,18 @@ class AvatarMuseTalkProcessor:
                 remain = current_item.num_chunks - chunk_idx
                 cur_batch = min(batch_size, remain)
                 batch_start_time = time.time()
-                # Get frame_id from frame_id queue
-                frame_ids = [self._frame_id_queue.get() for _ in range(cur_batch)]
+                # Reserve presentation slots, the frame ids are also the avatar cycle indices
+                frame_ids = self._presentation.reserve(cur_batch, self._stop_event)
+                if frame_ids is None:
+                    break
                 whisper_batch = current_item.whisper_chunks[chunk_idx:chunk_idx+cur_batch]
                 try:
-                    recon_idx_list = self._avatar.generate_frames(whisper_batch, frame_ids[0], cur_batch)
+                    # Batched together with pending frames of other sessions by the scheduler
+                    recon_list = self._scheduler.submit(whisper_batch, frame_ids).result()
+                    recon_idx_list = list(zip(recon_list, frame_ids))
                 except Exception as e:
                     logger.opt(exception=True).error(f"[GEN_FRAME_ERROR] frame_id={frame_ids[0]}, speech_id={current_item.speech_id}, error: {e}")
-                    recon_idx_list = [(np.zeros((256, 256, 3), dtype=np.uint8), frame_ids[0] + i) for i in range(cur_batch)]
+                    recon_idx_list = [(np.zeros((256, 256, 3), dtype=np.uint8), frame_id) for frame_id in frame_ids]
                 batch_end_time = time.time()
                 if self._config.debug:
                     logger.info(f"[FRAME_GEN] Generated speaking frame: speech_id={current_item.speech_id}, chunk_idx={chunk_idx}, cur_batch={cur_batch}, batch_time={(batch_end_time - batch_start_time)*1000:.1f}ms")
@@ -361,46 +400,56 @@ class AvatarMuseTalkProcessor:
                 item = self._compose_queue.get(timeout=0.1)
                 recon = item['recon']
                 idx = item['idx']
-                frame = self._avatar.res2combined(recon, idx)
-                item['frame'] = frame
-                self._output_queue.put(item)
             except queue.Empty:
                 continue
+            try:
+                frame = self._avatar.res2combined(recon, idx)
+            except Exception as e:
+                # keep the slot and the end of speech flag, show the original avatar frame instead
+                logger.opt(exception=True).error(
+                    f"[COMPOSE_ERROR] frame_id={idx}, speech_id={item['speech_id']}, error: {e}")
+                frame_list_cycle = self._avatar.frame_list_cycle
+                frame = frame_list_cycle[idx % len(frame_list_cycle)]
+            item['frame'] = frame
+            self._output_queue.put(item)
 
     def _frame_collector_worker(self):
         """
-        Collector strictly outputs at fps, with frame numbers matching the frame_id assigned by the inference thread.
+        Collector outputs one frame per presentation slot at fps. A speaking frame is presented in its
+        assigned slot, or as soon as it is ready when generation is late, otherwise an idle frame is used.
         """
         fps = self._config.fps
         frame_interval = 1.0 / fps
-        start_time = time.perf_counter()
+        frame_time_base = Fraction(1, fps)
         local_frame_id = 0
+        pending_item = None
+        audio_pts = 0
         last_active_speech_id = None
         last_speaking = False
         last_end_of_speech = False
         current_speech_id = None
         while not self._stop_event.is_set():
-            # Control fps
-            target_time = start_time + local_frame_id * frame_interval
-            now = time.perf_counter()
-            sleep_time = target_time - now
-            if sleep_time > 0.002:
-                time.sleep(sleep_time - 0.001)
-            while time.perf_counter() < target_time:
-                pass
+            # Timed wait for the presentation time of the slot
+            if not self._presentation.wait_for_slot(local_frame_id, self._stop_event):
+                break
             # Record the start time for profiling
             t_frame_start = time.perf_counter()
-            # Allocate frame_id
-            self._frame_id_queue.put(local_frame_id)
-            try:
-                output_item = self._output_queue.get_nowait()
+            if pending_item is None:
+                try:
+                    pending_item = self._output_queue.get_nowait()
+                except queue.Empty:
+                    pass
+            if pending_item is not None and pending_item['frame_id'] <= local_frame_id:
+                output_item = pending_item
+                pending_item = None
+                self._presentation.record_presented(output_item['frame_id'], local_frame_id)
                 frame = output_item['frame']
                 speech_id = output_item['speech_id']
                 avatar_status = output_item['avatar_status']
                 end_of_speech = output_item['end_of_speech']
                 frame_timestamp = output_item.get('timestamp', None)
                 audio_segment = output_item['audio_segment']
-            except queue.Empty:
+            else:
                 frame = self._avatar.generate_idle_frame(local_frame_id)
                 speech_id = last_active_speech_id
                 avatar_status = AvatarStatus.LISTENING
@@ -408,9 +457,10 @@ class AvatarMuseTalkProcessor:
                 frame_timestamp = time.time()
                 audio_segment = None
             # Notify video
-            video_frame = av.VideoFrame.from_ndarray(frame, format="bgr24")
             video_result = VideoResult(
-                video_frame=video_frame,
+                video_data=frame,
+                pts=local_frame_id,
+                time_base=frame_time_base,
                 speech_id=speech_id,
                 avatar_status=avatar_status,
                 end_of_speech=end_of_speech
@@ -458,13 +508,14 @@ class AvatarMuseTalkProcessor:
                 audio_np = np.asarray(audio_segment, dtype=np.float32)
                 if audio_np.ndim == 1:
                     audio_np = audio_np[np.newaxis, :]
-                audio_frame = av.AudioFrame.from_ndarray(audio_np, format="flt", layout="mono")
-                audio_frame.sample_rate = self._output_audio_sample_rate
                 audio_result = AudioResult(
-                    audio_frame=audio_frame,
+                    audio_data=audio_np,
+                    sample_rate=self._output_audio_sample_rate,
+                    pts=audio_pts,
                     speech_id=speech_id,
                     end_of_speech=end_of_speech
                 )
+                audio_pts += audio_np.shape[-1]
                 if speech_id not in self._audio_cache:
                     self._audio_cache[speech_id] = []
                 self._audio_cache[speech_id].append(audio_np[0] if audio_np.ndim == 2 else audio_np)
@@ -496,8 +547,7 @@ class AvatarMuseTalkProcessor:
 
     def _notify_audio(self, audio_result: AudioResult):
         if self.audio_output_queue is not None:
-            audio_frame = audio_result.audio_frame
-            audio_data = audio_frame.to_ndarray()
+            audio_data = audio_result.audio_data
             # Ensure float32 and shape [1, N]
             if audio_data.dtype != np.float32:
                 audio_data = audio_data.astype(np.float32)
@@ -512,10 +562,8 @@ class AvatarMuseTalkProcessor:
 
     def _notify_video(self, video_result: VideoResult):
         if self.video_output_queue is not None:
-            video_frame = video_result.video_frame
             try:
-                data = video_frame.to_ndarray(format="bgr24")
-                self.video_output_queue.put_nowait(data)
+                self.video_output_queue.put_nowait(video_result.video_data)
             except Exception as e:
                 logger.opt(exception=True).error(f"Exception in _notify_video: {e}")
 
@@ -529,7 +577,8 @@ class AvatarMuseTalkProcessor:
 
     def _clear_queues(self):
         with self._frame_id_lock:
-            for q in [self._audio_queue, self._whisper_queue, self._frame_queue, self._frame_id_queue, self._compose_queue, self._output_queue]:
+            for q in [self._audio_queue, self._whisper_queue, self._frame_queue, self._compose_queue,
+                      self._output_queue]:
                 while not q.empty():
                     try:
                         q.get_nowait()
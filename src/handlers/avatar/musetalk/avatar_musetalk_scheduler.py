@@ -0,0 +1,174 @@
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future
+from dataclasses import dataclass, field
+from typing import Callable, List, Optional, Sequence
+
+import numpy as np
+import torch
+from loguru import logger
+
+from engine_utils.interval_counter import IntervalCounter
+
+
+@dataclass
+class FrameRequest:
+    whisper_chunks: torch.Tensor
+    idx_list: List[int]
+    future: Future
+    submit_time: float = field(default_factory=time.perf_counter)
+
+
+@dataclass
+class InferenceSchedulerMetrics:
+    batches: int = 0
+    frames: int = 0
+    busy_time: float = 0
+    fps: float = 0
+    avg_batch_size: float = 0
+    p95_latency: float = 0
+
+
+class MuseTalkInferenceScheduler:
+    """
+    Shares MuseTalk UNet/VAE inference between sessions.
+
+    Every session submits the whisper chunks and cycle indices of the frames it needs. A single
+    worker thread takes the oldest pending request and waits at most max_wait_ms after its
+    submission for requests of other sessions, until max_batch_size frames are pending. The
+    requests are run as one batch and the generated faces are handed back through futures.
+    Requests are never split, a request larger than max_batch_size is run on its own.
+    """
+
+    def __init__(self, generate_fn: Callable[[torch.Tensor, Sequence[int]], Sequence],
+                 max_batch_size: int = 16, max_wait_ms: float = 10,
+                 warmup_fn: Optional[Callable[[], None]] = None, latency_window: int = 1000):
+        self._generate_fn = generate_fn
+        self._max_batch_size = max(1, max_batch_size)
+        self._max_wait = max(0.0, max_wait_ms) / 1000
+        self._warmup_fn = warmup_fn
+        self._pending: deque[FrameRequest] = deque()
+        self._pending_frames = 0
+        self._condition = threading.Condition()
+        self._stop_event = threading.Event()
+        self._worker_thread: Optional[threading.Thread] = None
+        self._metrics = InferenceSchedulerMetrics()
+        self._latencies = deque(maxlen=latency_window)
+        self._start_time = None
+        self._counter = IntervalCounter("musetalk_inference_scheduler", interval=60)
+
+    def start(self):
+        if self._worker_thread is not None:
+            return
+        self._stop_event.clear()
+        self._worker_thread = threading.Thread(target=self._worker_loop, daemon=True)
+        self._worker_thread.start()
+
+    def stop(self):
+        self._stop_event.set()
+        with self._condition:
+            self._condition.notify_all()
+        if self._worker_thread is not None:
+            self._worker_thread.join()
+            self._worker_thread = None
+        with self._condition:
+            pending = list(self._pending)
+            self._pending.clear()
+            self._pending_frames = 0
+        for request in pending:
+            request.future.cancel()
+
+    def submit(self, whisper_chunks: torch.Tensor, idx_list: Sequence[int]) -> Future:
+        """
+        whisper_chunks: [B, 50, 384] whisper features of the frames
+        idx_list: B avatar cycle indices of the frames
+        return: future of the B generated faces
+        """
+        if whisper_chunks.shape[0] != len(idx_list):
+            raise ValueError(f"got {whisper_chunks.shape[0]} whisper chunks for {len(idx_list)} frames")
+        request = FrameRequest(whisper_chunks=whisper_chunks, idx_list=list(idx_list), future=Future())
+        with self._condition:
+            self._pending.append(request)
+            self._pending_frames += len(request.idx_list)
+            self._condition.notify_all()
+        return request.future
+
+    def get_metrics(self) -> InferenceSchedulerMetrics:
+        with self._condition:
+            metrics = InferenceSchedulerMetrics(**vars(self._metrics))
+            latencies = list(self._latencies)
+            start_time = self._start_time
+        if start_time is not None:
+            metrics.fps = metrics.frames / max(1e-6, time.perf_counter() - start_time)
+        if metrics.batches > 0:
+            metrics.avg_batch_size = metrics.frames / metrics.batches
+        if latencies:
+            metrics.p95_latency = float(np.percentile(latencies, 95))
+        return metrics
+
+    def reset_metrics(self):
+        with self._condition:
+            self._metrics = InferenceSchedulerMetrics()
+            self._latencies.clear()
+            self._start_time = None
+
+    def _next_batch(self) -> List[FrameRequest]:
+        with self._condition:
+            while not self._pending and not self._stop_event.is_set():
+                self._condition.wait(0.1)
+            if self._stop_event.is_set():
+                return []
+            deadline = self._pending[0].submit_time + self._max_wait
+            while self._pending_frames < self._max_batch_size and not self._stop_event.is_set():
+                remaining = deadline - time.perf_counter()
+                if remaining <= 0:
+                    break
+                self._condition.wait(remaining)
+            batch = [self._pending.popleft()]
+            frame_count = len(batch[0].idx_list)
+            while self._pending and frame_count + len(self._pending[0].idx_list) <= self._max_batch_size:
+                request = self._pending.popleft()
+                frame_count += len(request.idx_list)
+                batch.append(request)
+            self._pending_frames -= frame_count
+            return batch
+
+    def _run_batch(self, batch: List[FrameRequest]):
+        start_time = time.perf_counter()
+        idx_list = [idx for request in batch for idx in request.idx_list]
+        try:
+            whisper_chunks = torch.cat([request.whisper_chunks for request in batch], dim=0) \
+                if len(batch) > 1 else batch[0].whisper_chunks
+            results = self._generate_fn(whisper_chunks, idx_list)
+        except Exception as e:
+            logger.opt(exception=True).error(f"MuseTalk batch of {len(idx_list)} frames failed: {e}")
+            for request in batch:
+                request.future.set_exception(e)
+            return
+        end_time = time.perf_counter()
+        offset = 0
+        for request in batch:
+            count = len(request.idx_list)
+            request.future.set_result(results[offset:offset + count])
+            offset += count
+        with self._condition:
+            if self._start_time is None:
+                self._start_time = start_time
+            self._metrics.batches += 1
+            self._metrics.frames += len(idx_list)
+            self._metrics.busy_time += end_time - start_time
+            self._latencies.extend(end_time - request.submit_time for request in batch)
+        self._counter.add_property("frames", len(idx_list))
+        self._counter.add_property("batches")
+
+    def _worker_loop(self):
+        if self._warmup_fn is not None:
+            try:
+                self._warmup_fn()
+            except Exception as e:
+                logger.opt(exception=True).error(f"MuseTalk inference warmup failed: {e}")
+        while not self._stop_event.is_set():
+            batch = self._next_batch()
+            if batch:
+                self._run_batch(batch)
@@ -85,27 +85,22 @@ def get_bbox_range(img_list,upperbondrange =0):
     return text_range
     
 
-def get_landmark_and_bbox(img_list,upperbondrange =0):
-    frames = read_imgs(img_list)
-    batch_size_fa = 1
-    batches = [frames[i:i + batch_size_fa] for i in range(0, len(frames), batch_size_fa)]
+def get_landmark_and_bbox_for_frames(frames, upperbondrange=0):
+    """
+    Face boxes of decoded frames, return coords_list and the per face ranges bbox_shift can be adjusted in
+    """
     coords_list = []
-    landmarks = []
-    if upperbondrange != 0:
-        print('get key_landmark and face bounding boxes with the bbox_shift:',upperbondrange)
-    else:
-        print('get key_landmark and face bounding boxes with the default value')
     average_range_minus = []
     average_range_plus = []
-    for fb in tqdm(batches):
-        results = inference_topdown(model, np.asarray(fb)[0])
+    for frame in frames:
+        results = inference_topdown(model, frame)
         results = merge_data_samples(results)
         keypoints = results.pred_instances.keypoints
         face_land_mark= keypoints[0][23:91]
         face_land_mark = face_land_mark.astype(np.int32)
         
         # get bounding boxes by face detetion
-        bbox = fa.get_detections_for_batch(np.asarray(fb))
+        bbox = fa.get_detections_for_batch(np.asarray([frame]))
         
         # adjust the bounding box refer to landmark
         # Add the bounding box to a tuple and append it to the coordinates list
@@ -133,10 +128,24 @@ def get_landmark_and_bbox(img_list,upperbondrange =0):
                 print("error bbox:",f)
             else:
                 coords_list += [f_landmark]
-    
+    return coords_list, average_range_minus, average_range_plus
+
+
+def print_bbox_shift_range(frame_count, average_range_minus, average_range_plus, upperbondrange=0):
     print("********************************************bbox_shift parameter adjustment**********************************************************")
-    print(f"Total frame:「{len(frames)}」 Manually adjust range : [ -{int(sum(average_range_minus) / len(average_range_minus))}~{int(sum(average_range_plus) / len(average_range_plus))} ] , the current value: {upperbondrange}")
+    print(f"Total frame:「{frame_count}」 Manually adjust range : [ -{int(sum(average_range_minus) / len(average_range_minus))}~{int(sum(average_range_plus) / len(average_range_plus))} ] , the current value: {upperbondrange}")
     print("*************************************************************************************************************************************")
+
+
+def get_landmark_and_bbox(img_list,upperbondrange =0):
+    frames = read_imgs(img_list)
+    if upperbondrange != 0:
+        print('get key_landmark and face bounding boxes with the bbox_shift:',upperbondrange)
+    else:
+        print('get key_landmark and face bounding boxes with the default value')
+    coords_list, average_range_minus, average_range_plus = get_landmark_and_bbox_for_frames(tqdm(frames),
+                                                                                            upperbondrange)
+    print_bbox_shift_range(len(frames), average_range_minus, average_range_plus, upperbondrange)
     return coords_list,frames
     
 
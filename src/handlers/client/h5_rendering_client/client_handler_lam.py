@@ -1,7 +1,7 @@
 import asyncio
 import json
 import os.path
-from typing import Dict, Optional, cast
+from typing import Dict, List, Optional, cast
 
 import gradio
 from fastapi import FastAPI
@@ -21,7 +21,8 @@ from chat_engine.data_models.chat_data_type import ChatDataType
 from chat_engine.data_models.chat_engine_config_data import HandlerBaseConfigModel, ChatEngineConfigModel
 from chat_engine.data_models.chat_signal import ChatSignal
 from chat_engine.data_models.chat_signal_type import ChatSignalSourceType, ChatSignalType
-from chat_engine.data_models.runtime_data.motion_data import MotionDataSerializer
+from chat_engine.data_models.runtime_data.motion_data import MotionDataSerializer, MOTION_FORMAT_COMPACT, \
+    MOTION_FORMAT_JSON, ARKIT_ENCODINGS, AUDIO_ENCODINGS, create_entry_serializer
 from engine_utils.directory_info import DirectoryInfo
 from handlers.client.rtc_client.client_handler_rtc import RtcClientSessionDelegate, ClientHandlerRtc, \
     ClientRtcConfigModel, ClientRtcContext
@@ -32,15 +33,34 @@ class LamClientSessionDelegate(RtcClientSessionDelegate):
         super().__init__()
         self.output_queues[EngineChannelType.MOTION_DATA] = asyncio.Queue()
         self.quit = asyncio.Event()
+        self.allow_compact_motion_data = True
+        self.allowed_arkit_encodings: List[str] = list(ARKIT_ENCODINGS)
+        self.allowed_audio_encodings: List[str] = list(AUDIO_ENCODINGS)
 
     async def _ws_output_task(self, websocket: WebSocket):
         logger.warning(f"Send task started on {websocket}")
-        self.motion_data_serializer = MotionDataSerializer()
-        self.motion_data_serializer.register_audio_data("avatar_audio")
+        # clients ask for the compact format with ?motion_format=compact, the welcome message
+        # metadata tells them which format the data messages use
+        motion_format = websocket.query_params.get("motion_format", MOTION_FORMAT_JSON)
+        if motion_format != MOTION_FORMAT_COMPACT or not self.allow_compact_motion_data:
+            motion_format = MOTION_FORMAT_JSON
+        # ?arkit_encoding= and ?audio_encoding= pick smaller encodings, the record metadata of the
+        # welcome message names the encoding of every record, plain float32 and int16 have none
+        arkit_encoding = websocket.query_params.get("arkit_encoding", "float32")
+        if arkit_encoding not in self.allowed_arkit_encodings:
+            arkit_encoding = "float32"
+        audio_encoding = websocket.query_params.get("audio_encoding", "int16")
+        if audio_encoding not in self.allowed_audio_encodings:
+            audio_encoding = "int16"
+        logger.info(f"Motion data format {motion_format}, arkit encoding {arkit_encoding}, "
+                    f"audio encoding {audio_encoding} for {websocket}")
+        self.motion_data_serializer = MotionDataSerializer(motion_format)
+        self.motion_data_serializer.register_audio_data("avatar_audio", audio_encoding)
         self.motion_data_serializer.register_data(
             "arkit_face",
             "arkit_face",
-            "float32"
+            "float32",
+            create_entry_serializer(arkit_encoding),
         )
         welcome_message_sent = False
         while not self.quit.is_set():
@@ -96,6 +116,10 @@ class LamClientSessionDelegate(RtcClientSessionDelegate):
 
 class ClientLamConfigModel(ClientRtcConfigModel, BaseModel):
     asset_path: Optional[str] = Field(default=None)
+    allow_compact_motion_data: bool = Field(default=True)
+    # encodings clients may ask for, float32 and int16 are always available
+    allowed_arkit_encodings: List[str] = Field(default_factory=lambda: list(ARKIT_ENCODINGS))
+    allowed_audio_encodings: List[str] = Field(default_factory=lambda: list(AUDIO_ENCODINGS))
 
 
 class ClientLamContext(ClientRtcContext):
@@ -186,6 +210,12 @@ class ClientHandlerLam(ClientHandlerRtc):
     def on_setup_session_delegate(self, session_context: SessionContext, handler_context: HandlerContext,
                                   session_delegate: ClientSessionDelegate):
         super().on_setup_session_delegate(session_context, handler_context, session_delegate)
+        handler_context = cast(ClientLamContext, handler_context)
+        session_delegate = cast(LamClientSessionDelegate, session_delegate)
+        if handler_context.config is not None:
+            session_delegate.allow_compact_motion_data = handler_context.config.allow_compact_motion_data
+            session_delegate.allowed_arkit_encodings = handler_context.config.allowed_arkit_encodings
+            session_delegate.allowed_audio_encodings = handler_context.config.allowed_audio_encodings
 
     def get_handler_detail(self, session_context: SessionContext, context: HandlerContext) -> HandlerDetail:
         handler_detail = self.create_handler_detail(session_context, context)
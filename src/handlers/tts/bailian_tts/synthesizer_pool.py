@@ -0,0 +1,268 @@
+import threading
+import time
+from collections import deque
+from dataclasses import dataclass, field
+from typing import Any, Callable, Optional
+
+from loguru import logger
+
+from engine_utils.interval_counter import IntervalCounter
+
+
+class PooledCallback:
+    """
+    Forwards DashScope synthesizer callbacks to a target that is only known when the pooled
+    synthesizer is handed out, events before that (on_open while warming up) are dropped.
+    """
+
+    def __init__(self):
+        self.target = None
+
+    def _forward(self, name: str, *args):
+        target = self.target
+        if target is not None:
+            getattr(target, name)(*args)
+
+    def on_open(self) -> None:
+        self._forward("on_open")
+
+    def on_complete(self) -> None:
+        self._forward("on_complete")
+
+    def on_error(self, message) -> None:
+        self._forward("on_error", message)
+
+    def on_close(self) -> None:
+        self._forward("on_close")
+
+    def on_event(self, message) -> None:
+        self._forward("on_event", message)
+
+    def on_data(self, data: bytes) -> None:
+        self._forward("on_data", data)
+
+
+@dataclass
+class PooledSynthesizer:
+    synthesizer: Any
+    callback: PooledCallback
+    handshake_duration: float = 0
+    connected_time: float = field(default_factory=time.monotonic)
+
+
+@dataclass
+class SynthesizerPoolMetrics:
+    warm_hits: int = 0
+    cold_misses: int = 0
+    evictions: int = 0
+    connect_failures: int = 0
+    handshake_time_saved: float = 0
+
+
+class SynthesizerPool:
+    """
+    Keeps `pool_size` DashScope SpeechSynthesizer sessions connected ahead of time.
+
+    A synthesizer runs exactly one streaming task, so pooled sessions are single use: acquire
+    hands out a session whose websocket handshake and run-task are already done, and the pool
+    warms up a replacement in the background. Sessions that die or stay unused longer than
+    max_idle_time are closed and replaced. The pool only keeps sessions warm between
+    open_session and the matching close_session, and stops once no session is left.
+
+    Warming up drives private SpeechSynthesizer members of dashscope 1.23, the version the
+    handler pins. When they are missing the pool only hands out cold synthesizers.
+    """
+
+    def __init__(self, factory: Callable[[PooledCallback], Any], pool_size: int = 1,
+                 max_idle_time: float = 30.0, check_interval: float = 1.0, max_retry_delay: float = 60.0):
+        self._factory = factory
+        self._pool_size = pool_size
+        self._max_idle_time = max_idle_time
+        self._check_interval = check_interval
+        self._max_retry_delay = max_retry_delay
+        self._active_sessions = 0
+        self._warm_up_supported = True
+        self._idle: deque[PooledSynthesizer] = deque()
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._stop_event = threading.Event()
+        self._metrics = SynthesizerPoolMetrics()
+        self._counter = IntervalCounter("bailian_tts_pool", interval=60)
+        self._maintain_thread = None
+        # serializes start and stop of the maintain thread between sessions
+        self._thread_lock = threading.Lock()
+
+    def open_session(self):
+        """
+        Called when a chat session starts, the pool keeps sessions warm while any is open.
+        """
+        with self._lock:
+            self._active_sessions += 1
+        self.start()
+        self._wakeup.set()
+
+    def close_session(self):
+        with self._lock:
+            self._active_sessions = max(0, self._active_sessions - 1)
+            active_sessions = self._active_sessions
+        if active_sessions == 0:
+            self.stop()
+            with self._lock:
+                reopened = self._active_sessions > 0
+            # a session opened while stopping keeps the pool running
+            if reopened:
+                self.start()
+
+    def start(self):
+        with self._thread_lock:
+            if self._maintain_thread is not None:
+                return
+            self._stop_event.clear()
+            self._maintain_thread = threading.Thread(target=self._maintain_loop, daemon=True)
+            self._maintain_thread.start()
+
+    def stop(self):
+        with self._thread_lock:
+            self._stop_event.set()
+            self._wakeup.set()
+            if self._maintain_thread is not None:
+                self._maintain_thread.join()
+                self._maintain_thread = None
+        with self._lock:
+            entries = list(self._idle)
+            self._idle.clear()
+        for entry in entries:
+            self._close(entry)
+
+    @property
+    def idle_count(self) -> int:
+        with self._lock:
+            return len(self._idle)
+
+    def get_metrics(self) -> SynthesizerPoolMetrics:
+        with self._lock:
+            return SynthesizerPoolMetrics(**vars(self._metrics))
+
+    def acquire(self, callback) -> Any:
+        """
+        Return a synthesizer that reports to callback. A warm session is used when one is
+        healthy, otherwise a new synthesizer is created and connects on its first streaming_call.
+        """
+        entry = None
+        stale = []
+        with self._lock:
+            while self._idle:
+                candidate = self._idle.popleft()
+                if self._is_alive(candidate.synthesizer):
+                    entry = candidate
+                    break
+                stale.append(candidate)
+            if entry is not None:
+                self._metrics.warm_hits += 1
+                self._metrics.handshake_time_saved += entry.handshake_duration
+            else:
+                self._metrics.cold_misses += 1
+            self._metrics.evictions += len(stale)
+        for candidate in stale:
+            self._close(candidate)
+        self._wakeup.set()
+
+        if entry is None:
+            logger.info("no warm tts session available, connect on first call")
+            self._counter.add_property("cold_miss")
+            pooled_callback = PooledCallback()
+            pooled_callback.target = callback
+            return self._factory(pooled_callback)
+        self._counter.add_property("warm_hit")
+        self._counter.add_property("handshake_saved_ms", entry.handshake_duration * 1000)
+        logger.info("use warm tts session, saved handshake {:.1f}ms", entry.handshake_duration * 1000)
+        entry.callback.target = callback
+        return entry.synthesizer
+
+    def _maintain_loop(self):
+        failures = 0
+        while not self._stop_event.is_set():
+            self._evict()
+            with self._lock:
+                warm_up = self._active_sessions > 0 and self._warm_up_supported
+            if warm_up and not self._fill():
+                failures += 1
+                retry_delay = min(self._check_interval * 2 ** failures, self._max_retry_delay)
+                logger.info("retry warming up tts session in {:.1f}s", retry_delay)
+                # acquire does not cut the back off short, only stop does
+                self._stop_event.wait(retry_delay)
+                continue
+            failures = 0
+            self._wakeup.wait(self._check_interval)
+            self._wakeup.clear()
+
+    def _fill(self) -> bool:
+        """
+        return: False when a session failed to connect
+        """
+        while not self._stop_event.is_set() and self.idle_count < self._pool_size:
+            entry = self._connect()
+            if entry is None:
+                # an installed dashscope without warm up support is no failure to retry
+                return not self._warm_up_supported
+            with self._lock:
+                self._idle.append(entry)
+        return True
+
+    def _evict(self):
+        now = time.monotonic()
+        evicted = []
+        with self._lock:
+            kept = deque()
+            for entry in self._idle:
+                if now - entry.connected_time > self._max_idle_time or not self._is_alive(entry.synthesizer):
+                    evicted.append(entry)
+                else:
+                    kept.append(entry)
+            self._idle = kept
+            self._metrics.evictions += len(evicted)
+        for entry in evicted:
+            logger.info("evict idle tts session after {:.1f}s", now - entry.connected_time)
+            self._close(entry)
+
+    def _connect(self) -> Optional[PooledSynthesizer]:
+        callback = PooledCallback()
+        start_time = time.monotonic()
+        try:
+            synthesizer = self._factory(callback)
+            if not self._can_warm_up(synthesizer):
+                logger.warning("installed dashscope does not support warming up tts sessions, pool disabled")
+                with self._lock:
+                    self._warm_up_supported = False
+                return None
+            # run the handshake and run-task now instead of on the first streaming_call
+            synthesizer._is_first = False
+            synthesizer._SpeechSynthesizer__start_stream()
+        except Exception as e:
+            logger.warning("failed to warm up tts session: {}", e)
+            with self._lock:
+                self._metrics.connect_failures += 1
+            return None
+        handshake_duration = time.monotonic() - start_time
+        logger.debug("warmed up tts session in {:.1f}ms", handshake_duration * 1000)
+        return PooledSynthesizer(synthesizer=synthesizer, callback=callback,
+                                 handshake_duration=handshake_duration)
+
+    @staticmethod
+    def _can_warm_up(synthesizer) -> bool:
+        return all(hasattr(synthesizer, name) for name in
+                   ("_is_first", "_is_started", "_stopped", "_SpeechSynthesizer__start_stream"))
+
+    @staticmethod
+    def _is_alive(synthesizer) -> bool:
+        ws = getattr(synthesizer, "ws", None)
+        stopped = getattr(synthesizer, "_stopped", None)
+        return bool(getattr(synthesizer, "_is_started", False) and stopped is not None and not stopped.is_set()
+                    and ws is not None and ws.sock is not None and ws.sock.connected)
+
+    @staticmethod
+    def _close(entry: PooledSynthesizer):
+        try:
+            entry.synthesizer.streaming_cancel()
+        except Exception as e:
+            logger.debug("close tts session failed: {}", e)
@@ -16,6 +16,7 @@ from chat_engine.data_models.chat_data_type import ChatDataType
 from chat_engine.contexts.session_context import SessionContext
 from chat_engine.data_models.runtime_data.data_bundle import DataBundle, DataBundleDefinition, DataBundleEntry
 from engine_utils.directory_info import DirectoryInfo
+from handlers.tts.bailian_tts.synthesizer_pool import SynthesizerPool
 from dashscope.audio.tts_v2 import SpeechSynthesizer, ResultCallback, AudioFormat
 import dashscope
 
@@ -26,6 +27,9 @@ class TTSConfig(HandlerBaseConfigModel, BaseModel):
     sample_rate: int = Field(default=24000)
     api_key: str = Field(default=os.getenv("DASHSCOPE_API_KEY"))
     model_name: str = Field(default="cosyvoice-1")
+    # number of synthesizer sessions kept connected for upcoming speeches, 0 disables the pool
+    pool_size: int = Field(default=1)
+    pool_max_idle_time: float = Field(default=30.0)
 
 
 class TTSContext(HandlerContext):
@@ -50,6 +54,7 @@ class HandlerTTS(HandlerBase, ABC):
         self.sample_rate = None
         self.model_name = None
         self.api_key = None
+        self.synthesizer_pool = None
       
 
     def get_handler_info(self) -> HandlerBaseInfo:
@@ -87,7 +92,13 @@ class HandlerTTS(HandlerBase, ABC):
             dashscope.api_key = os.environ['DASHSCOPE_API_KEY']  # load API-key from environment variable DASHSCOPE_API_KEY
        else:
             dashscope.api_key = config.api_key  # set API-key manually
+       if config.pool_size > 0:
+            self.synthesizer_pool = SynthesizerPool(self._create_synthesizer, pool_size=config.pool_size,
+                                                    max_idle_time=config.pool_max_idle_time)
 
+    def _create_synthesizer(self, callback: ResultCallback) -> SpeechSynthesizer:
+        return SpeechSynthesizer(model=self.model_name, voice=self.voice, callback=callback,
+                                 format=AudioFormat.PCM_24000HZ_MONO_16BIT)
 
 
     def create_context(self, session_context, handler_config=None):
@@ -99,6 +110,8 @@ class HandlerTTS(HandlerBase, ABC):
             dump_file_path = os.path.join(DirectoryInfo.get_project_dir(), 'temp',
                                             f"dump_avatar_audio_{context.session_id}_{time.localtime().tm_hour}_{time.localtime().tm_min}.pcm")
             context.audio_dump_file = open(dump_file_path, "wb")
+        if self.synthesizer_pool is not None:
+            self.synthesizer_pool.open_session()
         return context
     
     def start_context(self, session_context, context: HandlerContext):
@@ -130,7 +143,10 @@ class HandlerTTS(HandlerBase, ABC):
         if not text_end:
             if context.synthesizer is None:
                 callback = CosyvoiceCallBack(context=context, output_definition=output_definition, speech_id=speech_id)
-                context.synthesizer = SpeechSynthesizer(model=self.model_name, voice=self.voice, callback=callback, format=AudioFormat.PCM_24000HZ_MONO_16BIT)
+                if self.synthesizer_pool is not None:
+                    context.synthesizer = self.synthesizer_pool.acquire(callback)
+                else:
+                    context.synthesizer = self._create_synthesizer(callback)
             logger.info(f'streaming_call {text}')
             context.synthesizer.streaming_call(text)
         else:
@@ -144,6 +160,8 @@ class HandlerTTS(HandlerBase, ABC):
     def destroy_context(self, context: HandlerContext):
         context = cast(TTSContext, context)
         logger.info('destroy context')
+        if self.synthesizer_pool is not None:
+            self.synthesizer_pool.close_session()
 
 
 class CosyvoiceCallBack(ResultCallback):
@@ -187,7 +205,7 @@ class CosyvoiceCallBack(ResultCallback):
             self.context.submit_data(output)
             self.temp_bytes = b''
         output = DataBundle(self.output_definition)
-        output.set_main_data(np.zeros(shape=(1, 24000), dtype=np.float32))
+        output.set_main_data(np.zeros(shape=(1, 0), dtype=np.float32))
         output.add_meta("avatar_speech_end", True)
         output.add_meta("speech_id", self.speech_id)
         self.context.submit_data(output)
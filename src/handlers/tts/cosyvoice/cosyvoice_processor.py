@@ -1,16 +1,21 @@
+from concurrent.futures import ThreadPoolExecutor
 from dataclasses import Field, dataclass, field
+import inspect
 import logging
+import queue
+import time
 from torch.multiprocessing import Process, Queue
 import torch.multiprocessing as mp
 
 import os
 import sys
 
-import librosa
 from loguru import logger
 import numpy as np
 import requests
+from requests.adapters import HTTPAdapter
 
+from engine_utils.audio_resampler import StreamingResampler
 from engine_utils.directory_info import DirectoryInfo
 
 
@@ -25,6 +30,10 @@ from engine_utils.directory_info import DirectoryInfo
 #     sample_rate: int = field(default=24000)
 spawn_context = mp.get_context('spawn')   
 
+# sample rate of the pcm stream returned by CosyVoice/runtime/python/fastapi/server.py
+SERVER_SAMPLE_RATE = 22050
+SERVER_CHUNK_SIZE = 16000
+
 class TTSCosyVoiceProcessor(spawn_context.Process):
     def __init__(self, handler_root: str, config: any, input_queue: Queue, output_queue: Queue):
         super().__init__()
@@ -42,6 +51,45 @@ class TTSCosyVoiceProcessor(spawn_context.Process):
         self.input_queue = input_queue
         self.output_queue = output_queue
         self.dump_audio = False
+        self.http_session = None
+        self.batch_size = max(1, config.batch_size)
+        self.zero_shot_prompt = None
+
+    @staticmethod
+    def create_http_session() -> requests.Session:
+        # keep the connection to the tts server alive across sentences
+        session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=4)
+        session.mount('http://', adapter)
+        session.mount('https://', adapter)
+        return session
+
+    def stream_from_server(self, input_text: str):
+        response = self.http_session.get(self.api_url, data={
+            'tts_text': input_text,
+            'spk_id': self.spk_id
+        }, stream=True)
+        with response:
+            if response.status_code != 200:
+                logger.info(f"Request failed with status code {response.status_code}")
+                return
+            # one resampler per response so the filter state follows the audio stream across chunks
+            resampler = StreamingResampler(SERVER_SAMPLE_RATE, self.sample_rate)
+            remainder = b''
+            for r in response.iter_content(chunk_size=SERVER_CHUNK_SIZE):
+                tts_audio = remainder + r
+                # chunks are not guaranteed to be aligned to int16 samples
+                aligned_size = len(tts_audio) - len(tts_audio) % 2
+                remainder = tts_audio[aligned_size:]
+                tts_speech = np.frombuffer(tts_audio[:aligned_size], dtype=np.int16).astype(np.float32) / 32767
+                logger.debug(f'audio response {tts_speech.shape}')
+                output_audio = resampler.process(tts_speech)
+                logger.debug(f'audio response resample {output_audio.shape}')
+                if output_audio.shape[0] > 0:
+                    yield output_audio[np.newaxis, ...]
+            output_audio = resampler.flush()
+            if output_audio.shape[0] > 0:
+                yield output_audio[np.newaxis, ...]
 
     def run(self):
         logger.remove()
@@ -68,27 +116,30 @@ class TTSCosyVoiceProcessor(spawn_context.Process):
             if self.ref_audio_path:
                 self.ref_audio_buffer = load_wav(self.ref_audio_path, self.sample_rate)
                 self.ref_audio_text = self.ref_audio_text
-            init_text = '欢迎来到中国2025'
-            response = None
-            if self.ref_audio_buffer is not None:
-                response = self.model.inference_zero_shot(
-                    init_text, self.ref_audio_text, self.ref_audio_buffer, True)
-            elif self.spk_id:
-                response = self.model.inference_sft(init_text, self.spk_id)
-            else:
+                self.prepare_prompt_cache()
+            if self.ref_audio_buffer is None and not self.spk_id:
                 logger.error('cosyvoice need a ref_audio or spk_id')
                 return
-            if response is not None:
-                for tts_speech in response:
-                    self.output_queue.put({
-                        'key': '',
-                        'tts_speech': tts_speech,
-                        'session_id': ''
-                    })
-                    logger.debug('tts test')
+            init_text = '欢迎来到中国2025'
+            for tts_speech in self.synthesize(init_text):
+                self.output_queue.put({
+                    'key': '',
+                    'tts_speech': tts_speech,
+                    'session_id': ''
+                })
+                logger.debug('tts test')
         elif self.api_key is not None:
             raise TypeError('api_key not support yet')
+        if self.model is None and self.api_url is not None:
+            self.http_session = self.create_http_session()
         logger.info('tts processor started')
+        executor = None
+        if self.batch_size > 1:
+            if self.model is not None and not self.supports_concurrent_inference():
+                logger.warning('cosyvoice model does not support concurrent inference, fall back to batch_size 1')
+                self.batch_size = 1
+            else:
+                executor = ThreadPoolExecutor(max_workers=self.batch_size, thread_name_prefix='cosyvoice_batch')
         while True:
             try:
                 logger.debug('wait for tts task in')
@@ -96,75 +147,128 @@ class TTSCosyVoiceProcessor(spawn_context.Process):
                 logger.debug(f'get tts task in {input}')
             except Exception:
                 continue
-            input_text = input['text']
-            key = input['key']
-            session_id = input['session_id']
-            if (len(input_text) < 1):
-                # ignore
-                logger.info('ignore empty input_text')
-            elif self.model is None and self.api_url is not None:
-                # if you start cosyvoice tts server through CosyVoice/runtime/python/fastapi/server.py
-                response = requests.get(self.api_url, data={
-                    'tts_text': input_text,
-                    'spk_id': self.spk_id
-                }, stream=True)
-                if response.status_code != 200:
-                    logger.info(f"Request failed with status code {response.status_code}")
-                    continue
-                tts_audio = b''
-                for r in response.iter_content(chunk_size=16000):
-                    tts_audio = r
-                    tts_speech = np.array(np.frombuffer(tts_audio, dtype=np.int16)).astype(np.float32)/32767
-                    logger.debug(f'audio response {tts_speech.shape}')
-
-                    output_audio = librosa.resample(tts_speech, orig_sr=22050, target_sr=self.sample_rate)
-                    logger.debug(f'audio response resample {output_audio.shape}')
-                    out_audio = output_audio[np.newaxis, ...]
-                    output = {
-                        'key': key,
-                        'tts_speech': out_audio,
-                        'session_id': session_id
-                    }
-                    self.output_queue.put(output)
-            # if self.api_key is not None:
-            #     self.model.streaming_call(input_text)
+            batch = [input]
+            # collect sentences already queued by other sessions and synthesize them together
+            while len(batch) < self.batch_size:
+                try:
+                    batch.append(self.input_queue.get_nowait())
+                except queue.Empty:
+                    break
+            if len(batch) == 1:
+                self.process_task(input)
+            else:
+                logger.info(f'tts batch of {len(batch)} sentences')
+                for future in [executor.submit(self.process_task, task) for task in batch]:
+                    future.result()
+
+    def supports_concurrent_inference(self) -> bool:
+        # the cosyvoice model keys every llm/flow stream by its own uuid, so calls may overlap
+        return hasattr(self.model, 'model') and hasattr(self.model.model, 'tts')
 
-            #     for tts_audio in self.callback_instance.get_data_generator():
-            #         tts_speech = np.array(np.frombuffer(tts_audio, dtype=np.int16)).astype(np.float32)/32767
-            #         logger.info('audio response', tts_speech.shape)
+    def prepare_prompt_cache(self):
+        """
+        Compute the reference audio prompt (speaker embedding and prompt speech tokens) once,
+        per sentence only the text tokens are extracted afterwards. This reaches into the
+        cosyvoice frontend and model, when their signatures do not match the prompt cache is
+        disabled and sentences go through inference_zero_shot.
+        """
+        frontend = getattr(self.model, 'frontend', None)
+        tts = getattr(getattr(self.model, 'model', None), 'tts', None)
+        if frontend is None or not hasattr(frontend, 'frontend_zero_shot') \
+                or not hasattr(frontend, '_extract_text_token') or tts is None:
+            logger.warning('cosyvoice frontend does not expose prompt features, prompt cache disabled')
+            return
+        try:
+            if 'stream' not in inspect.signature(tts).parameters:
+                raise TypeError('model.tts does not take stream')
+            kwargs = {}
+            # added in later cosyvoice versions, an empty id extracts the prompt from the audio
+            if 'zero_shot_spk_id' in inspect.signature(frontend.frontend_zero_shot).parameters:
+                kwargs['zero_shot_spk_id'] = ''
+            prompt_text = frontend.text_normalize(self.ref_audio_text, split=False)
+            self.zero_shot_prompt = frontend.frontend_zero_shot(
+                '', prompt_text, self.ref_audio_buffer, self.model.sample_rate, **kwargs)
+        except Exception as e:
+            logger.warning(f'cosyvoice prompt cache disabled, frontend does not match: {e}')
+            self.zero_shot_prompt = None
+            return
+        logger.info('cosyvoice zero shot prompt cached')
 
-            #         output_audio = librosa.resample(tts_speech, orig_sr=self.sample_rate, target_sr=24000)
-            #         out_audio = output_audio[np.newaxis, ...]
-            #         yield out_audio
+    def synthesize(self, input_text: str):
+        if self.ref_audio_buffer is not None:
+            if self.zero_shot_prompt is None:
+                response = self.inference_zero_shot(input_text)
             else:
-                response = None
-                if self.model:
-                    if self.ref_audio_buffer is not None:
-                        response = self.model.inference_zero_shot(
-                            input_text, self.ref_audio_text, self.ref_audio_buffer, True)
-                    elif self.spk_id:
-                        response = self.model.inference_sft(input_text, self.spk_id, True)
-                    else:
-                        logger.error('cosyvoice need a ref_audio or spk_id')
-                        return
-
-                for tts_speech in response:
-                    tts_audio = tts_speech['tts_speech'].numpy()
-                    logger.debug(f'tts sample rate {self.model.sample_rate}')
-                    tts_audio = tts_audio  # librosa.resample(tts_audio, orig_sr=self.model.sample_rate, target_sr=24000)
-                    # tts_audio = torchaudio.transforms.Resample(orig_freq=22050, new_freq=24000)(tts_audio)
-                    if self.dump_audio:
-                        dump_audio = tts_audio
-                        self.audio_dump_file.write(dump_audio.tobytes())
+                response = self.inference_zero_shot_cached(input_text)
+        elif self.spk_id:
+            response = self.model.inference_sft(input_text, self.spk_id, True)
+        else:
+            logger.error('cosyvoice need a ref_audio or spk_id')
+            return
+        for tts_speech in response:
+            yield tts_speech['tts_speech'].numpy()
+
+    def inference_zero_shot(self, input_text: str):
+        return self.model.inference_zero_shot(input_text, self.ref_audio_text, self.ref_audio_buffer, True)
+
+    def inference_zero_shot_cached(self, input_text: str):
+        frontend = self.model.frontend
+        for text in frontend.text_normalize(input_text, split=True):
+            if self.zero_shot_prompt is None:
+                yield from self.inference_zero_shot(text)
+                continue
+            produced = False
+            try:
+                text_token, text_token_len = frontend._extract_text_token(text)
+                model_input = dict(self.zero_shot_prompt)
+                model_input['text'] = text_token
+                model_input['text_len'] = text_token_len
+                for model_output in self.model.model.tts(**model_input, stream=True):
+                    produced = True
+                    yield model_output
+            except (TypeError, AttributeError, KeyError, ValueError) as e:
+                if produced:
+                    raise
+                logger.warning(f'cosyvoice prompt cache disabled, model does not match: {e}')
+                self.zero_shot_prompt = None
+                yield from self.inference_zero_shot(text)
+
+    def process_task(self, input: dict):
+        input_text = input['text']
+        key = input['key']
+        session_id = input['session_id']
+        if (len(input_text) < 1):
+            # ignore
+            logger.info('ignore empty input_text')
+        elif self.model is None and self.api_url is not None:
+            # if you start cosyvoice tts server through CosyVoice/runtime/python/fastapi/server.py
+            try:
+                for out_audio in self.stream_from_server(input_text):
                     output = {
                         'key': key,
-                        'tts_speech': tts_audio,
+                        'tts_speech': out_audio,
                         'session_id': session_id
                     }
                     self.output_queue.put(output)
-            output = {
-                'key': key,
-                'tts_speech': None,
-                'session_id': session_id
-            }
-            self.output_queue.put(output)
+            except requests.RequestException as e:
+                logger.error(f'tts server request failed: {e}')
+        elif self.model is not None:
+            start_time = time.monotonic()
+            for tts_audio in self.synthesize(input_text):
+                logger.debug(f'tts sample rate {self.model.sample_rate}')
+                if self.dump_audio:
+                    dump_audio = tts_audio
+                    self.audio_dump_file.write(dump_audio.tobytes())
+                output = {
+                    'key': key,
+                    'tts_speech': tts_audio,
+                    'session_id': session_id
+                }
+                self.output_queue.put(output)
+            logger.debug(f'tts sentence done in {time.monotonic() - start_time:.3f}s')
+        output = {
+            'key': key,
+            'tts_speech': None,
+            'session_id': session_id
+        }
+        self.output_queue.put(output)
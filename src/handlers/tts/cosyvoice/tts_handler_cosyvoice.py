@@ -34,6 +34,8 @@ class TTSConfig(HandlerBaseConfigModel, BaseModel):
     spk_id: str = Field(default=None)
     sample_rate: int = Field(default=24000)
     process_num: int = Field(default=1)
+    # sentences queued by different sessions are synthesized concurrently, up to batch_size at a time
+    batch_size: int = Field(default=1)
 
 
 @dataclass
@@ -251,7 +253,7 @@ class HandlerTTS(HandlerBase, ABC):
                 context.task_queue.append(task)
             context.input_text = ''
             end_task = HandlerTask(speech_id=speech_id, speech_end=True)
-            end_task.result_queue.put(np.zeros(shape=(1, self.sample_rate), dtype=np.float32))
+            end_task.result_queue.put(np.zeros(shape=(1, 0), dtype=np.float32))
             end_task.result_queue.put(None)
             logger.info(f"speech end {end_task}")
             context.task_queue.append(end_task)
@@ -16,6 +16,7 @@ from chat_engine.data_models.chat_data.chat_data_model import ChatData
 from chat_engine.data_models.chat_data_type import ChatDataType
 from chat_engine.contexts.session_context import SessionContext
 from chat_engine.data_models.runtime_data.data_bundle import DataBundle, DataBundleDefinition, DataBundleEntry
+from engine_utils.audio_resampler import resample
 from engine_utils.directory_info import DirectoryInfo
 
 class TTSConfig(HandlerBaseConfigModel, BaseModel):
@@ -136,7 +137,8 @@ class HandlerTTS(HandlerBase, ABC):
                             # tts_audio = chunk['data']
                             data += chunk['data']
                     
-                    output_audio = librosa.load(io.BytesIO(data), sr=None)[0]
+                    output_audio, original_sr = librosa.load(io.BytesIO(data), sr=None)
+                    output_audio = resample(output_audio, original_sr, self.sample_rate)
                     output_audio = output_audio[np.newaxis, ...]
                     output = DataBundle(output_definition)
                     output.set_main_data(output_audio)
@@ -153,7 +155,8 @@ class HandlerTTS(HandlerBase, ABC):
                         if chunk['type'] == 'audio':
                             # tts_audio = chunk['data']
                             data += chunk['data']
-                    output_audio = librosa.load(io.BytesIO(data), sr=None)[0]
+                    output_audio, original_sr = librosa.load(io.BytesIO(data), sr=None)
+                    output_audio = resample(output_audio, original_sr, self.sample_rate)
                     output_audio = output_audio[np.newaxis, ...]
                     output = DataBundle(output_definition)
                     output.set_main_data(output_audio)
@@ -162,7 +165,7 @@ class HandlerTTS(HandlerBase, ABC):
                     context.submit_data(output)
             context.input_text = ''
             output = DataBundle(output_definition)
-            output.set_main_data(np.zeros(shape=(1, self.sample_rate), dtype=np.float32))
+            output.set_main_data(np.zeros(shape=(1, 0), dtype=np.float32))
             output.add_meta("avatar_speech_end", True)
             output.add_meta("speech_id", speech_id)
             context.submit_data(output)
@@ -0,0 +1,117 @@
+import functools
+import threading
+import time
+from typing import List, Optional, Tuple
+
+import numpy as np
+from loguru import logger
+
+from engine_utils.audio_resampler import resample
+
+
+class PiperInProcessEngine:
+    """
+    Piper voice loaded once inside the handler process and shared by all sessions.
+
+    Phonemization results are cached per sentence text, and sentences passed to
+    `synthesize_batch` together run through the ONNX model in a single padded batch.
+    espeak-ng and the phoneme cache are not thread safe, so phonemization and the model
+    run of one batch hold a lock while other sessions wait. Relies on the piper-tts 1.2
+    internals the handler pins: piper.const.PAD, voice.phonemize and voice.session.
+    """
+
+    def __init__(self, model_path: str, config_path: str, output_sample_rate: int,
+                 speaker_id: Optional[int] = None, length_scale: float = 1.0,
+                 noise_scale: float = 0.667, noise_w: float = 0.8,
+                 phoneme_cache_size: int = 1024, use_cuda: bool = False):
+        from piper import PiperVoice
+        from piper.const import PAD
+
+        self.voice = PiperVoice.load(model_path, config_path=config_path, use_cuda=use_cuda)
+        self.model_sample_rate = self.voice.config.sample_rate
+        self.output_sample_rate = output_sample_rate
+        self.speaker_id = speaker_id
+        if self.voice.config.num_speakers > 1 and speaker_id is None:
+            self.speaker_id = 0
+        self.scales = np.array([noise_scale, length_scale, noise_w], dtype=np.float32)
+        self.pad_id = self.voice.config.phoneme_id_map[PAD][0]
+        self._phoneme_ids = functools.lru_cache(maxsize=phoneme_cache_size)(self._phonemize)
+        self._lock = threading.Lock()
+        logger.info("Loaded in-process Piper voice {}, sample rate {}", model_path, self.model_sample_rate)
+
+    def _phonemize(self, text: str) -> Tuple[Tuple[int, ...], ...]:
+        # espeak splits the text into sentences, each one is synthesized as a separate row
+        return tuple(tuple(self.voice.phonemes_to_ids(phonemes)) for phonemes in self.voice.phonemize(text))
+
+    def get_phoneme_cache_info(self):
+        with self._lock:
+            return self._phoneme_ids.cache_info()
+
+    def synthesize(self, text: str) -> np.ndarray:
+        return self.synthesize_batch([text])[0]
+
+    def synthesize_batch(self, texts: List[str]) -> List[np.ndarray]:
+        """
+        Synthesize several texts with one ONNX run, returns float audio at output_sample_rate
+        normalized to a 0.7 peak, one array per text.
+        """
+        start_time = time.perf_counter()
+        rows = []
+        owners = []
+        with self._lock:
+            lock_time = time.perf_counter() - start_time
+            for index, text in enumerate(texts):
+                for ids in self._phoneme_ids(text.strip()):
+                    rows.append(ids)
+                    owners.append(index)
+            phonemize_time = time.perf_counter() - start_time - lock_time
+
+            audio_rows = self._run_batch(rows) if rows else []
+            model_time = time.perf_counter() - start_time - lock_time - phonemize_time
+            cache_info = self._phoneme_ids.cache_info()
+
+        outputs = []
+        for index, text in enumerate(texts):
+            parts = [audio for audio, owner in zip(audio_rows, owners) if owner == index]
+            audio = np.concatenate(parts) if parts else np.zeros(0, dtype=np.float32)
+            audio = resample(audio, self.model_sample_rate, self.output_sample_rate)
+            max_val = np.max(np.abs(audio)) if audio.shape[0] > 0 else 0
+            if max_val > 0:
+                np.multiply(audio, 0.7 / max_val, out=audio)
+            outputs.append(audio)
+
+        total_time = time.perf_counter() - start_time
+        total_duration = sum(audio.shape[0] for audio in outputs) / self.output_sample_rate
+        for text, audio in zip(texts, outputs):
+            duration = audio.shape[0] / self.output_sample_rate
+            # the batch cost is shared by its sentences in proportion to their audio length
+            cost = total_time * duration / total_duration if total_duration > 0 else total_time
+            logger.info("Piper rtf {:.3f} ({:.3f}s for {:.2f}s audio, batch {}) for: {}",
+                        cost / duration if duration > 0 else 0, cost, duration, len(texts), text[:50])
+        logger.debug("Piper batch of {} rows, lock wait {:.3f}s, phonemize {:.3f}s, model {:.3f}s, cache {}",
+                     len(rows), lock_time, phonemize_time, model_time, cache_info)
+        return outputs
+
+    def _run_batch(self, rows: List[Tuple[int, ...]]) -> List[np.ndarray]:
+        lengths = np.array([len(ids) for ids in rows], dtype=np.int64)
+        phoneme_ids = np.full((len(rows), lengths.max()), self.pad_id, dtype=np.int64)
+        for i, ids in enumerate(rows):
+            phoneme_ids[i, :len(ids)] = ids
+        inputs = {
+            "input": phoneme_ids,
+            "input_lengths": lengths,
+            "scales": self.scales,
+        }
+        if self.speaker_id is not None:
+            inputs["sid"] = np.full(len(rows), self.speaker_id, dtype=np.int64)
+        audio = self.voice.session.run(None, inputs)[0].reshape(len(rows), -1)
+        # trim single rows as well, so a sentence sounds the same batched or alone
+        return [self._trim_padding(row) for row in audio]
+
+    @staticmethod
+    def _trim_padding(audio: np.ndarray, threshold: float = 1e-3) -> np.ndarray:
+        # rows shorter than the longest one in the batch are padded with near silence by the decoder
+        voiced = np.flatnonzero(np.abs(audio) > threshold * max(np.max(np.abs(audio)), 1e-6))
+        if voiced.shape[0] == 0:
+            return audio[:0]
+        return audio[:voiced[-1] + 1]
@@ -4,7 +4,7 @@ import re
 import time
 import subprocess
 import tempfile
-from typing import Dict, Optional, cast
+from typing import Dict, List, Optional, cast
 import librosa
 import numpy as np
 from loguru import logger
@@ -17,6 +17,7 @@ from chat_engine.data_models.chat_data.chat_data_model import ChatData
 from chat_engine.data_models.chat_data_type import ChatDataType
 from chat_engine.contexts.session_context import SessionContext
 from chat_engine.data_models.runtime_data.data_bundle import DataBundle, DataBundleDefinition, DataBundleEntry
+from engine_utils.audio_resampler import resample
 from engine_utils.directory_info import DirectoryInfo
 
 
@@ -28,6 +29,9 @@ class PiperTTSConfig(HandlerBaseConfigModel, BaseModel):
     length_scale: float = Field(default=1.0)  # Speed control (1.0 = normal, < 1.0 = faster, > 1.0 = slower)
     noise_scale: float = Field(default=0.667)  # Voice variation
     noise_w: float = Field(default=0.8)  # Phoneme variation
+    in_process: bool = Field(default=True)  # Load the voice once with piper-tts instead of running the piper executable
+    phoneme_cache_size: int = Field(default=1024)
+    max_batch_sentences: int = Field(default=4)  # Pending sentences synthesized in one ONNX run
 
 
 class PiperTTSContext(HandlerContext):
@@ -52,6 +56,8 @@ class HandlerPiperTTS(HandlerBase, ABC):
         self.noise_scale = None
         self.noise_w = None
         self.piper_executable = None
+        self.engine = None
+        self.max_batch_sentences = 1
         self._find_piper_executable()
 
     def _find_piper_executable(self):
@@ -141,6 +147,22 @@ class HandlerPiperTTS(HandlerBase, ABC):
             logger.error(f"Piper config file not found: {self.config_path}")
             raise FileNotFoundError(f"Piper config file not found: {self.config_path}")
         
+        self.max_batch_sentences = max(1, config.max_batch_sentences)
+        if config.in_process:
+            try:
+                from handlers.tts.pipertts.piper_engine import PiperInProcessEngine
+                self.engine = PiperInProcessEngine(
+                    self.model_path, self.config_path, output_sample_rate=24000,
+                    speaker_id=self.speaker_id, length_scale=self.length_scale,
+                    noise_scale=self.noise_scale, noise_w=self.noise_w,
+                    phoneme_cache_size=config.phoneme_cache_size)
+                # Warm up onnxruntime and espeak
+                self.engine.synthesize("Test")
+            except Exception as e:
+                logger.opt(exception=True).warning(
+                    f"in-process piper voice failed to load, falling back to subprocess mode: {e}")
+                self.engine = None
+
         logger.info(f"Loaded PiperTTS with model: {self.model_path}")
 
     def create_context(self, session_context, handler_config=None):
@@ -156,6 +178,9 @@ class HandlerPiperTTS(HandlerBase, ABC):
     
     def start_context(self, session_context, context: HandlerContext):
         context = cast(PiperTTSContext, context)
+        if self.engine is not None:
+            # The in-process voice is shared by all sessions and already warmed up in load()
+            return
         # Start persistent Piper process for faster synthesis
         try:
             self._start_piper_process(context)
@@ -236,14 +261,16 @@ class HandlerPiperTTS(HandlerBase, ABC):
                 return np.zeros(shape=(24000,), dtype=np.float32)
             
             # Ultra-fast audio loading
-            output_audio, _ = librosa.load(temp_path, sr=24000, mono=True)
+            output_audio, original_sr = librosa.load(temp_path, sr=None, mono=True)
+            output_audio = resample(output_audio, original_sr, 24000)
             
-            # Minimal normalization
+            # Minimal normalization, in place
+            output_audio = output_audio.astype(np.float32, copy=False)
             max_val = np.max(np.abs(output_audio))
             if max_val > 0:
-                output_audio = output_audio * (0.7 / max_val)
+                output_audio *= 0.7 / max_val
             
-            return output_audio.astype(np.float32)
+            return output_audio
             
         except subprocess.TimeoutExpired:
             logger.error(f"Synthesis timeout (1.5s) for: {text[:30]}...")
@@ -285,16 +312,18 @@ class HandlerPiperTTS(HandlerBase, ABC):
                     timeout=3  # Shorter timeout for responsiveness
                 )
                 
-                # Load audio directly with target sample rate for speed
-                output_audio, original_sr = librosa.load(temp_path, sr=24000, mono=True)  # Load directly at 24kHz
+                # Load at the native rate and resample with the cached filter
+                output_audio, original_sr = librosa.load(temp_path, sr=None, mono=True)
+                output_audio = resample(output_audio, original_sr, 24000)
                 
-                # Quick normalization
+                # Quick normalization, in place
+                output_audio = output_audio.astype(np.float32, copy=False)
                 max_amplitude = np.max(np.abs(output_audio))
                 if max_amplitude > 0:
-                    output_audio = output_audio * (0.7 / max_amplitude)
+                    output_audio *= 0.7 / max_amplitude
                 
                 # Return as 1D array
-                return output_audio.astype(np.float32)
+                return output_audio
                 
             finally:
                 # Clean up temporary file quickly
@@ -313,6 +342,23 @@ class HandlerPiperTTS(HandlerBase, ABC):
             logger.error(f"Error in Piper synthesis: {e}")
             return np.zeros(shape=(24000,), dtype=np.float32)  # 1 second of silence at 24kHz
 
+    def _synthesize_sentences(self, context: PiperTTSContext, sentences: List[str]) -> List[np.ndarray]:
+        """Synthesize sentences in order, batched through the in-process voice when available"""
+        outputs = []
+        if self.engine is not None:
+            for i in range(0, len(sentences), self.max_batch_sentences):
+                outputs.extend(self.engine.synthesize_batch(sentences[i:i + self.max_batch_sentences]))
+            return outputs
+        for sentence in sentences:
+            logger.info('current sentence' + sentence)
+            # Add timing to track synthesis speed
+            start_time = time.time()
+            output_audio = self._synthesize_text_fast(context, sentence)
+            synthesis_time = time.time() - start_time
+            logger.info(f"Synthesis took {synthesis_time:.2f}s for sentence: {sentence[:50]}...")
+            outputs.append(output_audio)
+        return outputs
+
     def handle(self, context: HandlerContext, inputs: ChatData,
                output_definitions: Dict[ChatDataType, HandlerDataInfo]):
         output_definition = output_definitions.get(ChatDataType.AVATAR_AUDIO).definition
@@ -339,17 +385,8 @@ class HandlerPiperTTS(HandlerBase, ABC):
                 context.input_text = sentences[-1]  # Remaining incomplete part
 
                 # Process complete sentences
-                for sentence in complete_sentences:
-                    if len(sentence.strip()) < 1:
-                        continue
-                    logger.info('current sentence' + sentence)
-                    
-                    # Add timing to track synthesis speed
-                    start_time = time.time()
-                    output_audio = self._synthesize_text_fast(context, sentence)
-                    synthesis_time = time.time() - start_time
-                    logger.info(f"Synthesis took {synthesis_time:.2f}s for sentence: {sentence[:50]}...")
-                    
+                complete_sentences = [sentence for sentence in complete_sentences if len(sentence.strip()) > 0]
+                for output_audio in self._synthesize_sentences(context, complete_sentences):
                     output_audio = output_audio[np.newaxis, ...]
                     output = DataBundle(output_definition)
                     output.set_main_data(output_audio)
@@ -359,11 +396,7 @@ class HandlerPiperTTS(HandlerBase, ABC):
         else:
             logger.info('last sentence' + context.input_text)
             if context.input_text is not None and len(context.input_text.strip()) > 0:
-                start_time = time.time()
-                output_audio = self._synthesize_text_fast(context, context.input_text)
-                synthesis_time = time.time() - start_time
-                logger.info(f"Final synthesis took {synthesis_time:.2f}s for: {context.input_text[:50]}...")
-                
+                output_audio = self._synthesize_sentences(context, [context.input_text])[0]
                 output_audio = output_audio[np.newaxis, ...]
                 output = DataBundle(output_definition)
                 output.set_main_data(output_audio)
@@ -373,7 +406,7 @@ class HandlerPiperTTS(HandlerBase, ABC):
                 
             context.input_text = ''
             output = DataBundle(output_definition)
-            output.set_main_data(np.zeros(shape=(1, 24000), dtype=np.float32))  # 1 second of silence at 24kHz
+            output.set_main_data(np.zeros(shape=(1, 0), dtype=np.float32))  # Zero length end of speech marker
             output.add_meta("avatar_speech_end", True)
             output.add_meta("speech_id", speech_id)
             context.submit_data(output)
@@ -106,7 +106,7 @@ class RtcStream(AsyncAudioVideoStreamHandler):
                 if chat_data is None or chat_data.data is None:
                     continue
                 audio_array = chat_data.data.get_main_data()
-                if audio_array is None:
+                if audio_array is None or audio_array.shape[-1] == 0:
                     continue
                 sample_num = audio_array.shape[-1]
                 self.emit_counter.add_property("emit_audio", sample_num / self.output_sample_rate)
@@ -19,9 +19,8 @@ class SampleOutputHandler(AvatarOutputHandler):
         self._init_option: AvatarInitOption = None
 
     def on_audio(self, audio_result: AudioResult):
-        logger.info("receive audio result {:.3f}",
-                    audio_result.audio_frame.pts * audio_result.audio_frame.time_base)
-        audio_frame = audio_result.audio_frame
+        audio_frame = audio_result.to_av_frame()
+        logger.info("receive audio result {:.3f}", audio_frame.pts * audio_frame.time_base)
         if self.audio_stream is None:
             self.audio_stream = self.output_container.add_stream(
                 'aac', rate=self._init_option.audio_sample_rate)
@@ -39,10 +38,9 @@ class SampleOutputHandler(AvatarOutputHandler):
             logger.warning(e)
 
     def on_video(self, video_result: VideoResult):
+        video_frame = video_result.to_av_frame()
         logger.info("receive image result {:.3f} with status {}",
-                    video_result.video_frame.pts * video_result.video_frame.time_base,
-                    video_result.avatar_status)
-        video_frame = video_result.video_frame
+                    video_frame.pts * video_frame.time_base, video_result.avatar_status)
         if self.video_stream is None:
             self.video_stream = self.output_container.add_stream(
                 'h264', rate=self._init_option.video_frame_rate)
@@ -0,0 +1,74 @@
+"""
+Compare engine_utils.audio_resampler against per chunk librosa.resample.
+
+    PYTHONPATH=src python tests/inttest/benchmark/bench_audio_resampler.py
+"""
+import time
+
+import librosa
+import numpy as np
+
+from engine_utils.audio_resampler import RESAMPLER_BACKEND_NUMPY, RESAMPLER_BACKEND_SOXR, StreamingResampler, \
+    resample, soxr
+
+
+def _test_signal(sample_rate: int, duration: float):
+    t = np.arange(int(sample_rate * duration)) / sample_rate
+    # sweep over the speech band from 100hz to 4khz
+    return (0.5 * np.sin(2 * np.pi * (100 + 1950 * t / duration) * t)).astype(np.float32)
+
+
+def _snr_db(output: np.ndarray, reference: np.ndarray, margin: int = 256):
+    length = min(len(output), len(reference))
+    signal = reference[margin:length - margin]
+    noise = output[margin:length - margin] - signal
+    return 10 * np.log10(np.sum(signal ** 2) / max(np.sum(noise ** 2), 1e-20))
+
+
+def bench_streaming(orig_sr: int, target_sr: int, chunk_size: int, duration: float = 10.0):
+    audio = _test_signal(orig_sr, duration)
+    reference = librosa.resample(audio, orig_sr=orig_sr, target_sr=target_sr)
+    chunks = [audio[i:i + chunk_size] for i in range(0, len(audio), chunk_size)]
+
+    start = time.perf_counter()
+    librosa_output = np.concatenate([librosa.resample(c, orig_sr=orig_sr, target_sr=target_sr) for c in chunks])
+    results = [("librosa per chunk", time.perf_counter() - start, librosa_output)]
+
+    backends = [RESAMPLER_BACKEND_NUMPY] + ([RESAMPLER_BACKEND_SOXR] if soxr is not None else [])
+    for backend in backends:
+        resampler = StreamingResampler(orig_sr, target_sr, backend=backend)
+        start = time.perf_counter()
+        outputs = [resampler.process(c) for c in chunks]
+        outputs.append(resampler.flush())
+        results.append((f"streaming {backend}", time.perf_counter() - start, np.concatenate(outputs)))
+
+    print(f"{orig_sr} -> {target_sr}, {duration:.0f}s audio in {chunk_size} sample chunks")
+    for name, cost, output in results:
+        print(f"  {name:<20} {cost * 1000:8.2f} ms  rtf {cost / duration:.5f}  "
+              f"snr vs whole signal {_snr_db(output, reference):6.1f} dB")
+
+
+def bench_slices(orig_sr: int, target_sr: int, slice_duration: float = 1.0, count: int = 50):
+    audio = _test_signal(orig_sr, slice_duration)
+    start = time.perf_counter()
+    for _ in range(count):
+        librosa.resample(audio, orig_sr=orig_sr, target_sr=target_sr)
+    librosa_cost = (time.perf_counter() - start) / count
+    print(f"{orig_sr} -> {target_sr}, one shot {slice_duration:.1f}s slices")
+    print(f"  {'librosa':<20} {librosa_cost * 1000:8.3f} ms per slice")
+    backends = [RESAMPLER_BACKEND_NUMPY] + ([RESAMPLER_BACKEND_SOXR] if soxr is not None else [])
+    for backend in backends:
+        start = time.perf_counter()
+        for _ in range(count):
+            resample(audio, orig_sr, target_sr, backend=backend)
+        cost = (time.perf_counter() - start) / count
+        print(f"  {backend:<20} {cost * 1000:8.3f} ms per slice")
+
+
+if __name__ == '__main__':
+    # cosyvoice server stream
+    bench_streaming(22050, 24000, chunk_size=8000)
+    # liteavatar and musetalk algo input
+    bench_streaming(24000, 16000, chunk_size=4800)
+    bench_slices(24000, 16000)
+    bench_slices(22050, 24000)
@@ -0,0 +1,82 @@
+"""
+Measure local CosyVoice throughput in sentences per second for different batch sizes.
+
+    PYTHONPATH=src python tests/inttest/benchmark/bench_cosyvoice_batch.py \
+        --model_name iic/CosyVoice-300M-SFT --spk_id 中文女 --batch_sizes 1 2 4
+"""
+import argparse
+import os
+import time
+import types
+import uuid
+
+import torch.multiprocessing as mp
+
+from engine_utils.directory_info import DirectoryInfo
+from handlers.tts.cosyvoice.cosyvoice_processor import TTSCosyVoiceProcessor
+
+SENTENCES = [
+    '白色的咖啡杯放在桌子上。',
+    '今天天气很好，我们一起去公园散步吧。',
+    '说句话呀，你这样显得这个文字有点短呀。',
+    '欢迎来到数字人对话演示。',
+]
+
+
+def bench(args, batch_size: int) -> float:
+    config = types.SimpleNamespace(
+        model_name=args.model_name, api_url=None, api_key=None, spk_id=args.spk_id,
+        ref_audio_path=args.ref_audio_path, ref_audio_text=args.ref_audio_text,
+        sample_rate=args.sample_rate, batch_size=batch_size)
+    context = mp.get_context('spawn')
+    input_queue = context.Queue()
+    output_queue = context.Queue()
+    handler_root = os.path.join(DirectoryInfo.get_src_dir(), 'handlers', 'tts', 'cosyvoice')
+    processor = TTSCosyVoiceProcessor(handler_root, config, input_queue, output_queue)
+    processor.start()
+    try:
+        # wait for the warm up output
+        output_queue.get()
+        while not output_queue.empty():
+            output_queue.get()
+
+        pending = set()
+        start_time = time.monotonic()
+        for i in range(args.sentences):
+            key = uuid.uuid4()
+            pending.add(key)
+            input_queue.put({
+                'text': SENTENCES[i % len(SENTENCES)],
+                'key': key,
+                'session_id': f'session_{i % args.sessions}',
+            })
+        while pending:
+            output = output_queue.get()
+            if output['tts_speech'] is None:
+                pending.discard(output['key'])
+        cost = time.monotonic() - start_time
+    finally:
+        processor.terminate()
+        processor.join()
+    return args.sentences / cost
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--model_name', required=True)
+    parser.add_argument('--spk_id', default=None)
+    parser.add_argument('--ref_audio_path', default=None)
+    parser.add_argument('--ref_audio_text', default=None)
+    parser.add_argument('--sample_rate', type=int, default=24000)
+    parser.add_argument('--sentences', type=int, default=16)
+    parser.add_argument('--sessions', type=int, default=4)
+    parser.add_argument('--batch_sizes', type=int, nargs='+', default=[1, 4])
+    args = parser.parse_args()
+    for batch_size in args.batch_sizes:
+        throughput = bench(args, batch_size)
+        print(f'batch_size {batch_size}: {throughput:.2f} sentences/s '
+              f'({args.sentences} sentences from {args.sessions} sessions)')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,106 @@
+"""
+Measure LAM audio2expression throughput against the number of sessions, with every session
+calling the model from its own thread and with the shared inference worker.
+
+The model is a synthetic wav2vec style convolutional feature encoder over the context window
+of every chunk, running on the cpu:
+
+    PYTHONPATH=src python tests/inttest/benchmark/bench_lam_inference_worker.py --sessions 1 2 4 8
+    PYTHONPATH=src python tests/inttest/benchmark/bench_lam_inference_worker.py --sessions 4 \
+        --inference_threads 4 --cpu_affinity 0 1 2 3
+"""
+import argparse
+import threading
+import time
+
+import numpy as np
+import torch
+
+from handlers.avatar.lam.lam_inference_worker import LamInferenceWorker
+
+
+class SyntheticFeatureModel:
+    def __init__(self, channels: int, context_seconds: float, sample_rate: int = 16000):
+        layers = []
+        in_channels = 1
+        for kernel, stride in ((10, 5), (3, 2), (3, 2), (3, 2), (3, 2), (2, 2), (2, 2)):
+            layers += [torch.nn.Conv1d(in_channels, channels, kernel, stride), torch.nn.GELU()]
+            in_channels = channels
+        self.encoder = torch.nn.Sequential(*layers, torch.nn.Conv1d(channels, 52, 1)).eval()
+        self.context_samples = round(context_seconds * sample_rate)
+        self.sample_rate = sample_rate
+
+    def infer_streaming_audio(self, audio, ssr, context):
+        # the context keeps the audio before the chunk, as the streaming LAM inference does
+        previous = np.zeros([0], dtype=np.float32) if context is None else context["previous_audio"]
+        window = np.concatenate([previous, audio])
+        with torch.no_grad():
+            features = self.encoder(torch.from_numpy(window)[None, None])
+        frame_num = audio.shape[-1] * 30 // ssr
+        expression = torch.nn.functional.interpolate(features, size=max(1, window.shape[-1] * 30 // ssr))
+        return ({"expression": expression[0, :, -frame_num:].T.numpy()},
+                {"previous_audio": window[-self.context_samples:]})
+
+
+def run_session(infer_fn, chunk, stop_time, processed, index):
+    context = None
+    while time.perf_counter() < stop_time:
+        _, context = infer_fn(chunk, context)
+        processed[index] += chunk.shape[-1]
+
+
+def run_sessions(infer_fn, session_count, args):
+    chunk = np.random.default_rng(0).uniform(-1, 1, round(args.chunk_duration * args.sample_rate))
+    chunk = chunk.astype(np.float32)
+    processed = [0] * session_count
+    start_time = time.perf_counter()
+    stop_time = start_time + args.duration
+    threads = [threading.Thread(target=run_session, args=(infer_fn, chunk, stop_time, processed, i))
+               for i in range(session_count)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return sum(processed) / args.sample_rate / (time.perf_counter() - start_time)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--sessions', type=int, nargs='+', default=[1, 2, 4, 8])
+    parser.add_argument('--sample_rate', type=int, default=16000)
+    parser.add_argument('--chunk_duration', type=float, default=0.4)
+    parser.add_argument('--context_duration', type=float, default=2.1)
+    parser.add_argument('--channels', type=int, default=256)
+    parser.add_argument('--inference_threads', type=int, default=0)
+    parser.add_argument('--cpu_affinity', type=int, nargs='*', default=[])
+    parser.add_argument('--duration', type=float, default=5, help='seconds per measurement')
+    args = parser.parse_args()
+
+    model = SyntheticFeatureModel(args.channels, args.context_duration, args.sample_rate)
+
+    def infer_direct(audio, context):
+        return model.infer_streaming_audio(audio, args.sample_rate, context)
+
+    def infer_request(request):
+        return model.infer_streaming_audio(request.audio, request.sample_rate, request.inference_context)
+
+    worker = LamInferenceWorker(infer_request, num_threads=args.inference_threads, cpu_affinity=args.cpu_affinity)
+    worker.start()
+
+    def infer_worker(audio, context):
+        return worker.submit(audio, args.sample_rate, context).result()
+
+    infer_worker(np.zeros(args.sample_rate, dtype=np.float32), None)
+    for session_count in args.sessions:
+        direct_rate = run_sessions(infer_direct, session_count, args)
+        worker.reset_metrics()
+        worker_rate = run_sessions(infer_worker, session_count, args)
+        metrics = worker.get_metrics()
+        print(f'sessions {session_count}: session threads {direct_rate:.1f}s audio/s, '
+              f'shared worker {worker_rate:.1f}s audio/s, {worker_rate / direct_rate:.2f}x, '
+              f'p95 latency {metrics.p95_latency * 1000:.1f}ms')
+    worker.stop()
+
+
+if __name__ == '__main__':
+    main()
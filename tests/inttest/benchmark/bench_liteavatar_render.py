@@ -0,0 +1,88 @@
+"""
+Measure LiteAvatar rendering capacity (param2img + mouth2full) in fps, total and per CPU core,
+for different render batch sizes and thread counts.
+
+    PYTHONPATH=src python tests/inttest/benchmark/bench_liteavatar_render.py \
+        --avatar_name 20250408/sample_data --batch_sizes 1 4 8 --render_threads 1 2 4
+"""
+import argparse
+import os
+import time
+
+import cv2
+
+from handlers.avatar.liteavatar.algo.tts2face_cpu_adapter import Tts2faceCpuAdapter
+from handlers.avatar.liteavatar.model.algo_model import AudioSlice, AvatarInitOption, AvatarStatus
+
+
+def get_signals(adapter: Tts2faceCpuAdapter, duration: int):
+    audio_slice = AudioSlice(
+        speech_id="bench",
+        play_audio_data=bytes(16000 * 2 * duration),
+        play_audio_sample_rate=16000,
+        algo_audio_data=bytes(16000 * 2 * duration),
+        algo_audio_sample_rate=16000,
+        end_of_speech=True,
+    )
+    return adapter.audio2signal(audio_slice)
+
+
+def bench(adapter: Tts2faceCpuAdapter, signals, batch_size: int) -> float:
+    start_time = time.perf_counter()
+    for i in range(0, len(signals), batch_size):
+        batch = signals[i:i + batch_size]
+        rendered = adapter.signal2img_batch(batch, [AvatarStatus.SPEAKING] * len(batch))
+        adapter.mouth2full_batch([mouth_img for mouth_img, _ in rendered],
+                                 [bg_frame_id for _, bg_frame_id in rendered])
+    return len(signals) / (time.perf_counter() - start_time)
+
+
+def bench_flip(adapter: Tts2faceCpuAdapter, signal, runs: int = 200) -> float:
+    """
+    per frame cost in seconds of the full frame cv2.flip that pre-flipped backgrounds remove
+    """
+    mouth_img, bg_frame_id = adapter.signal2img(signal, AvatarStatus.SPEAKING)
+    full_img = adapter.mouth2full(mouth_img, bg_frame_id)
+    start_time = time.perf_counter()
+    for _ in range(runs):
+        cv2.flip(full_img, 1)
+    return (time.perf_counter() - start_time) / runs
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--avatar_name', default='20250408/sample_data')
+    parser.add_argument('--fps', type=int, default=25)
+    parser.add_argument('--duration', type=int, default=8, help='seconds of speech signal to render')
+    parser.add_argument('--batch_sizes', type=int, nargs='+', default=[1, 4])
+    parser.add_argument('--render_threads', type=int, nargs='+', default=[1, 2])
+    args = parser.parse_args()
+
+    cwd = os.getcwd()
+    for render_threads in args.render_threads:
+        os.chdir(cwd)
+        adapter = Tts2faceCpuAdapter()
+        adapter.init(AvatarInitOption(
+            audio_sample_rate=24000,
+            video_frame_rate=args.fps,
+            avatar_name=args.avatar_name,
+            use_gpu=False,
+            render_threads=render_threads,
+        ))
+        signals = get_signals(adapter, args.duration)
+        # first pass warms up the renderer
+        bench(adapter, signals[:args.fps], max(args.batch_sizes))
+        for batch_size in args.batch_sizes:
+            fps = bench(adapter, signals, batch_size)
+            cores = min(render_threads, os.cpu_count())
+            print(f'render_threads {render_threads} batch_size {batch_size}: {fps:.1f} fps, '
+                  f'{fps / cores:.1f} fps per core, {fps / args.fps:.2f} realtime sessions')
+
+    flip_cost = bench_flip(adapter, signals[0])
+    for fps in (25, 30):
+        print(f'full frame flip saved by pre-flipped backgrounds at {fps} fps: '
+              f'{flip_cost * 1000:.2f} ms per frame, {flip_cost * fps * 100:.1f}% of one core')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,117 @@
+"""
+Measure serialized LAM motion messages per second, 1s chunks of 30 arkit frames and 24khz audio,
+with record templates and the preallocated writer against field by field records and
+concatenated bytes, and the size of json and compact messages with every arkit and audio encoding.
+
+    PYTHONPATH=src python tests/inttest/benchmark/bench_motion_data_serializer.py
+"""
+import argparse
+import struct
+import time
+
+import numpy as np
+
+from chat_engine.data_models.runtime_data.data_bundle import DataBundle, DataBundleDefinition, DataBundleEntry
+from chat_engine.data_models.runtime_data.motion_data import MotionDataSerializer, MOTION_FORMAT_COMPACT, \
+    MOTION_FORMAT_JSON, ARKIT_ENCODINGS, AUDIO_ENCODINGS, create_entry_serializer
+from chat_engine.data_models.runtime_data.motion_data_descriptors import BufferDescription
+
+
+class ConcatMotionDataSerializer(MotionDataSerializer):
+    # records assigned field by field and packed by concatenation, as before the preallocated writer
+    def _get_record_template(self, data_name, entry, write_channel_names):
+        data_desc = BufferDescription()
+        data_desc.sample_rate = entry.sample_rate
+        data_desc.timeline_axis = entry.time_axis
+        data_desc.channel_axis = entry.channel_axis
+        if write_channel_names:
+            data_desc.channel_names = entry.channel_names
+        return data_desc
+
+    def _dump_to_bytes(self, description, data_list):
+        binary_offset = 0
+        binary_data = bytes()
+        for data_name, data_desc in description.data_records.items():
+            if data_desc.data_id < 0:
+                continue
+            data_item = data_list[data_desc.data_id]
+            if isinstance(data_item, np.ndarray):
+                data_item = data_item.tobytes()
+            elif isinstance(data_item, str):
+                data_item = data_item.encode("utf-8")
+            binary_data += data_item
+            data_desc.data_offset = binary_offset
+            binary_offset += len(data_item)
+        desc_bytes = bytes(description.model_dump_json(), "utf-8")
+        header = b"JBIN" + struct.pack("<II", len(desc_bytes), len(binary_data))
+        return header + desc_bytes + binary_data
+
+
+def create_definition(sample_rate: int):
+    definition = DataBundleDefinition()
+    definition.add_entry(DataBundleEntry.create_framed_entry(
+        name="arkit_face", shape=[1, 52], time_axis=0, sample_rate=30,
+        channel_axis=1, channel_names=[f"blendshape_{i}" for i in range(52)]))
+    definition.add_entry(DataBundleEntry.create_audio_entry(
+        name="avatar_audio", channel_num=1, sample_rate=sample_rate))
+    return definition
+
+
+def create_bundles(definition, count: int, chunk_seconds: float, sample_rate: int):
+    rng = np.random.default_rng(0)
+    bundles = []
+    for i in range(count):
+        bundle = DataBundle(definition)
+        bundle.set_data("arkit_face", rng.random((round(30 * chunk_seconds), 52), dtype=np.float32))
+        bundle.set_data("avatar_audio", rng.uniform(-1, 1, (1, round(sample_rate * chunk_seconds))).astype(np.float32))
+        bundle.add_meta("speech_id", f"speech_{i // 10}")
+        bundle.add_meta("avatar_speech_text", "a sentence spoken by the avatar in this speech")
+        bundles.append(bundle)
+    return bundles
+
+
+def bench(serializer_class, definition, bundles, repeats: int, motion_format: str = MOTION_FORMAT_JSON,
+          arkit_encoding: str = "float32", audio_encoding: str = "int16"):
+    serializer = serializer_class(motion_format)
+    serializer.register_audio_data("avatar_audio", audio_encoding)
+    serializer.register_data("arkit_face", "arkit_face", "float32", create_entry_serializer(arkit_encoding))
+    size = len(serializer.serialize(definition))
+    start_time = time.perf_counter()
+    for _ in range(repeats):
+        for bundle in bundles:
+            size += len(serializer.serialize(bundle))
+    elapsed = time.perf_counter() - start_time
+    return repeats * len(bundles) / elapsed, size
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--chunk_seconds', type=float, nargs='+', default=[1.0, 0.2])
+    parser.add_argument('--sample_rate', type=int, default=24000)
+    parser.add_argument('--messages', type=int, default=100)
+    parser.add_argument('--repeats', type=int, default=20)
+    args = parser.parse_args()
+
+    definition = create_definition(args.sample_rate)
+    for chunk_seconds in args.chunk_seconds:
+        bundles = create_bundles(definition, args.messages, chunk_seconds, args.sample_rate)
+        concat_rate, concat_size = bench(ConcatMotionDataSerializer, definition, bundles, args.repeats)
+        rate, size = bench(MotionDataSerializer, definition, bundles, args.repeats)
+        compact_rate, compact_size = bench(MotionDataSerializer, definition, bundles, args.repeats,
+                                           MOTION_FORMAT_COMPACT)
+        assert size == concat_size
+        message_count = args.repeats * len(bundles) + 1
+        print(f'{chunk_seconds:g}s chunks: concatenated {concat_rate:.0f} msg/s, '
+              f'preallocated {rate:.0f} msg/s, {rate / concat_rate:.2f}x, '
+              f'compact {compact_rate:.0f} msg/s; bytes per message json {size / message_count:.0f}, '
+              f'compact {compact_size / message_count:.0f}')
+        for audio_encoding in AUDIO_ENCODINGS:
+            for arkit_encoding in ARKIT_ENCODINGS:
+                encoded_rate, encoded_size = bench(MotionDataSerializer, definition, bundles, 1, MOTION_FORMAT_COMPACT,
+                                                   arkit_encoding, audio_encoding)
+                print(f'  compact {arkit_encoding} arkit, {audio_encoding} audio: {encoded_rate:.0f} msg/s, '
+                      f'{encoded_size / (len(bundles) + 1):.0f} bytes per message')
+
+
+if __name__ == '__main__':
+    main()
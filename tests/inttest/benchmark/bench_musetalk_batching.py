@@ -0,0 +1,112 @@
+"""
+Measure MuseTalk inference throughput and p95 frame latency against the number of realtime
+sessions, with and without cross-session batching.
+
+Without --avatar_video_path a synthetic model costing fixed_ms + per_frame_ms per batch is used:
+
+    PYTHONPATH=src python tests/inttest/benchmark/bench_musetalk_batching.py --sessions 1 2 4 8
+    PYTHONPATH=src python tests/inttest/benchmark/bench_musetalk_batching.py --sessions 1 2 4 \
+        --avatar_video_path resource/avatar/liteavatar/20250408/sample_data/bg_video.mp4
+"""
+import argparse
+import os
+import threading
+import time
+
+import torch
+
+from handlers.avatar.musetalk.avatar_musetalk_scheduler import MuseTalkInferenceScheduler
+
+
+class SyntheticModel:
+    def __init__(self, fixed_ms: float, per_frame_ms: float):
+        self._fixed = fixed_ms / 1000
+        self._per_frame = per_frame_ms / 1000
+        self._lock = threading.Lock()
+
+    def generate_frames_for_indices(self, whisper_chunks, idx_list):
+        # one gpu, batches never overlap
+        with self._lock:
+            time.sleep(self._fixed + self._per_frame * len(idx_list))
+        return list(idx_list)
+
+
+def load_avatar(args):
+    from handlers.avatar.musetalk.avatar_musetalk_algo import MuseAvatarV15
+    model_dir = os.path.join(os.getcwd(), args.model_dir)
+    return MuseAvatarV15(
+        avatar_id="bench_batching",
+        video_path=args.avatar_video_path,
+        bbox_shift=0,
+        batch_size=args.session_batch_size,
+        result_dir=os.path.join(os.getcwd(), "models/musetalk/avatar_model"),
+        unet_model_path=os.path.join(model_dir, "musetalkV15", "unet.pth"),
+        unet_config=os.path.join(model_dir, "musetalkV15", "musetalk.json"),
+        whisper_dir=os.path.join(model_dir, "whisper"),
+    )
+
+
+def run_session(scheduler, whisper_chunks, args, stop_time):
+    # a realtime session asks for session_batch_size frames every session_batch_size / fps seconds
+    interval = args.session_batch_size / args.fps
+    next_time = time.perf_counter()
+    frame_id = 0
+    while next_time < stop_time:
+        idx_list = list(range(frame_id, frame_id + args.session_batch_size))
+        scheduler.submit(whisper_chunks, idx_list).result()
+        frame_id += args.session_batch_size
+        next_time += interval
+        time.sleep(max(0.0, next_time - time.perf_counter()))
+
+
+def bench(model, session_count, max_batch_size, max_wait_ms, args):
+    scheduler = MuseTalkInferenceScheduler(model.generate_frames_for_indices,
+                                           max_batch_size=max_batch_size, max_wait_ms=max_wait_ms)
+    scheduler.start()
+    device = getattr(model, "device", None) or "cpu"
+    dtype = getattr(model, "weight_dtype", None) or torch.float32
+    whisper_chunks = torch.zeros(args.session_batch_size, 50, 384, device=device, dtype=dtype)
+    # warm up outside the measurement
+    scheduler.submit(whisper_chunks, list(range(args.session_batch_size))).result()
+    scheduler.reset_metrics()
+    stop_time = time.perf_counter() + args.duration
+    threads = [threading.Thread(target=run_session, args=(scheduler, whisper_chunks, args, stop_time))
+               for _ in range(session_count)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    metrics = scheduler.get_metrics()
+    scheduler.stop()
+    realtime = metrics.fps / (session_count * args.fps)
+    print(f'sessions {session_count} max_batch_size {max_batch_size}: {metrics.fps:.1f} fps per gpu, '
+          f'avg batch {metrics.avg_batch_size:.1f}, p95 latency {metrics.p95_latency * 1000:.1f}ms, '
+          f'{realtime * 100:.0f}% of realtime')
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--sessions', type=int, nargs='+', default=[1, 2, 4, 8])
+    parser.add_argument('--fps', type=int, default=25)
+    parser.add_argument('--session_batch_size', type=int, default=5)
+    parser.add_argument('--max_batch_size', type=int, default=20)
+    parser.add_argument('--max_wait_ms', type=float, default=10)
+    parser.add_argument('--duration', type=float, default=10, help='seconds per measurement')
+    parser.add_argument('--fixed_ms', type=float, default=30, help='synthetic cost per batch')
+    parser.add_argument('--per_frame_ms', type=float, default=4, help='synthetic cost per frame')
+    parser.add_argument('--avatar_video_path', default='')
+    parser.add_argument('--model_dir', default='models/musetalk')
+    args = parser.parse_args()
+
+    if args.avatar_video_path:
+        model = load_avatar(args)
+    else:
+        model = SyntheticModel(args.fixed_ms, args.per_frame_ms)
+    for session_count in args.sessions:
+        # per session batches as before, then batches across sessions
+        bench(model, session_count, args.session_batch_size, 0, args)
+        bench(model, session_count, args.max_batch_size, args.max_wait_ms, args)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,82 @@
+"""
+Measure MuseTalk per frame compositing cost over a synthetic avatar frame cycle.
+
+    PYTHONPATH=src python tests/inttest/benchmark/bench_musetalk_compositing.py --width 1280 --height 720
+"""
+import argparse
+import time
+
+import cv2
+import numpy as np
+import torch
+
+from handlers.avatar.musetalk.avatar_musetalk_compositor import NumpyFrameCompositor, TorchFrameCompositor
+
+
+def legacy_compose(frame, res_frame, face_box, mask_array, crop_box):
+    # resize and acc_get_image_blending of MuseAvatarV15.res2combined
+    x, y, x1, y1 = face_box
+    face = cv2.resize(res_frame, (x1 - x, y1 - y))
+    body_cpy = frame[:, :, ::-1].copy()
+    face_cpy = face[:, :, ::-1].copy()
+    x_s, y_s, x_e, y_e = crop_box
+    face_large1 = body_cpy[y_s:y_e, x_s:x_e].copy()
+    mask_f = (mask_array / 255.0).astype(np.float32)
+    mask3 = np.stack([mask_f] * 3, axis=2)
+    face_large1[y - y_s:y1 - y_s, x - x_s:x1 - x_s] = face_cpy
+    body_crop = body_cpy[y_s:y_e, x_s:x_e].copy()
+    blended = (face_large1 * mask3 + body_crop * (1 - mask3)).astype(np.uint8)
+    out = body_cpy.copy()
+    out[y_s:y_e, x_s:x_e] = blended
+    return out[:, :, ::-1]
+
+
+def make_cycle(args):
+    rng = np.random.default_rng(0)
+    frames, coords, masks, crop_boxes = [], [], [], []
+    face_size = args.height // 3
+    for i in range(args.frames):
+        frames.append(rng.integers(0, 255, (args.height, args.width, 3), dtype=np.uint8))
+        x1 = args.width // 2 - face_size // 2 + i % 7
+        y1 = args.height // 3 + i % 5
+        coords.append((x1, y1, x1 + face_size, y1 + face_size))
+        margin = face_size // 4
+        crop_boxes.append((x1 - margin, y1 - margin, x1 + face_size + margin, y1 + face_size + margin))
+        masks.append(rng.integers(0, 255, (face_size + 2 * margin, face_size + 2 * margin), dtype=np.uint8))
+    return frames + frames[::-1], coords + coords[::-1], masks + masks[::-1], crop_boxes + crop_boxes[::-1]
+
+
+def bench(name, compose, cycle_length, runs):
+    res_frame = np.random.default_rng(1).integers(0, 255, (256, 256, 3), dtype=np.uint8)
+    compose(res_frame, 0)
+    start_time = time.perf_counter()
+    for i in range(runs):
+        compose(res_frame, i % cycle_length)
+    cost = (time.perf_counter() - start_time) / runs
+    print(f'{name}: {cost * 1000:.2f}ms per frame, {1 / cost:.0f} fps')
+    return cost
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--width', type=int, default=1280)
+    parser.add_argument('--height', type=int, default=720)
+    parser.add_argument('--frames', type=int, default=50, help='distinct frames before the cycle is mirrored')
+    parser.add_argument('--runs', type=int, default=200)
+    args = parser.parse_args()
+
+    frames, coords, masks, crop_boxes = make_cycle(args)
+    cycle_length = len(frames)
+    legacy = bench('legacy float blend', lambda res, i: legacy_compose(
+        frames[i], res, coords[i], masks[i], crop_boxes[i]), cycle_length, args.runs)
+    fixed = bench('numpy fixed point', NumpyFrameCompositor(frames, coords, masks, crop_boxes).compose,
+                  cycle_length, args.runs)
+    bench('torch cpu', TorchFrameCompositor(frames, coords, masks, crop_boxes).compose, cycle_length, args.runs)
+    if torch.cuda.is_available():
+        bench('torch cuda', TorchFrameCompositor(frames, coords, masks, crop_boxes, device='cuda').compose,
+              cycle_length, args.runs)
+    print(f'numpy fixed point is {legacy / fixed:.1f}x faster than the legacy blend')
+
+
+if __name__ == '__main__':
+    main()
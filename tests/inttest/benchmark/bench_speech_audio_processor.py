@@ -0,0 +1,66 @@
+"""
+Measure LiteAvatar speech audio slicing and video audio alignment cost for long utterances.
+
+    PYTHONPATH=src python tests/inttest/benchmark/bench_speech_audio_processor.py --durations 60 600
+"""
+import argparse
+import time
+import tracemalloc
+
+import numpy as np
+from loguru import logger
+
+from handlers.avatar.liteavatar.media.speech_audio_processor import SpeechAudioProcessor
+from handlers.avatar.liteavatar.media.video_audio_aligner import VideoAudioAligner
+from handlers.avatar.liteavatar.model import SpeechAudio
+
+SAMPLE_RATE = 24000
+FPS = 25
+
+
+def bench(duration: int, chunk_ms: int):
+    processor = SpeechAudioProcessor(SAMPLE_RATE, 16000, 1)
+    aligner = VideoAudioAligner(FPS)
+    chunk_samples = SAMPLE_RATE * chunk_ms // 1000
+    chunk_count = duration * 1000 // chunk_ms
+    rng = np.random.default_rng(0)
+    chunk = rng.integers(-1000, 1000, chunk_samples).astype(np.int16).tobytes()
+
+    tracemalloc.start()
+    slice_count = 0
+    slice_time = 0
+    align_time = 0
+    for i in range(chunk_count):
+        speech_audio = SpeechAudio(speech_id="bench", end_of_speech=i == chunk_count - 1,
+                                   sample_rate=SAMPLE_RATE, audio_data=chunk)
+        start_time = time.perf_counter()
+        audio_slices = processor.get_speech_audio_slice(speech_audio)
+        slice_time += time.perf_counter() - start_time
+        start_time = time.perf_counter()
+        for audio_slice in audio_slices:
+            frame_count = int(audio_slice.get_audio_duration() * FPS)
+            aligner.get_speech_level_algined_audio(
+                audio_slice.play_audio_data, SAMPLE_RATE, frame_count,
+                audio_slice.speech_id, audio_slice.end_of_speech)
+        align_time += time.perf_counter() - start_time
+        slice_count += len(audio_slices)
+    _, peak_memory = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print(f'{duration}s utterance in {chunk_ms}ms chunks: {slice_count} slices, '
+          f'slicing {slice_time / chunk_count * 1e6:.1f}us per chunk, '
+          f'aligning {align_time / max(1, slice_count) * 1e6:.1f}us per slice, '
+          f'peak memory {peak_memory / 1024 / 1024:.2f}MB')
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--durations', type=int, nargs='+', default=[60, 600])
+    parser.add_argument('--chunk_ms', type=int, default=20)
+    args = parser.parse_args()
+    logger.remove()
+    for duration in args.durations:
+        bench(duration, args.chunk_ms)
+
+
+if __name__ == '__main__':
+    main()
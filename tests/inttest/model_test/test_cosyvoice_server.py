@@ -1,15 +1,66 @@
 import os
 import sys
+import threading
+import types
 import unittest
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
 import numpy as np
 import requests
 import torchaudio
 
 
+class _FakeCosyVoiceServerHandler(BaseHTTPRequestHandler):
+    # mimic CosyVoice/runtime/python/fastapi/server.py, a chunked int16 pcm stream at 22050hz
+    protocol_version = 'HTTP/1.1'
+    audio = (np.sin(2 * np.pi * 440 * np.arange(22050) / 22050) * 16000).astype(np.int16).tobytes()
+
+    def do_GET(self):
+        self.server.request_count += 1
+        self.server.connections.add(self.client_address)
+        length = int(self.headers.get('Content-Length', 0))
+        self.rfile.read(length)
+        self.send_response(200)
+        self.send_header('Transfer-Encoding', 'chunked')
+        self.end_headers()
+        # odd chunk size so that int16 samples are split across chunks
+        for i in range(0, len(self.audio), 4001):
+            chunk = self.audio[i:i + 4001]
+            self.wfile.write(f'{len(chunk):x}\r\n'.encode() + chunk + b'\r\n')
+        self.wfile.write(b'0\r\n\r\n')
+
+    def log_message(self, format, *args):
+        pass
+
+
 class TestCosyVoice(unittest.TestCase):
     def test1(self):
         pass
 
+    def test_server_streaming(self):
+        from handlers.tts.cosyvoice.cosyvoice_processor import TTSCosyVoiceProcessor
+
+        server = ThreadingHTTPServer(('127.0.0.1', 0), _FakeCosyVoiceServerHandler)
+        server.request_count = 0
+        server.connections = set()
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        try:
+            config = types.SimpleNamespace(
+                model_name=None, api_url=f'http://127.0.0.1:{server.server_port}/inference_sft',
+                spk_id='中文女', ref_audio_text=None, ref_audio_path=None, sample_rate=24000, api_key=None,
+                batch_size=1)
+            processor = TTSCosyVoiceProcessor('', config, None, None)
+            processor.http_session = processor.create_http_session()
+            for _ in range(3):
+                chunks = list(processor.stream_from_server('说句话呀'))
+                audio = np.concatenate(chunks, axis=1)
+                self.assertEqual(audio.shape, (1, 24000))
+            self.assertEqual(server.request_count, 3)
+            # every sentence is served on the same pooled connection
+            self.assertEqual(len(server.connections), 1)
+        finally:
+            server.shutdown()
+
 
 if __name__ == '__main__':
 
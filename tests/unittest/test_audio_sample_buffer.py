@@ -0,0 +1,37 @@
+import unittest
+
+import numpy as np
+
+from handlers.avatar.liteavatar.media.audio_sample_buffer import AudioSampleBuffer
+
+
+class TestAudioSampleBuffer(unittest.TestCase):
+
+    def test_fifo_order_across_growth(self):
+        buffer = AudioSampleBuffer(capacity=8)
+        expected = np.arange(1000, dtype=np.int16)
+        output = []
+        for chunk in np.array_split(expected, 37):
+            buffer.write(chunk.tobytes())
+            output.append(buffer.read(13).copy())
+        output.append(buffer.read().copy())
+        np.testing.assert_array_equal(np.concatenate(output), expected)
+        self.assertEqual(len(buffer), 0)
+
+    def test_read_more_than_available(self):
+        buffer = AudioSampleBuffer(capacity=4)
+        buffer.write(np.array([1, 2, 3], dtype=np.int16).tobytes())
+        np.testing.assert_array_equal(buffer.read(10), [1, 2, 3])
+        self.assertEqual(buffer.read(10).shape[0], 0)
+
+    def test_compact_reuses_capacity(self):
+        buffer = AudioSampleBuffer(capacity=10)
+        buffer.write(np.arange(8, dtype=np.int16).tobytes())
+        buffer.read(6)
+        buffer.write(np.arange(8, 14, dtype=np.int16).tobytes())
+        np.testing.assert_array_equal(buffer.peek(), [6, 7, 8, 9, 10, 11, 12, 13])
+        self.assertEqual(buffer._buffer.shape[0], 10)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,104 @@
+import unittest
+from types import SimpleNamespace
+
+import numpy as np
+
+try:
+    import torch
+    from handlers.tts.cosyvoice.cosyvoice_processor import TTSCosyVoiceProcessor
+except ImportError:
+    torch = None
+
+
+class _Frontend:
+    """Frontend of current cosyvoice, frontend_zero_shot takes zero_shot_spk_id."""
+
+    def __init__(self):
+        self.zero_shot_calls = []
+
+    def text_normalize(self, text, split=True):
+        return text.split('|') if split else text
+
+    def _extract_text_token(self, text):
+        return f'tokens({text})', len(text)
+
+    def frontend_zero_shot(self, tts_text, prompt_text, prompt_speech_16k, resample_rate, zero_shot_spk_id):
+        self.zero_shot_calls.append(zero_shot_spk_id)
+        return {'prompt_text': prompt_text, 'flow_embedding': 'embedding'}
+
+
+class _OldFrontend(_Frontend):
+    def frontend_zero_shot(self, tts_text, prompt_text, prompt_speech_16k, resample_rate):
+        self.zero_shot_calls.append(None)
+        return {'prompt_text': prompt_text, 'flow_embedding': 'embedding'}
+
+
+class _Model:
+    def __init__(self, frontend, tts):
+        self.frontend = frontend
+        self.model = SimpleNamespace(tts=tts)
+        self.sample_rate = 24000
+        self.uncached_texts = []
+
+    def inference_zero_shot(self, tts_text, prompt_text, prompt_speech_16k, stream=False):
+        self.uncached_texts.append(tts_text)
+        yield {'tts_speech': torch.zeros(1, 2)}
+
+
+def _tts(text, text_len, prompt_text, flow_embedding, stream=False):
+    yield {'tts_speech': torch.full((1, 2), float(text_len))}
+
+
+def _tts_without_stream(**model_input):
+    yield {'tts_speech': torch.ones(1, 2)}
+
+
+def _create_processor(model):
+    config = SimpleNamespace(model_name=None, api_url=None, spk_id=None, ref_audio_text='prompt',
+                             ref_audio_path=None, sample_rate=24000, api_key=None, batch_size=1)
+    processor = TTSCosyVoiceProcessor('', config, None, None)
+    processor.model = model
+    processor.ref_audio_buffer = np.zeros(16000, dtype=np.float32)
+    return processor
+
+
+@unittest.skipIf(torch is None, "torch is not installed")
+class TestCosyVoicePromptCache(unittest.TestCase):
+
+    def test_cached_prompt(self):
+        frontend = _Frontend()
+        processor = _create_processor(_Model(frontend, _tts))
+        processor.prepare_prompt_cache()
+        self.assertEqual(frontend.zero_shot_calls, [''])
+        outputs = list(processor.synthesize('ab|cde'))
+        self.assertEqual([float(output[0, 0]) for output in outputs], [2, 3])
+        self.assertEqual(processor.model.uncached_texts, [])
+
+    def test_frontend_without_spk_id(self):
+        frontend = _OldFrontend()
+        processor = _create_processor(_Model(frontend, _tts))
+        processor.prepare_prompt_cache()
+        self.assertEqual(frontend.zero_shot_calls, [None])
+        self.assertIsNotNone(processor.zero_shot_prompt)
+
+    def test_tts_signature_mismatch_disables_cache(self):
+        processor = _create_processor(_Model(_Frontend(), _tts_without_stream))
+        processor.prepare_prompt_cache()
+        self.assertIsNone(processor.zero_shot_prompt)
+        self.assertEqual(len(list(processor.synthesize('ab|cde'))), 1)
+        self.assertEqual(processor.model.uncached_texts, ['ab|cde'])
+
+    def test_model_input_mismatch_falls_back(self):
+        def tts_with_other_input(text, text_len, llm_prompt_speech_token, stream=False):
+            yield {'tts_speech': torch.ones(1, 2)}
+
+        processor = _create_processor(_Model(_Frontend(), tts_with_other_input))
+        processor.prepare_prompt_cache()
+        outputs = list(processor.synthesize('ab|cde'))
+        self.assertEqual(len(outputs), 2)
+        self.assertIsNone(processor.zero_shot_prompt)
+        self.assertEqual(processor.model.uncached_texts, ['ab', 'cde'])
+
+
+if __name__ == '__main__':
+    unittest.main()
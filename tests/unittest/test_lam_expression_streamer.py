@@ -0,0 +1,92 @@
+import unittest
+
+import numpy as np
+
+from handlers.avatar.lam.lam_expression_streamer import ExpressionStreamer, frame_aligned_samples
+
+
+class _CausalInfer:
+    """
+    Stand-in for infer_streaming_audio: the context keeps the audio before the chunk, every
+    frame is computed from a window of audio ending at the frame, so frames do not depend on
+    how the audio is chunked once the context covers the window.
+    """
+
+    def __init__(self, sample_rate, context_frames=64, window_frames=10):
+        self.frame_samples = sample_rate // 30
+        self.context_samples = context_frames * self.frame_samples
+        self.window_samples = window_frames * self.frame_samples
+        self.calls = 0
+
+    def __call__(self, audio, context):
+        self.calls += 1
+        previous = np.zeros([0], dtype=np.float32) if context is None else context["previous_audio"]
+        window = np.concatenate([previous, audio])
+        frame_num = int(np.ceil(audio.shape[0] / self.frame_samples))
+        frames = []
+        for i in range(frame_num):
+            end = previous.shape[0] + (i + 1) * self.frame_samples
+            samples = window[max(0, end - self.window_samples):end]
+            frames.append(np.full(52, np.abs(samples).mean(), dtype=np.float32))
+        return {"expression": np.stack(frames)}, {"previous_audio": window[-self.context_samples:]}
+
+
+def _speech_audio(seconds, sample_rate=24000):
+    t = np.arange(round(seconds * sample_rate), dtype=np.float32) / sample_rate
+    return (np.sin(2 * np.pi * 3 * t) * np.sin(2 * np.pi * 220 * t)).astype(np.float32)
+
+
+def _stream(streamer, audio, pieces):
+    chunks = []
+    parts = np.array_split(audio, pieces)
+    for i, part in enumerate(parts):
+        chunks.extend(streamer.feed(part, speech_end=i == len(parts) - 1))
+    return chunks
+
+
+class TestExpressionStreamer(unittest.TestCase):
+
+    def test_frame_aligned_samples(self):
+        self.assertEqual(frame_aligned_samples(1.0, 24000), 24000)
+        self.assertEqual(frame_aligned_samples(0.25, 24000), 6400)
+        # 16khz holds whole frames every 3 frames
+        self.assertEqual(frame_aligned_samples(0.2, 16000), 3200)
+        self.assertEqual(frame_aligned_samples(0.01, 16000), 1600)
+
+    def test_sub_second_chunks_match_one_second_baseline(self):
+        audio = _speech_audio(3.37)
+        baseline = _stream(ExpressionStreamer(_CausalInfer(24000), 24000, chunk_duration=1.0), audio, 7)
+        baseline_expression = np.concatenate([chunk.expression for chunk in baseline])
+        baseline_audio = np.concatenate([chunk.audio for chunk in baseline])
+        for chunk_duration in (0.2, 0.3, 0.4):
+            infer = _CausalInfer(24000)
+            chunks = _stream(ExpressionStreamer(infer, 24000, chunk_duration=chunk_duration), audio, 7)
+            expression = np.concatenate([chunk.expression for chunk in chunks])
+            np.testing.assert_allclose(expression, baseline_expression, atol=1e-6)
+            np.testing.assert_array_equal(np.concatenate([chunk.audio for chunk in chunks]), baseline_audio)
+            self.assertEqual(infer.calls, len(chunks))
+            self.assertEqual([chunk.end_of_speech for chunk in chunks], [False] * (len(chunks) - 1) + [True])
+            for chunk in chunks:
+                self.assertEqual(chunk.expression.shape[0] * 800, chunk.audio.shape[0])
+
+    def test_first_chunk_starts_sooner(self):
+        streamer = ExpressionStreamer(_CausalInfer(24000), 24000, chunk_duration=1.0, first_chunk_duration=0.2)
+        chunks = list(streamer.feed(_speech_audio(0.5)))
+        self.assertEqual([chunk.expression.shape[0] for chunk in chunks], [6])
+        chunks = list(streamer.feed(_speech_audio(1.0), speech_end=True))
+        self.assertEqual([chunk.expression.shape[0] for chunk in chunks], [30, 9])
+        # a new speech starts with a short chunk and a new context again
+        self.assertIsNone(streamer.inference_context)
+        chunks = list(streamer.feed(_speech_audio(0.2)))
+        self.assertEqual([chunk.expression.shape[0] for chunk in chunks], [6])
+
+    def test_speech_end_without_audio(self):
+        streamer = ExpressionStreamer(_CausalInfer(24000), 24000, chunk_duration=0.2)
+        chunks = list(streamer.feed(np.zeros([0], dtype=np.float32), speech_end=True))
+        self.assertEqual(len(chunks), 1)
+        self.assertEqual(chunks[0].audio.shape[0], 800)
+        self.assertTrue(chunks[0].end_of_speech)
+
+
+if __name__ == '__main__':
+    unittest.main()
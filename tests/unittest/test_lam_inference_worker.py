@@ -0,0 +1,136 @@
+import os
+import threading
+import time
+import unittest
+
+import numpy as np
+
+from handlers.avatar.lam.lam_expression_streamer import ExpressionStreamer
+from handlers.avatar.lam.lam_inference_worker import LamInferenceWorker
+
+
+class _CountingInfer:
+    """Expression frames count the chunks a session inferred so far, kept in its context."""
+
+    def __init__(self, delay=0.0):
+        self.audio_lengths = []
+        self.thread_affinity = None
+        self.delay = delay
+        self.active = 0
+        self.max_active = 0
+        self._lock = threading.Lock()
+
+    def __call__(self, request):
+        with self._lock:
+            self.active += 1
+            self.max_active = max(self.max_active, self.active)
+        self.audio_lengths.append(request.audio.shape[-1])
+        if hasattr(os, "sched_getaffinity"):
+            self.thread_affinity = os.sched_getaffinity(0)
+        time.sleep(self.delay)
+        count = 1 if request.inference_context is None else request.inference_context["count"] + 1
+        frame_num = request.audio.shape[-1] * 30 // request.sample_rate
+        with self._lock:
+            self.active -= 1
+        return {"expression": np.full((frame_num, 52), count, dtype=np.float32)}, {"count": count}
+
+
+class TestLamInferenceWorker(unittest.TestCase):
+
+    def test_infers_pending_chunks_in_order(self):
+        infer = _CountingInfer()
+        worker = LamInferenceWorker(infer)
+        futures = [worker.submit(np.zeros(800 * (i + 1), dtype=np.float32), 24000, None) for i in range(6)]
+        worker.start()
+        try:
+            results = [future.result(timeout=5) for future in futures]
+        finally:
+            worker.stop()
+        self.assertEqual(infer.audio_lengths, [800 * (i + 1) for i in range(6)])
+        self.assertEqual([context["count"] for _, context in results], [1] * 6)
+        metrics = worker.get_metrics()
+        self.assertEqual(metrics.chunks, 6)
+        self.assertAlmostEqual(metrics.audio_seconds, 21 * 800 / 24000)
+
+    def test_sessions_keep_their_context(self):
+        infer = _CountingInfer(delay=0.005)
+        worker = LamInferenceWorker(infer)
+        worker.start()
+        outputs = {}
+
+        def run_session(name, chunk_count):
+            streamer = ExpressionStreamer(lambda audio, context: worker.submit(audio, 24000, context).result(),
+                                          24000, chunk_duration=0.2)
+            audio = np.zeros(4800 * chunk_count, dtype=np.float32)
+            outputs[name] = [int(chunk.expression[0, 0]) for chunk in streamer.feed(audio)]
+
+        threads = [threading.Thread(target=run_session, args=(f"session_{i}", 3 + i)) for i in range(4)]
+        try:
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join(timeout=10)
+        finally:
+            worker.stop()
+        for i in range(4):
+            self.assertEqual(outputs[f"session_{i}"], list(range(1, 4 + i)))
+        # the sessions share the model one chunk at a time
+        self.assertEqual(infer.max_active, 1)
+
+    def test_failed_chunk_fails_its_future(self):
+        infer = _CountingInfer()
+
+        def failing_infer(request):
+            if request.inference_context == "fail":
+                raise RuntimeError("inference failed")
+            return infer(request)
+
+        worker = LamInferenceWorker(failing_infer)
+        worker.start()
+        try:
+            future = worker.submit(np.zeros(800, dtype=np.float32), 24000, "fail")
+            with self.assertRaises(RuntimeError):
+                future.result(timeout=5)
+            # the worker keeps serving after a failed chunk
+            _, context = worker.submit(np.zeros(800, dtype=np.float32), 24000, None).result(timeout=5)
+            self.assertEqual(context["count"], 1)
+        finally:
+            worker.stop()
+
+    def test_stop_cancels_pending_chunks(self):
+        worker = LamInferenceWorker(_CountingInfer())
+        future = worker.submit(np.zeros(800, dtype=np.float32), 24000, None)
+        worker.stop()
+        self.assertTrue(future.cancelled())
+
+    def test_single_chunk_does_not_wait(self):
+        infer = _CountingInfer()
+        worker = LamInferenceWorker(infer)
+        worker.start()
+        try:
+            future = worker.submit(np.zeros(800, dtype=np.float32), 24000, None)
+            future.result(timeout=5)
+        finally:
+            worker.stop()
+        self.assertLess(worker.get_metrics().p95_latency, 0.05)
+        # stopping again, as the exit handler does after an explicit stop, is harmless
+        worker.stop()
+
+    @unittest.skipIf(not hasattr(os, "sched_setaffinity"), "cpu affinity is not supported")
+    def test_worker_thread_pinned(self):
+        process_affinity = os.sched_getaffinity(0)
+        cpu = sorted(process_affinity)[0]
+        infer = _CountingInfer()
+        worker = LamInferenceWorker(infer, cpu_affinity=[cpu])
+        worker.start()
+        try:
+            worker.submit(np.zeros(800, dtype=np.float32), 24000, None).result(timeout=5)
+        finally:
+            worker.stop()
+        self.assertEqual(infer.thread_affinity, {cpu})
+        # only the worker thread is pinned
+        self.assertEqual(os.sched_getaffinity(0), process_affinity)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,166 @@
+import json
+import struct
+import unittest
+
+import numpy as np
+
+from chat_engine.data_models.runtime_data.data_bundle import DataBundle, DataBundleDefinition, DataBundleEntry
+from chat_engine.data_models.runtime_data.motion_data import MotionDataSerializer, MOTION_FORMAT_COMPACT, \
+    COMPACT_FLAG_DESCRIPTION, COMPACT_FLAG_END_OF_BATCH, COMPACT_FLAG_START_OF_BATCH
+
+
+def _parse_message(message):
+    fourcc, json_size, bin_size = struct.unpack_from("<4sII", message, 0)
+    description = json.loads(bytes(message[12:12 + json_size]).decode("utf-8"))
+    binary = bytes(message[12 + json_size:])
+    return fourcc, description, json_size, bin_size, binary
+
+
+class _CompactReader:
+    """Client side of the compact format, keeps the last json description."""
+
+    def __init__(self):
+        self.description = None
+        self.flags = 0
+
+    def read(self, message):
+        if bytes(message[:4]) == b"JBIN":
+            _, self.description, _, _, _ = _parse_message(message)
+            return {}
+        fourcc, batch_id, self.flags, record_count, json_size = struct.unpack_from("<4sIHHI", message, 0)
+        assert fourcc == b"MBIN"
+        records = [struct.unpack_from("<III", message, 16 + i * 12) for i in range(record_count)]
+        json_start = 16 + record_count * 12
+        if self.flags & COMPACT_FLAG_DESCRIPTION:
+            self.description = json.loads(bytes(message[json_start:json_start + json_size]).decode("utf-8"))
+        self.batch_id = batch_id
+        binary = bytes(message[json_start + json_size:])
+        output = {}
+        for (name, desc), (sample_num, offset, size) in zip(self.description["data_records"].items(), records):
+            shape = list(desc["shape"])
+            shape[desc["timeline_axis"]] = sample_num
+            output[name] = np.frombuffer(binary[offset:offset + size], dtype=desc["data_type"]).reshape(shape)
+        return output
+
+
+class TestMotionDataSerializer(unittest.TestCase):
+
+    def setUp(self):
+        self.channel_names = [f"blend_{i}" for i in range(52)]
+        self.definition = DataBundleDefinition()
+        self.definition.add_entry(DataBundleEntry.create_framed_entry(
+            name="arkit_face", shape=[1, 52], time_axis=0, sample_rate=30,
+            channel_axis=1, channel_names=self.channel_names))
+        self.definition.add_entry(DataBundleEntry.create_audio_entry(
+            name="avatar_audio", channel_num=1, sample_rate=24000))
+        self.serializer = MotionDataSerializer()
+        self.serializer.register_audio_data("avatar_audio")
+        self.serializer.register_data("arkit_face", "arkit_face", "float32")
+
+    def _make_bundle(self, frames, speech_id="speech_0", end=False):
+        rng = np.random.default_rng(frames)
+        bundle = DataBundle(self.definition)
+        bundle.set_data("arkit_face", rng.random((frames, 52), dtype=np.float32))
+        bundle.set_data("avatar_audio", rng.uniform(-1, 1, (1, frames * 800)).astype(np.float32))
+        bundle.add_meta("speech_id", speech_id)
+        if end:
+            bundle.end_of_stream = True
+        return bundle
+
+    def test_message_layout(self):
+        bundle = self._make_bundle(30)
+        message = self.serializer.serialize(bundle)
+        fourcc, description, json_size, bin_size, binary = _parse_message(message)
+        self.assertEqual(fourcc, b"JBIN")
+        self.assertEqual(len(message), 12 + json_size + bin_size)
+        self.assertEqual(description["batch_name"], "speech_0")
+
+        face_desc = description["data_records"]["arkit_face"]
+        audio_desc = description["data_records"]["audio"]
+        self.assertEqual(face_desc["shape"], [30, 52])
+        self.assertEqual(audio_desc["data_type"], "int16")
+        face = np.frombuffer(binary, dtype=np.float32, count=30 * 52, offset=face_desc["data_offset"])
+        np.testing.assert_array_equal(face.reshape(30, 52), bundle.get_data("arkit_face"))
+        audio = np.frombuffer(binary, dtype=np.int16, count=30 * 800, offset=audio_desc["data_offset"])
+        expected_audio = (bundle.get_data("avatar_audio") * 32767).astype(np.int16).reshape(-1)
+        np.testing.assert_array_equal(audio, expected_audio)
+
+    def test_json_matches_model_dump(self):
+        # the cached record json must stay identical to the pydantic serialization
+        for frames in (30, 12, 30):
+            captured = {}
+            dump = self.serializer._dump_to_bytes
+
+            def capture(description, data_list):
+                message = dump(description, data_list)
+                captured["json"] = description.model_dump_json()
+                return message
+
+            self.serializer._dump_to_bytes = capture
+            message = self.serializer.serialize(self._make_bundle(frames), include_channel_names=frames == 12)
+            del self.serializer._dump_to_bytes
+            _, _, json_size, _, _ = _parse_message(message)
+            self.assertEqual(bytes(message[12:12 + json_size]).decode("utf-8"), captured["json"])
+
+    def test_definition_has_channel_names(self):
+        message = self.serializer.serialize(self.definition)
+        _, description, _, _, _ = _parse_message(message)
+        self.assertEqual(description["data_records"]["arkit_face"]["channel_names"], self.channel_names)
+        message = self.serializer.serialize(self._make_bundle(5))
+        _, description, _, _, _ = _parse_message(message)
+        self.assertEqual(description["data_records"]["arkit_face"]["channel_names"], [])
+
+    def test_batch_ids(self):
+        batch_ids = []
+        for speech_id, end in (("a", False), ("a", True), ("b", False), ("c", False)):
+            message = self.serializer.serialize(self._make_bundle(5, speech_id, end))
+            batch_ids.append(_parse_message(message)[1]["batch_id"])
+        self.assertEqual(batch_ids, [0, 0, 1, 2])
+
+    def test_non_contiguous_array(self):
+        bundle = self._make_bundle(10)
+        face = np.asfortranarray(bundle.get_data("arkit_face"))
+        bundle.set_data("arkit_face", face)
+        _, description, _, _, binary = _parse_message(self.serializer.serialize(bundle))
+        face_desc = description["data_records"]["arkit_face"]
+        decoded = np.frombuffer(binary, dtype=np.float32, count=10 * 52, offset=face_desc["data_offset"])
+        np.testing.assert_array_equal(decoded.reshape(10, 52), face)
+
+    def test_unknown_format(self):
+        with self.assertRaises(ValueError):
+            MotionDataSerializer("msgpack")
+
+    def test_compact_format(self):
+        serializer = MotionDataSerializer(MOTION_FORMAT_COMPACT)
+        serializer.register_audio_data("avatar_audio")
+        serializer.register_data("arkit_face", "arkit_face", "float32")
+        reader = _CompactReader()
+        reader.read(serializer.serialize(self.definition))
+        self.assertEqual(reader.description["metadata"]["motion_format"], MOTION_FORMAT_COMPACT)
+
+        chunks = [("a", 30, True, False), ("a", 30, False, False), ("a", 12, False, True), ("b", 30, True, False)]
+        description_sent = []
+        for speech_id, frames, start, end in chunks:
+            bundle = self._make_bundle(frames, speech_id, end)
+            bundle.start_of_stream = start
+            bundle.add_meta("avatar_speech_end", end)
+            message = serializer.serialize(bundle)
+            json_message = self.serializer.serialize(bundle)
+            output = reader.read(message)
+            description_sent.append(bool(reader.flags & COMPACT_FLAG_DESCRIPTION))
+            self.assertEqual(bool(reader.flags & COMPACT_FLAG_START_OF_BATCH), start)
+            self.assertEqual(bool(reader.flags & COMPACT_FLAG_END_OF_BATCH), end)
+            self.assertEqual(reader.description["batch_name"], speech_id)
+            np.testing.assert_array_equal(output["arkit_face"], bundle.get_data("arkit_face"))
+            self.assertEqual(output["audio"].shape, (1, frames * 800))
+            if not description_sent[-1]:
+                self.assertLess(len(message), len(json_message) - 200)
+        # the first chunk carries the description without channel names, the end of speech flag
+        # in the metadata and a new speech change it
+        self.assertEqual(description_sent, [True, False, True, True])
+        self.assertEqual(reader.batch_id, 1)
+
+
+
+if __name__ == '__main__':
+    unittest.main()
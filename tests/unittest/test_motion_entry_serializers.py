@@ -0,0 +1,188 @@
+import json
+import struct
+import unittest
+
+import numpy as np
+
+from chat_engine.data_models.runtime_data.data_bundle import DataBundle, DataBundleDefinition, DataBundleEntry
+from chat_engine.data_models.runtime_data.motion_data import MotionDataSerializer, create_entry_serializer
+from chat_engine.data_models.runtime_data.motion_data_descriptors import BufferDescription, MotionDataDescription
+from chat_engine.data_models.runtime_data.motion_entry_serializers.delta_int8_serializer import \
+    MotionEntryDeltaInt8Serializer
+from chat_engine.data_models.runtime_data.motion_entry_serializers.uint8_quantized_serializer import \
+    MotionEntryUInt8QuantizedSerializer
+
+try:
+    import av
+    from chat_engine.data_models.runtime_data.motion_entry_serializers.opus_audio_serializer import \
+        MotionEntryAudioOpusSerializer
+    av.codec.Codec("libopus", "w")
+except Exception:
+    av = None
+
+
+def _face_descriptor():
+    return BufferDescription(sample_rate=30, timeline_axis=0, channel_axis=1, shape=[0, 52])
+
+
+def _read_records(message):
+    _, json_size, _ = struct.unpack_from("<4sII", message, 0)
+    description = json.loads(bytes(message[12:12 + json_size]).decode("utf-8"))
+    binary = bytes(message[12 + json_size:])
+    # records follow each other in the binary part
+    items = list(description["data_records"].items())
+    ends = [desc["data_offset"] for _, desc in items[1:]] + [len(binary)]
+    records = {name: (desc, binary[desc["data_offset"]:end]) for (name, desc), end in zip(items, ends)}
+    return description, records
+
+
+def _read_opus_packets(data):
+    packets = []
+    position = 0
+    while position < len(data):
+        size, = struct.unpack_from("<H", data, position)
+        packets.append(data[position + 2:position + 2 + size])
+        position += 2 + size
+    return packets
+
+
+class TestArkitEntrySerializers(unittest.TestCase):
+
+    def setUp(self):
+        rng = np.random.default_rng(0)
+        # smooth blendshape curves in [0, 1] like the LAM output
+        t = np.arange(90, dtype=np.float32)[:, None] / 30
+        self.frames = (0.5 + 0.45 * np.sin(t * rng.uniform(1, 6, 52) + rng.uniform(0, 6, 52))).astype(np.float32)
+
+    def test_float16(self):
+        serializer = create_entry_serializer("float16")
+        result = serializer.serialize(None, MotionDataDescription(), _face_descriptor(), self.frames)
+        self.assertEqual(result.buffer_descriptor.data_type, "float16")
+        np.testing.assert_allclose(result.data.astype(np.float32), self.frames, atol=1e-3)
+
+    def test_uint8_error_within_half_step(self):
+        serializer = MotionEntryUInt8QuantizedSerializer()
+        result = serializer.serialize(None, MotionDataDescription(), _face_descriptor(), self.frames)
+        data = np.asarray(result.data)
+        self.assertEqual(result.buffer_descriptor.metadata["encoding"], "uint8_affine")
+        self.assertEqual(len(data), 52 * 8 + self.frames.size)
+        minimum = data[:52 * 4].view("<f4")
+        scale = data[52 * 4:52 * 8].view("<f4")
+        values = data[52 * 8:].reshape(self.frames.shape)
+        decoded = minimum + values * scale
+        self.assertTrue(np.all(np.abs(decoded - self.frames) <= scale / 2 + 1e-6))
+
+    def test_uint8_constant_channel(self):
+        frames = np.full((10, 52), 0.25, dtype=np.float32)
+        result = MotionEntryUInt8QuantizedSerializer().serialize(None, MotionDataDescription(),
+                                                                 _face_descriptor(), frames)
+        data = np.asarray(result.data)
+        np.testing.assert_array_equal(data[:52 * 4].view("<f4"), frames[0])
+        np.testing.assert_array_equal(data[52 * 8:], 0)
+
+    def test_delta_does_not_drift(self):
+        serializer = MotionEntryDeltaInt8Serializer()
+        context = serializer.create_context()
+        decoded = np.zeros(52, dtype=np.float32)
+        step = None
+        for chunk in np.split(self.frames, 6):
+            result = serializer.serialize(context, MotionDataDescription(), _face_descriptor(), chunk)
+            step = float(result.buffer_descriptor.metadata["step"])
+            for delta, frame in zip(result.data, chunk):
+                decoded = decoded + delta.astype(np.float32) * np.float32(step)
+                self.assertTrue(np.all(np.abs(decoded - frame) <= step / 2 + 1e-6))
+        serializer.reset(context)
+        result = serializer.serialize(context, MotionDataDescription(), _face_descriptor(), self.frames[:1])
+        np.testing.assert_allclose(result.data[0] * step, self.frames[0], atol=step / 2 + 1e-6)
+
+
+class TestEncodedMotionData(unittest.TestCase):
+
+    def setUp(self):
+        self.definition = DataBundleDefinition()
+        self.definition.add_entry(DataBundleEntry.create_framed_entry(
+            name="arkit_face", shape=[1, 52], time_axis=0, sample_rate=30,
+            channel_axis=1, channel_names=[f"blend_{i}" for i in range(52)]))
+        self.definition.add_entry(DataBundleEntry.create_audio_entry(
+            name="avatar_audio", channel_num=1, sample_rate=24000))
+
+    def _make_bundle(self, frames, speech_id, end=False):
+        rng = np.random.default_rng(frames)
+        bundle = DataBundle(self.definition)
+        bundle.set_data("arkit_face", rng.random((frames, 52), dtype=np.float32))
+        t = np.arange(frames * 800, dtype=np.float32) / 24000
+        bundle.set_data("avatar_audio", (0.5 * np.sin(2 * np.pi * 440 * t))[None, :].astype(np.float32))
+        bundle.add_meta("speech_id", speech_id)
+        bundle.end_of_stream = end
+        return bundle
+
+    def test_delta_state_resets_per_batch(self):
+        serializer = MotionDataSerializer()
+        serializer.register_audio_data("avatar_audio")
+        serializer.register_data("arkit_face", "arkit_face", "float32", create_entry_serializer("delta_int8"))
+        for speech_id in ("a", "b"):
+            bundle = self._make_bundle(8, speech_id)
+            description, records = _read_records(serializer.serialize(bundle))
+            desc, data = records["arkit_face"]
+            self.assertEqual(desc["metadata"]["encoding"], "delta_int8")
+            deltas = np.frombuffer(data, dtype=np.int8).reshape(8, 52)
+            decoded = np.cumsum(deltas.astype(np.float32) * float(desc["metadata"]["step"]), axis=0)
+            np.testing.assert_allclose(decoded, bundle.get_data("arkit_face"), atol=1 / 254 + 1e-6)
+
+    def test_unknown_encoding(self):
+        serializer = MotionDataSerializer()
+        with self.assertRaises(ValueError):
+            serializer.register_audio_data("avatar_audio", "mp3")
+        with self.assertRaises(ValueError):
+            create_entry_serializer("int4")
+
+    @unittest.skipIf(av is None, "PyAV with libopus is not installed")
+    def test_opus_stream(self):
+        serializer = MotionDataSerializer()
+        serializer.register_audio_data("avatar_audio", "opus")
+        serializer.register_data("arkit_face", "arkit_face", "float32")
+        serializer.serialize(self.definition)
+        decoder = av.CodecContext.create("libopus", "r")
+        decoder.sample_rate = 24000
+        decoder.layout = "mono"
+        encoded_samples = 0
+        decoded = []
+        inputs = []
+        chunks = [("a", 7, False), ("a", 11, False), ("a", 5, True)]
+        for speech_id, frames, end in chunks:
+            bundle = self._make_bundle(frames, speech_id, end)
+            inputs.append(bundle.get_data("avatar_audio")[0])
+            _, records = _read_records(serializer.serialize(bundle))
+            desc, data = records["audio"]
+            self.assertEqual(desc["metadata"]["encoding"], "opus")
+            frame_size = int(desc["metadata"]["frame_size"])
+            pre_skip = int(desc["metadata"]["pre_skip"])
+            packets = _read_opus_packets(data)
+            self.assertEqual(desc["shape"][desc["timeline_axis"]], len(packets) * frame_size)
+            encoded_samples += len(packets) * frame_size
+            for packet in packets:
+                for frame in decoder.decode(av.Packet(packet)):
+                    decoded.append(frame.to_ndarray().reshape(-1))
+        total_samples = sum(frames * 800 for _, frames, _ in chunks)
+        # every sample is sent once the batch ends, with the padded last frame and the encoder lookahead
+        self.assertGreaterEqual(encoded_samples, total_samples)
+        self.assertLessEqual(encoded_samples - total_samples, 2 * 480)
+        # libopus looks ahead 6.5ms
+        self.assertEqual(pre_skip, 156)
+        # after the pre skip the decoded audio lines up with the input, the decoder outputs 48khz
+        step = decoder.sample_rate // 24000
+        decoded_audio = np.concatenate(decoded)
+        expected = np.concatenate(inputs)
+        audio = decoded_audio[pre_skip * step::step][:total_samples]
+        self.assertEqual(audio.shape[0], total_samples)
+        self.assertGreater(np.corrcoef(audio, expected)[0, 1], 0.95)
+        # without the pre skip the audio does not line up
+        self.assertLess(np.corrcoef(decoded_audio[::step][:total_samples], expected)[0, 1], 0.5)
+        # a new batch starts a new encoder with no pending samples
+        _, records = _read_records(serializer.serialize(self._make_bundle(3, "b")))
+        desc, data = records["audio"]
+        self.assertEqual(desc["shape"][desc["timeline_axis"]], 2400 // 480 * 480)
+
+
+if __name__ == '__main__':
+    unittest.main()
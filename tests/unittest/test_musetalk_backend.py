@@ -0,0 +1,107 @@
+import unittest
+
+try:
+    import torch
+    from torch import nn
+    from handlers.avatar.musetalk.avatar_musetalk_backend import (CompiledBackend, EagerBackend,
+                                                                  create_backend, select_backend)
+except ImportError:
+    torch = None
+
+
+if torch is not None:
+    class _TinyUnetVae(nn.Module):
+        """Stand-in for pe, unet and vae decode with the MuseTalk input and output layout."""
+
+        def __init__(self):
+            super().__init__()
+            self.audio = nn.Linear(384, 8)
+            self.unet = nn.Conv2d(8, 4, 3, padding=1)
+            self.decode = nn.ConvTranspose2d(4, 3, 4, stride=4)
+
+        def forward(self, latent_batch, whisper_chunks):
+            audio_feature = self.audio(whisper_chunks).mean(dim=1)[:, :, None, None]
+            pred_latents = self.unet(latent_batch + audio_feature)
+            return (self.decode(pred_latents) / 2 + 0.5).clamp(0, 1)
+
+
+def _make_inputs(batch_size, device="cpu"):
+    generator = torch.Generator().manual_seed(batch_size)
+    latents = torch.randn(batch_size, 8, 8, 8, generator=generator)
+    whisper_chunks = torch.randn(batch_size, 50, 384, generator=generator)
+    return latents.to(device), whisper_chunks.to(device)
+
+
+@unittest.skipIf(torch is None, "torch is not installed")
+class TestMuseTalkExecutionBackend(unittest.TestCase):
+
+    def setUp(self):
+        torch.manual_seed(0)
+        self.model = _TinyUnetVae().eval()
+
+    def test_unknown_backend(self):
+        with self.assertRaises(ValueError):
+            create_backend("tensorrt", self.model)
+
+    @torch.no_grad()
+    def test_explicit_eager(self):
+        backend = select_backend(self.model, _make_inputs, [5, 0], "cpu", backend="eager")
+        self.assertIsInstance(backend, EagerBackend)
+        inputs = _make_inputs(5)
+        torch.testing.assert_close(backend(*inputs), self.model(*inputs))
+
+    @torch.no_grad()
+    def test_compile_matches_eager(self):
+        try:
+            backend = create_backend("compile", self.model)
+            backend.prepare(_make_inputs, [5])
+        except Exception as e:
+            self.skipTest(f"torch.compile is not usable here: {e}")
+        self.assertIsInstance(backend, CompiledBackend)
+        inputs = _make_inputs(5)
+        torch.testing.assert_close(backend(*inputs), self.model(*inputs), rtol=1e-4, atol=1e-5)
+
+    @torch.no_grad()
+    def test_compile_serves_unprepared_sizes_without_compiling(self):
+        from torch._dynamo.utils import counters
+        try:
+            backend = create_backend("compile", self.model)
+            backend.prepare(_make_inputs, [5, 10])
+        except Exception as e:
+            self.skipTest(f"torch.compile is not usable here: {e}")
+        graphs = counters["stats"]["unique_graphs"]
+        # end of speech remainders, merged sessions and batches larger than any prepared size
+        for batch_size in (3, 8, 13):
+            inputs = _make_inputs(batch_size)
+            output = backend(*inputs)
+            self.assertEqual(output.shape[0], batch_size)
+            torch.testing.assert_close(output, self.model(*inputs), rtol=1e-4, atol=1e-5)
+        self.assertEqual(counters["stats"]["unique_graphs"], graphs)
+
+    @torch.no_grad()
+    def test_auto_selects_working_backend(self):
+        backend = select_backend(self.model, _make_inputs, [5], "cpu", runs=1)
+        self.assertIn(backend.name, ("eager", "compile"))
+        inputs = _make_inputs(5)
+        torch.testing.assert_close(backend(*inputs), self.model(*inputs), rtol=1e-4, atol=1e-5)
+
+    @torch.no_grad()
+    def test_failing_backend_falls_back_to_eager(self):
+        def broken(latent_batch, whisper_chunks):
+            raise RuntimeError("broken")
+        backend = select_backend(broken, _make_inputs, [5], "cpu", backend="compile")
+        self.assertEqual(backend.name, "eager")
+
+    @unittest.skipIf(torch is None or not torch.cuda.is_available(), "cuda is not available")
+    @torch.no_grad()
+    def test_cuda_graph_pads_to_captured_batch(self):
+        model = self.model.cuda()
+        backend = create_backend("cuda_graph", model)
+        backend.prepare(lambda batch_size: _make_inputs(batch_size, "cuda"), [5, 20])
+        for batch_size in (3, 5, 12, 20, 25):
+            inputs = _make_inputs(batch_size, "cuda")
+            torch.testing.assert_close(backend(*inputs), model(*inputs), rtol=1e-4, atol=1e-5)
+
+
+if __name__ == '__main__':
+    unittest.main()
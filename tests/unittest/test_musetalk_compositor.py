@@ -0,0 +1,73 @@
+import unittest
+
+import cv2
+import numpy as np
+
+try:
+    import torch
+    from handlers.avatar.musetalk.avatar_musetalk_compositor import NumpyFrameCompositor, TorchFrameCompositor
+except ImportError:
+    torch = None
+
+
+def _reference_blend(frame, face, face_box, mask, crop_box):
+    x1, y1, x2, y2 = face_box
+    x_s, y_s, x_e, y_e = crop_box
+    face_large = frame[y_s:y_e, x_s:x_e].copy()
+    face_large[y1 - y_s:y2 - y_s, x1 - x_s:x2 - x_s] = cv2.resize(face, (x2 - x1, y2 - y1))
+    mask3 = np.stack([mask / 255.0] * 3, axis=2)
+    out = frame.copy()
+    out[y_s:y_e, x_s:x_e] = face_large * mask3 + frame[y_s:y_e, x_s:x_e] * (1 - mask3)
+    return out
+
+
+@unittest.skipIf(torch is None, "torch is not installed")
+class TestTorchFrameCompositor(unittest.TestCase):
+
+    def setUp(self):
+        rng = np.random.default_rng(0)
+        frames = [rng.integers(0, 255, (120, 160, 3), dtype=np.uint8) for _ in range(3)]
+        masks = [rng.integers(0, 255, (70, 60), dtype=np.uint8) for _ in range(3)]
+        self.frames = frames + frames[::-1]
+        self.masks = masks + masks[::-1]
+        self.face_boxes = [(50, 30, 90, 80)] * 6
+        self.crop_boxes = [(40, 20, 100, 90)] * 6
+        self.face = rng.integers(0, 255, (64, 64, 3), dtype=np.uint8)
+        self.compositor = TorchFrameCompositor(self.frames, self.face_boxes, self.masks, self.crop_boxes)
+
+    def test_matches_reference_blend(self):
+        for idx in range(8):
+            i = idx % 6
+            expected = _reference_blend(self.frames[i], self.face, self.face_boxes[i],
+                                        self.masks[i], self.crop_boxes[i])
+            output = self.compositor.compose(self.face, idx)
+            self.assertEqual(output.dtype, np.uint8)
+            self.assertLessEqual(np.abs(output.astype(int) - expected.astype(int)).max(), 1)
+
+    def test_negative_stride_face(self):
+        # the generated faces arrive as image[..., ::-1] views
+        rgb_face = np.ascontiguousarray(self.face[..., ::-1])
+        face_view = rgb_face[..., ::-1]
+        self.assertLess(face_view.strides[-1], 0)
+        expected = self.compositor.compose(self.face, 2)
+        np.testing.assert_array_equal(self.compositor.compose(face_view, 2), expected)
+
+    def test_frames_are_shared_and_untouched(self):
+        self.assertEqual(self.compositor.frames.shape[0], 3)
+        original = self.frames[0].copy()
+        self.compositor.compose(self.face, 0)
+        np.testing.assert_array_equal(self.compositor.get_frame(0).numpy(), original)
+
+    def test_fixed_point_matches_reference_blend(self):
+        compositor = NumpyFrameCompositor(self.frames, self.face_boxes, self.masks, self.crop_boxes)
+        for idx in range(8):
+            i = idx % 6
+            expected = _reference_blend(self.frames[i], self.face, self.face_boxes[i],
+                                        self.masks[i], self.crop_boxes[i])
+            output = compositor.compose(self.face, idx)
+            self.assertLessEqual(np.abs(output.astype(int) - expected.astype(int)).max(), 1)
+        self.assertIsNot(compositor.compose(self.face, 0), self.frames[0])
+
+
+if __name__ == '__main__':
+    unittest.main()
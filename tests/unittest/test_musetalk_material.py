@@ -0,0 +1,74 @@
+import os
+import tempfile
+import unittest
+
+import numpy as np
+
+try:
+    import torch
+    from handlers.avatar.musetalk.avatar_musetalk_compositor import TorchFrameCompositor
+    from handlers.avatar.musetalk.avatar_musetalk_material import load_material, material_exists, save_material
+except ImportError:
+    torch = None
+
+
+@unittest.skipIf(torch is None, "torch is not installed")
+class TestMuseTalkMaterial(unittest.TestCase):
+
+    def setUp(self):
+        rng = np.random.default_rng(0)
+        frames = [rng.integers(0, 255, (48, 64, 3), dtype=np.uint8) for _ in range(3)]
+        latents = [rng.standard_normal((1, 8, 4, 4)).astype(np.float16) for _ in range(3)]
+        self.frames = frames + frames[::-1]
+        self.latents = latents + latents[::-1]
+        self.masks = [rng.integers(0, 255, (20 + i, 30 - i), dtype=np.uint8) for i in range(6)]
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.material_dir = self.tmp_dir.name
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def test_round_trip(self):
+        self.assertFalse(material_exists(self.material_dir))
+        save_material(self.material_dir, self.frames, self.masks, self.latents)
+        self.assertTrue(material_exists(self.material_dir))
+        material = load_material(self.material_dir)
+
+        self.assertIsInstance(material.frames, np.memmap)
+        self.assertEqual(material.frames.shape, (3, 48, 64, 3))
+        self.assertEqual(material.frame_index, [0, 1, 2, 2, 1, 0])
+        self.assertIs(material.frame_list_cycle[0], material.frame_list_cycle[5])
+        for expected, frame in zip(self.frames, material.frame_list_cycle):
+            np.testing.assert_array_equal(frame, expected)
+        for expected, mask in zip(self.masks, material.mask_list_cycle):
+            np.testing.assert_array_equal(mask, expected)
+        self.assertEqual(material.latents.dtype, np.float16)
+        for expected, i in zip(self.latents, material.latent_index):
+            np.testing.assert_array_equal(material.latents[i], expected)
+        self.assertEqual([name for name in os.listdir(self.material_dir) if "tmp" in name], [])
+
+    def test_repeated_masks_are_stored_once(self):
+        masks = self.masks[:3] + self.masks[:3][::-1]
+        save_material(self.material_dir, self.frames, masks, self.latents)
+        material = load_material(self.material_dir)
+        stored = np.load(os.path.join(self.material_dir, "masks.npy"))
+        self.assertEqual(stored.size, sum(mask.size for mask in self.masks[:3]))
+        for expected, mask in zip(masks, material.mask_list_cycle):
+            np.testing.assert_array_equal(mask, expected)
+
+    def test_torch_compositor_uses_mapped_frames(self):
+        save_material(self.material_dir, self.frames, self.masks, self.latents)
+        material = load_material(self.material_dir)
+        crop_boxes = [(5, 5, 5 + mask.shape[1], 5 + mask.shape[0]) for mask in self.masks]
+        compositor = TorchFrameCompositor(material.frame_list_cycle, [(10, 10, 20, 20)] * 6,
+                                          material.mask_list_cycle, crop_boxes,
+                                          frame_stack=material.frames, frame_index=material.frame_index)
+        self.assertEqual(compositor.frames.data_ptr(), material.frames.ctypes.data)
+        face = np.zeros((16, 16, 3), dtype=np.uint8)
+        output = compositor.compose(face, 4)
+        np.testing.assert_array_equal(output[:10], self.frames[4][:10])
+        np.testing.assert_array_equal(material.frame_list_cycle[4], self.frames[4])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,122 @@
+import os
+import tempfile
+import unittest
+
+import numpy as np
+
+try:
+    import cv2
+    from handlers.avatar.musetalk.avatar_musetalk_preparation import (AvatarPreparer, FaceChunk, PreparationSettings,
+                                                                      coord_placeholder, read_avatar_frames)
+except ImportError:
+    cv2 = None
+
+
+def _fake_analyze(frames, settings):
+    """Face box from the frame content, frames with a zero first pixel have no face."""
+    chunk = FaceChunk(coords=[], masks=[], mask_coords=[], crops=[])
+    for frame in frames:
+        value = int(frame[0, 0, 0])
+        bbox = coord_placeholder if value == 0 else (value % 8, value % 8, 16, 16 + settings.extra_margin)
+        if bbox != coord_placeholder:
+            chunk.crops.append(np.full((256, 256, 3), value, dtype=np.uint8))
+        chunk.coords.append(bbox)
+        chunk.masks.append(np.full((4 + value % 3, 5), value, dtype=np.uint8))
+        chunk.mask_coords.append((0, 0, 5, 4 + value % 3))
+    return chunk
+
+
+def _fake_encode(crops):
+    return np.stack([np.full((8, 4, 4), crop[0, 0, 0], dtype=np.float16) for crop in crops])
+
+
+class _CountingAnalyze:
+    def __init__(self):
+        self.frames = 0
+
+    def __call__(self, frames, settings):
+        self.frames += len(frames)
+        return _fake_analyze(frames, settings)
+
+
+def _make_frames(values):
+    return [np.full((24, 32, 3), value, dtype=np.uint8) for value in values]
+
+
+@unittest.skipIf(cv2 is None, "opencv is not installed")
+class TestAvatarPreparer(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.cache_dir = os.path.join(self.tmp_dir.name, "prepare_cache")
+        self.settings = PreparationSettings()
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def _prepare(self, frames, analyze_fn=_fake_analyze, workers=0, settings=None):
+        preparer = AvatarPreparer(self.cache_dir, settings or self.settings, _fake_encode,
+                                  analyze_fn=analyze_fn, workers=workers, chunk_size=4)
+        return preparer.prepare(frames)
+
+    def _assert_prepared(self, prepared, values):
+        self.assertEqual(len(prepared.coord_list), len(values))
+        self.assertEqual(len(prepared.mask_list), len(values))
+        face_values = [value for value in values if value != 0]
+        self.assertEqual([int(latent[0, 0, 0]) for latent in prepared.latent_list], face_values)
+        for value, bbox, mask in zip(values, prepared.coord_list, prepared.mask_list):
+            self.assertEqual(bbox == coord_placeholder, value == 0)
+            self.assertEqual(int(mask[0, 0]), value)
+
+    def test_prepare_in_process(self):
+        values = [1, 2, 0, 3, 4, 5, 0, 6, 7, 8]
+        prepared = self._prepare(_make_frames(values))
+        self._assert_prepared(prepared, values)
+        self.assertEqual(prepared.cached_frames, 0)
+
+    def test_resume_from_cache(self):
+        values = [1, 2, 3, 4, 5, 6, 7]
+        self._prepare(_make_frames(values))
+        analyze = _CountingAnalyze()
+        prepared = self._prepare(_make_frames(values), analyze_fn=analyze)
+        self.assertEqual(analyze.frames, 0)
+        self.assertEqual(prepared.cached_frames, len(values))
+        self._assert_prepared(prepared, values)
+
+    def test_extend_analyzes_new_frames_only(self):
+        values = [1, 2, 3, 4, 5, 6, 7, 8]
+        self._prepare(_make_frames(values))
+        analyze = _CountingAnalyze()
+        extended = values + [9, 10, 11]
+        prepared = self._prepare(_make_frames(extended), analyze_fn=analyze)
+        self.assertEqual(analyze.frames, 3)
+        self._assert_prepared(prepared, extended)
+
+    def test_settings_change_invalidates_cache(self):
+        values = [1, 2, 3, 4]
+        self._prepare(_make_frames(values))
+        analyze = _CountingAnalyze()
+        prepared = self._prepare(_make_frames(values), analyze_fn=analyze,
+                                 settings=PreparationSettings(extra_margin=20))
+        self.assertEqual(analyze.frames, 4)
+        self.assertEqual(prepared.coord_list[0][3], 36)
+
+    def test_prepare_with_worker_processes(self):
+        values = [1, 0, 2, 3, 4, 5, 6, 7, 8, 9]
+        prepared = self._prepare(_make_frames(values), workers=2)
+        self._assert_prepared(prepared, values)
+        self.assertEqual([name for name in os.listdir(self.cache_dir) if "tmp" in name], [])
+
+    def test_read_image_directory(self):
+        image_dir = os.path.join(self.tmp_dir.name, "images")
+        os.makedirs(image_dir)
+        for i, frame in enumerate(_make_frames([30, 10, 20])):
+            cv2.imwrite(os.path.join(image_dir, f"{i:08d}.png"), frame)
+        with open(os.path.join(image_dir, "notes.txt"), "w") as f:
+            f.write("not a frame")
+        frames = read_avatar_frames(image_dir)
+        self.assertEqual([int(frame[0, 0, 0]) for frame in frames], [30, 10, 20])
+
+
+if __name__ == '__main__':
+    unittest.main()
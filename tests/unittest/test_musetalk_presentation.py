@@ -0,0 +1,61 @@
+import threading
+import time
+import unittest
+
+from handlers.avatar.musetalk.avatar_musetalk_presentation import PresentationScheduler
+
+
+class TestPresentationScheduler(unittest.TestCase):
+
+    def setUp(self):
+        self.stop_event = threading.Event()
+
+    def test_slots_follow_lead_and_stay_continuous(self):
+        scheduler = PresentationScheduler(fps=25, lead_frames=5, max_ahead_frames=25)
+        scheduler.start()
+        first = scheduler.reserve(5, self.stop_event)
+        self.assertGreaterEqual(first[0], 5)
+        self.assertEqual(first, list(range(first[0], first[0] + 5)))
+        self.assertEqual(scheduler.reserve(5, self.stop_event)[0], first[-1] + 1)
+
+    def test_reserve_waits_when_too_far_ahead(self):
+        scheduler = PresentationScheduler(fps=100, lead_frames=0, max_ahead_frames=10)
+        scheduler.start()
+        start_time = time.perf_counter()
+        scheduler.reserve(10, self.stop_event)
+        scheduler.reserve(5, self.stop_event)
+        # slot 10 may only be handed out 10 frames before it is due
+        self.assertLess(time.perf_counter() - start_time, 0.05)
+        scheduler.reserve(5, self.stop_event)
+        self.assertGreaterEqual(time.perf_counter() - start_time, 0.04)
+
+    def test_reserve_returns_none_on_stop(self):
+        scheduler = PresentationScheduler(fps=25, lead_frames=0, max_ahead_frames=1)
+        scheduler.start()
+        scheduler.reserve(20, self.stop_event)
+        threading.Timer(0.05, self.stop_event.set).start()
+        self.assertIsNone(scheduler.reserve(1, self.stop_event))
+
+    def test_wait_for_slot(self):
+        scheduler = PresentationScheduler(fps=50)
+        scheduler.start()
+        self.assertTrue(scheduler.wait_for_slot(3, self.stop_event))
+        self.assertGreaterEqual(time.perf_counter(), scheduler.get_frame_time(3))
+        self.stop_event.set()
+        self.assertFalse(scheduler.wait_for_slot(100, self.stop_event))
+
+    def test_lag_metrics(self):
+        scheduler = PresentationScheduler(fps=25)
+        scheduler.start()
+        scheduler.record_presented(10, 10)
+        scheduler.record_presented(11, 13)
+        scheduler.record_presented(12, 14)
+        metrics = scheduler.get_metrics()
+        self.assertEqual(metrics.presented_frames, 3)
+        self.assertEqual(metrics.late_frames, 2)
+        self.assertEqual(metrics.lag_frames, 2)
+        self.assertEqual(metrics.max_lag_frames, 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,100 @@
+import threading
+import time
+import unittest
+
+try:
+    import torch
+    from handlers.avatar.musetalk.avatar_musetalk_scheduler import MuseTalkInferenceScheduler
+except ImportError:
+    torch = None
+
+
+class _FakeGenerator:
+    """Returns the cycle index as the generated face and records the batch sizes."""
+
+    def __init__(self, delay: float = 0.0):
+        self.batch_sizes = []
+        self.delay = delay
+
+    def __call__(self, whisper_chunks, idx_list):
+        assert whisper_chunks.shape[0] == len(idx_list)
+        self.batch_sizes.append(len(idx_list))
+        time.sleep(self.delay)
+        return [idx * 10 for idx in idx_list]
+
+
+@unittest.skipIf(torch is None, "torch is not installed")
+class TestMuseTalkInferenceScheduler(unittest.TestCase):
+
+    def _start(self, generator, **kwargs):
+        scheduler = MuseTalkInferenceScheduler(generator, **kwargs)
+        scheduler.start()
+        self.addCleanup(scheduler.stop)
+        return scheduler
+
+    def test_sessions_share_batches(self):
+        generator = _FakeGenerator()
+        scheduler = self._start(generator, max_batch_size=20, max_wait_ms=200)
+        futures = [scheduler.submit(torch.zeros(5, 50, 384), range(i * 5, i * 5 + 5)) for i in range(4)]
+        for i, future in enumerate(futures):
+            self.assertEqual(future.result(timeout=5), [idx * 10 for idx in range(i * 5, i * 5 + 5)])
+        self.assertEqual(generator.batch_sizes, [20])
+
+    def test_batch_size_limit(self):
+        generator = _FakeGenerator()
+        scheduler = self._start(generator, max_batch_size=8, max_wait_ms=200)
+        futures = [scheduler.submit(torch.zeros(5, 50, 384), range(5)) for _ in range(3)]
+        for future in futures:
+            future.result(timeout=5)
+        self.assertEqual(generator.batch_sizes, [5, 5, 5])
+
+    def test_deadline_runs_partial_batch(self):
+        generator = _FakeGenerator()
+        scheduler = self._start(generator, max_batch_size=20, max_wait_ms=20)
+        start_time = time.perf_counter()
+        self.assertEqual(scheduler.submit(torch.zeros(2, 50, 384), [3, 4]).result(timeout=5), [30, 40])
+        self.assertLess(time.perf_counter() - start_time, 1.0)
+        metrics = scheduler.get_metrics()
+        self.assertEqual(metrics.frames, 2)
+        self.assertEqual(metrics.batches, 1)
+        self.assertGreater(metrics.p95_latency, 0)
+
+    def test_concurrent_sessions(self):
+        generator = _FakeGenerator(delay=0.01)
+        scheduler = self._start(generator, max_batch_size=16, max_wait_ms=5)
+        errors = []
+
+        def session(offset):
+            for start in range(0, 20, 4):
+                idx_list = [offset + start + i for i in range(4)]
+                if scheduler.submit(torch.zeros(4, 50, 384), idx_list).result(timeout=5) != \
+                        [idx * 10 for idx in idx_list]:
+                    errors.append(offset)
+
+        threads = [threading.Thread(target=session, args=(offset,)) for offset in (0, 100, 200, 300)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(errors, [])
+        self.assertEqual(sum(generator.batch_sizes), 80)
+        self.assertLess(len(generator.batch_sizes), 20)
+
+    def test_errors_reach_every_session(self):
+        def fail(whisper_chunks, idx_list):
+            raise RuntimeError("out of memory")
+
+        scheduler = self._start(fail, max_batch_size=8, max_wait_ms=50)
+        futures = [scheduler.submit(torch.zeros(2, 50, 384), [0, 1]) for _ in range(2)]
+        for future in futures:
+            with self.assertRaises(RuntimeError):
+                future.result(timeout=5)
+
+    def test_mismatched_request(self):
+        scheduler = MuseTalkInferenceScheduler(_FakeGenerator())
+        with self.assertRaises(ValueError):
+            scheduler.submit(torch.zeros(2, 50, 384), [0])
+
+
+if __name__ == '__main__':
+    unittest.main()
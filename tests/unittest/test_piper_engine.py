@@ -0,0 +1,116 @@
+import threading
+import time
+import unittest
+from types import SimpleNamespace
+from unittest import mock
+
+import numpy as np
+
+try:
+    import piper
+    from handlers.tts.pipertts.piper_engine import PiperInProcessEngine
+except ImportError:
+    piper = None
+
+
+class _ExclusiveCheck:
+    """Records how many threads were inside at the same time, espeak-ng allows only one."""
+
+    def __init__(self):
+        self.active = 0
+        self.max_active = 0
+        self._lock = threading.Lock()
+
+    def __enter__(self):
+        with self._lock:
+            self.active += 1
+            self.max_active = max(self.max_active, self.active)
+
+    def __exit__(self, *args):
+        time.sleep(0.002)
+        with self._lock:
+            self.active -= 1
+
+
+class _FakeSession:
+    """
+    Every phoneme id becomes 100 samples of a tone followed by a near silent tail, padded
+    rows decode to near silence as well.
+    """
+
+    def __init__(self, check):
+        self.check = check
+        self.batch_sizes = []
+
+    def run(self, output_names, inputs):
+        with self.check:
+            self.batch_sizes.append(inputs["input"].shape[0])
+            samples = inputs["input"].shape[1] * 100 + 50
+            audio = np.zeros((inputs["input"].shape[0], 1, 1, samples), dtype=np.float32)
+            for i, (ids, length) in enumerate(zip(inputs["input"], inputs["input_lengths"])):
+                tone = np.sin(np.arange(length * 100, dtype=np.float32) * ids[:length].repeat(100) / 100)
+                audio[i, 0, 0, :length * 100] = 0.5 * tone
+                audio[i, 0, 0, length * 100:] = 1e-5
+            return [audio]
+
+
+class _FakeVoice:
+    def __init__(self):
+        self.phonemize_check = _ExclusiveCheck()
+        self.run_check = _ExclusiveCheck()
+        self.config = SimpleNamespace(sample_rate=24000, num_speakers=1, phoneme_id_map={"_": [0]})
+        self.session = _FakeSession(self.run_check)
+
+    def phonemize(self, text):
+        with self.phonemize_check:
+            return [list(sentence) for sentence in text.split("|") if sentence]
+
+    def phonemes_to_ids(self, phonemes):
+        return [ord(phoneme) % 50 + 1 for phoneme in phonemes]
+
+
+def _create_engine(voice):
+    with mock.patch("piper.PiperVoice.load", return_value=voice):
+        return PiperInProcessEngine("voice.onnx", "voice.onnx.json", output_sample_rate=24000)
+
+
+@unittest.skipIf(piper is None, "piper-tts is not installed")
+class TestPiperEngine(unittest.TestCase):
+
+    def test_batched_matches_single(self):
+        texts = ["ab", "abcdefgh", "xyz|abcd"]
+        voice = _FakeVoice()
+        engine = _create_engine(voice)
+        singles = [engine.synthesize(text) for text in texts]
+        batched = engine.synthesize_batch(texts)
+        self.assertEqual(voice.session.batch_sizes, [1, 1, 2, 4])
+        for single, audio in zip(singles, batched):
+            np.testing.assert_allclose(audio, single, atol=1e-6)
+        self.assertEqual(singles[0].shape[0], 200)
+
+    def test_concurrent_sessions(self):
+        voice = _FakeVoice()
+        engine = _create_engine(voice)
+        texts = [f"{'abcdefgh'[:i + 1]}|{'xyz'[:i % 3 + 1]}" for i in range(8)]
+        expected = [engine.synthesize(text) for text in texts]
+        engine._phoneme_ids.cache_clear()
+        outputs = {}
+
+        def run_session(index):
+            outputs[index] = [engine.synthesize_batch(texts[index:index + 2]) for _ in range(5)]
+
+        threads = [threading.Thread(target=run_session, args=(i,)) for i in range(6)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join(timeout=10)
+        self.assertEqual(voice.phonemize_check.max_active, 1)
+        self.assertEqual(voice.run_check.max_active, 1)
+        for index in range(6):
+            for batch in outputs[index]:
+                for audio, single in zip(batch, expected[index:index + 2]):
+                    np.testing.assert_allclose(audio, single, atol=1e-6)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,5 +1,6 @@
 import unittest
 import numpy as np
+from engine_utils.audio_resampler import RESAMPLER_BACKEND_NUMPY, resample
 from handlers.avatar.liteavatar.media.speech_audio_processor import SpeechAudioProcessor
 from handlers.avatar.liteavatar.model import SpeechAudio
 
@@ -53,6 +54,35 @@ class TestSpeechAudioProcessor(unittest.TestCase):
         self.assertEqual(len(np.frombuffer(slices[0].algo_audio_data, dtype=np.int16)), 8000)
         self.assertEqual(len(np.frombuffer(slices[1].algo_audio_data, dtype=np.int16)), 8000)
 
+    def test_get_speech_audio_slice_empty_end_marker(self):
+        audio_data = np.array([1] * 16000, dtype=np.int16).tobytes()
+        speech_audio = SpeechAudio(audio_data=audio_data, end_of_speech=False, speech_id=1, sample_rate=16000)
+        self.assertEqual(len(self.processor.get_speech_audio_slice(speech_audio)), 1)
+        end_audio = SpeechAudio(audio_data=bytes(), end_of_speech=True, speech_id=1, sample_rate=16000)
+        slices = self.processor.get_speech_audio_slice(end_audio)
+        self.assertEqual(len(slices), 1)
+        self.assertTrue(slices[0].end_of_speech)
+        self.assertEqual(len(slices[0].play_audio_data), 0)
+        self.assertEqual(len(slices[0].algo_audio_data), 0)
+
+    def test_slices_resampled_as_one_stream(self):
+        t = np.arange(16000 * 3) / 16000
+        audio = (np.sin(2 * np.pi * 220 * t) * 16000).astype(np.int16)
+        slices = []
+        for i, chunk in enumerate(np.split(audio, 6)):
+            speech_audio = SpeechAudio(audio_data=chunk.tobytes(), end_of_speech=i == 5, speech_id=1,
+                                       sample_rate=16000)
+            slices.extend(self.processor.get_speech_audio_slice(speech_audio))
+        self.assertEqual([len(audio_slice.algo_audio_data) for audio_slice in slices], [16000] * 3)
+        output = np.concatenate([np.frombuffer(s.algo_audio_data, dtype=np.int16) for s in slices]).astype(np.float32)
+        whole = resample(audio.astype(np.float32) / np.iinfo(np.int16).max, 16000, 8000,
+                         backend=RESAMPLER_BACKEND_NUMPY)
+        expected = (whole * np.iinfo(np.int16).max).astype(np.int16).astype(np.float32)
+        # the first slice is front padded by the filter delay, the rest follows the one piece resample
+        delay = int(np.argmax(np.abs(output) > 0))
+        self.assertLess(delay, 16)
+        np.testing.assert_allclose(output[delay:], expected[:len(expected) - delay], atol=2)
+
 
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,200 @@
+import json
+import threading
+import time
+import unittest
+from types import SimpleNamespace
+
+import numpy as np
+
+try:
+    import dashscope
+    from dashscope.audio.tts_v2 import AudioFormat, ResultCallback, SpeechSynthesizer
+    from websockets.exceptions import ConnectionClosed
+    from websockets.sync.server import serve
+except ImportError:
+    dashscope = None
+
+from handlers.tts.bailian_tts.synthesizer_pool import SynthesizerPool
+
+
+class _FakeDashScopeServer:
+    """Local websocket stand-in that speaks the DashScope duplex tts protocol."""
+
+    def __init__(self):
+        self.connections = []
+        self.run_tasks = 0
+        self._server = serve(self._handle, "127.0.0.1", 0, close_timeout=0.1)
+        self.url = f"ws://127.0.0.1:{self._server.socket.getsockname()[1]}"
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+
+    def _handle(self, websocket):
+        self.connections.append(websocket)
+        try:
+            self._serve_requests(websocket)
+        except ConnectionClosed:
+            pass
+
+    def _serve_requests(self, websocket):
+        for message in websocket:
+            request = json.loads(message)
+            task_id = request["header"]["task_id"]
+            action = request["header"]["action"]
+            if action == "run-task":
+                self.run_tasks += 1
+                websocket.send(json.dumps({"header": {"event": "task-started", "task_id": task_id}}))
+            elif action == "continue-task":
+                websocket.send(bytes(4800))
+                websocket.send(json.dumps({"header": {"event": "result-generated", "task_id": task_id}}))
+            elif action == "finish-task":
+                websocket.send(json.dumps({"header": {"event": "task-finished", "task_id": task_id}}))
+
+    def close_connections(self):
+        for websocket in self.connections:
+            websocket.close()
+
+    def shutdown(self):
+        self._server.shutdown()
+
+
+if dashscope is not None:
+    class _RecordCallback(ResultCallback):
+        def __init__(self):
+            self.events = []
+            self.audio_length = 0
+
+        def on_open(self) -> None:
+            self.events.append("open")
+
+        def on_data(self, data: bytes) -> None:
+            self.audio_length += len(data)
+
+        def on_complete(self) -> None:
+            self.events.append("complete")
+
+
+def _wait_until(condition, timeout=5.0):
+    end_time = time.monotonic() + timeout
+    while time.monotonic() < end_time:
+        if condition():
+            return True
+        time.sleep(0.02)
+    return False
+
+
+@unittest.skipIf(dashscope is None, "dashscope or websockets is not installed")
+class TestSynthesizerPool(unittest.TestCase):
+
+    def setUp(self):
+        self.server = _FakeDashScopeServer()
+        dashscope.api_key = "test"
+        self.pool = None
+
+    def tearDown(self):
+        if self.pool is not None:
+            self.pool.stop()
+        self.server.shutdown()
+
+    def _create_synthesizer(self, callback):
+        return SpeechSynthesizer(model="cosyvoice-1", voice="test", callback=callback,
+                                 format=AudioFormat.PCM_24000HZ_MONO_16BIT, url=self.server.url)
+
+    def _create_pool(self, factory=None, **kwargs):
+        self.pool = SynthesizerPool(factory or self._create_synthesizer, **kwargs)
+        self.pool.open_session()
+        return self.pool
+
+    def test_acquire_warm_session(self):
+        pool = self._create_pool(pool_size=1)
+        self.assertTrue(_wait_until(lambda: pool.idle_count == 1))
+        self.assertEqual(self.server.run_tasks, 1)
+
+        callback = _RecordCallback()
+        synthesizer = pool.acquire(callback)
+        synthesizer.streaming_call("你好")
+        synthesizer.streaming_complete()
+
+        # the speech ran on the already started task, the pool only warmed up a replacement
+        self.assertTrue(_wait_until(lambda: pool.idle_count == 1))
+        self.assertEqual(self.server.run_tasks, 2)
+        self.assertEqual(callback.events, ["complete"])
+        self.assertEqual(callback.audio_length, 4800)
+        metrics = pool.get_metrics()
+        self.assertEqual(metrics.warm_hits, 1)
+        self.assertEqual(metrics.cold_misses, 0)
+        self.assertGreater(metrics.handshake_time_saved, 0)
+
+    def test_evict_idle_session(self):
+        pool = self._create_pool(pool_size=1, max_idle_time=0.2, check_interval=0.05)
+        self.assertTrue(_wait_until(lambda: pool.get_metrics().evictions >= 1))
+        # evicted sessions are replaced
+        self.assertTrue(_wait_until(lambda: pool.idle_count == 1))
+        self.assertGreaterEqual(self.server.run_tasks, 2)
+
+    def test_dead_session_falls_back_to_cold(self):
+        pool = self._create_pool(pool_size=1, check_interval=60)
+        self.assertTrue(_wait_until(lambda: pool.idle_count == 1))
+        self.server.close_connections()
+        time.sleep(0.2)
+
+        callback = _RecordCallback()
+        synthesizer = pool.acquire(callback)
+        synthesizer.streaming_call("你好")
+        synthesizer.streaming_complete()
+        self.assertEqual(callback.events, ["open", "complete"])
+        metrics = pool.get_metrics()
+        self.assertEqual(metrics.warm_hits, 0)
+        self.assertEqual(metrics.cold_misses, 1)
+        self.assertEqual(metrics.evictions, 1)
+
+    def test_warm_only_while_sessions_open(self):
+        pool = SynthesizerPool(self._create_synthesizer, pool_size=1, check_interval=0.05)
+        self.pool = pool
+        pool.start()
+        time.sleep(0.3)
+        self.assertEqual(pool.idle_count, 0)
+        self.assertEqual(self.server.run_tasks, 0)
+
+        pool.open_session()
+        pool.open_session()
+        self.assertTrue(_wait_until(lambda: pool.idle_count == 1))
+        pool.close_session()
+        self.assertEqual(pool.idle_count, 1)
+        # the last session closes the warm sessions and stops the pool
+        pool.close_session()
+        self.assertEqual(pool.idle_count, 0)
+        time.sleep(0.2)
+        self.assertEqual(self.server.run_tasks, 1)
+
+    def test_connect_failures_back_off(self):
+        attempts = []
+
+        def failing_factory(callback):
+            attempts.append(time.monotonic())
+            raise ConnectionError("service unavailable")
+
+        pool = self._create_pool(failing_factory, pool_size=1, check_interval=0.05, max_retry_delay=0.4)
+        time.sleep(1.2)
+        pool.stop()
+        # 0.05s checks would retry 24 times, backing off 0.1, 0.2, 0.4, 0.4... only 5 times
+        self.assertLessEqual(len(attempts), 6)
+        self.assertGreaterEqual(len(attempts), 3)
+        intervals = np.diff(attempts)
+        self.assertGreater(intervals[2], intervals[0] * 2)
+        self.assertEqual(pool.get_metrics().connect_failures, len(attempts))
+
+    def test_unsupported_dashscope_disables_warm_up(self):
+        created = []
+
+        def factory(callback):
+            synthesizer = SimpleNamespace(callback=callback)
+            created.append(synthesizer)
+            return synthesizer
+
+        pool = self._create_pool(factory, pool_size=1, check_interval=0.05)
+        time.sleep(0.3)
+        self.assertEqual(len(created), 1)
+        self.assertEqual(pool.get_metrics().connect_failures, 0)
+        callback = _RecordCallback()
+        synthesizer = pool.acquire(callback)
+        self.assertIs(synthesizer.callback.target, callback)
+        self.assertEqual(pool.get_metrics().cold_misses, 1)